@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the CTF network generator.
+Measures packet build latency, full-cycle throughput and startup time against
+a null sink (no root or network needed) and writes the results as JSON so two
+versions can be compared.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# Startup is timed in a fresh interpreter so the imports are really cold
+STARTUP_SNIPPET = """
+import sys, time
+started = time.perf_counter()
+import network_generator
+from event_log import EventLog
+from packet_sender import NullSender
+imported = time.perf_counter()
+generator = network_generator.CTFNetworkGenerator(sender=NullSender(), packet_backend=sys.argv[1],
+                                                  events=EventLog(console=False))
+ready = time.perf_counter()
+# First packets include loading whatever scapy layers the backend needs
+generator.generate_http_traffic()
+first_packet = time.perf_counter()
+print(imported - started, ready - started, first_packet - started)
+"""
+
+
+def summarize(samples):
+    """Latency summary in microseconds"""
+    ordered = sorted(samples)
+    return {
+        "runs": len(ordered),
+        "mean_us": round(statistics.fmean(ordered) * 1e6, 2),
+        "median_us": round(statistics.median(ordered) * 1e6, 2),
+        "p95_us": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1e6, 2),
+        "min_us": round(ordered[0] * 1e6, 2)
+    }
+
+
+def time_call(func, repeat, before=None):
+    samples = []
+    for _ in range(repeat):
+        if before:
+            before()
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def bench_build_latency(generator, repeat):
+    """Per-challenge and per-group latency with a cold packet cache (full build) and a warm one"""
+    results = {}
+    senders = dict(generator.challenge_senders())
+    senders.update((f"group_{name}", func) for name, func in generator.challenge_jobs())
+    for name, method in sorted(senders.items()):
+        cold = time_call(method, repeat, before=generator.packet_cache.clear)
+        method()
+        warm = time_call(method, repeat)
+        results[name] = {"cold": summarize(cold), "warm": summarize(warm)}
+
+    flag = generator.get_current_flag("caesar3")
+    results["caesar_cipher"] = {"cold": summarize(time_call(lambda: generator.caesar_cipher(flag, 7), repeat * 10))}
+    return results
+
+
+def bench_cycle_throughput(generator, cycles):
+    """End-to-end packets per second for whole cycles against the null sink"""
+    jobs = generator.challenge_jobs()
+    results = {}
+    for label, before in (("cold", generator.packet_cache.clear), ("warm", None)):
+        sent_before = generator.sender.packets_sent
+        bytes_before = generator.sender.bytes_sent
+        started = time.perf_counter()
+        for _ in range(cycles):
+            if before:
+                before()
+            for _, func in jobs:
+                func()
+        elapsed = time.perf_counter() - started
+        packets = generator.sender.packets_sent - sent_before
+        results[label] = {
+            "cycles": cycles,
+            "packets": packets,
+            "bytes": generator.sender.bytes_sent - bytes_before,
+            "seconds": round(elapsed, 6),
+            "packets_per_sec": round(packets / elapsed, 1) if elapsed else None
+        }
+    return results
+
+
+def bench_startup(repeat, backend):
+    """Cold-start time for the module import, generator setup and first packet"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    import_times, ready_times, first_packet_times = [], [], []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SNIPPET, backend],
+            cwd=here, capture_output=True, text=True, check=True
+        ).stdout.split()
+        module_import, ready, first_packet = (float(value) for value in output[-3:])
+        import_times.append(module_import)
+        ready_times.append(ready)
+        first_packet_times.append(first_packet)
+    return {
+        "runs": repeat,
+        "module_import_ms": round(statistics.median(import_times) * 1000, 1),
+        "generator_ready_ms": round(statistics.median(ready_times) * 1000, 1),
+        "first_packet_ms": round(statistics.median(first_packet_times) * 1000, 1)
+    }
+
+
+def environment():
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+    try:
+        import scapy
+        info["scapy"] = scapy.VERSION
+    except ImportError:
+        info["scapy"] = None
+    try:
+        info["commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        info["commit"] = None
+    return info
+
+
+def run_benchmarks(repeat=50, cycles=20, startup_runs=3, skip_startup=False, backend="scapy"):
+    from event_log import EventLog
+    from network_generator import CTFNetworkGenerator
+    from packet_sender import NullSender
+
+    # Every send still emits its status events (that cost is part of a cycle),
+    # they just aren't shown
+    generator = CTFNetworkGenerator(sender=NullSender(), packet_backend=backend, events=EventLog(console=False))
+    results = {
+        "environment": dict(environment(), backend=backend),
+        "build_latency": bench_build_latency(generator, repeat),
+        "cycle_throughput": bench_cycle_throughput(generator, cycles)
+    }
+    if not skip_startup:
+        results["startup"] = bench_startup(startup_runs, backend)
+    return results
+
+
+def flatten(results):
+    """{"a": {"b": 1}} -> {"a.b": 1}, numbers only"""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            for sub_key, sub_value in flatten(value).items():
+                flat[f"{key}.{sub_key}"] = sub_value
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[key] = value
+    return flat
+
+
+def compare(baseline, current, threshold):
+    """Return the metrics that got worse than the baseline by more than threshold"""
+    old, new = flatten(baseline), flatten(current)
+    regressions = []
+    for key, new_value in new.items():
+        old_value = old.get(key)
+        if not old_value or key.endswith((".runs", ".cycles", ".packets", ".bytes")):
+            continue
+        # Throughput should go up, everything else (times) should go down
+        if key.endswith("packets_per_sec"):
+            change = (old_value - new_value) / old_value
+        else:
+            change = (new_value - old_value) / old_value
+        if change > threshold:
+            regressions.append((key, old_value, new_value, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CTF network generator")
+    parser.add_argument("--repeat", type=int, default=50, help="calls per build-latency measurement")
+    parser.add_argument("--cycles", type=int, default=20, help="cycles for the throughput measurement")
+    parser.add_argument("--startup-runs", type=int, default=3, help="fresh interpreters for the startup measurement")
+    parser.add_argument("--skip-startup", action="store_true", help="skip the startup measurement")
+    parser.add_argument("--backend", choices=("scapy", "native"), default="scapy", help="packet builder to measure")
+    parser.add_argument("--output", "-o", help="write JSON results here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON results from a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown that counts as a regression (default: 0.25)")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.repeat, args.cycles, args.startup_runs, args.skip_startup, args.backend)
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"📊 Benchmark results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        for key, old_value, new_value, change in regressions:
+            print(f"❌ {key}: {old_value} -> {new_value} ({change:+.0%})", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("✅ No regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
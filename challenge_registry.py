@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Challenge registry for the CTF network generator.
+Every challenge (its id, protocol, port, flag encoding, payload marker,
+destinations and flag versions) is described in challenges.json, so a new
+challenge is a config edit rather than another generate_* method.
+"""
+
+import json
+import os
+
+from flag_encoders import make_encoder
+from packet_builders import DEFAULT_SEGMENT_SIZE
+
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "challenges.json")
+
+# Protocol -> layer the finished packet is sent at
+PROTOCOL_LAYERS = {"tcp": 3, "tcp_stream": 3, "udp": 3, "icmp": 3, "dns": 3, "arp": 2}
+PORTED_PROTOCOLS = ("tcp", "tcp_stream", "udp")
+# Protocols whose payload is sent as a whole TCP session, split into segments
+STREAM_PROTOCOLS = ("tcp_stream",)
+
+# Destination names resolved against the generator's network_info
+NETWORK_DESTINATIONS = {"broadcast": "broadcast_ip", "router": "router_ip"}
+
+
+class Challenge:
+    """One challenge definition from the registry"""
+
+    def __init__(self, spec, destination_sets):
+        try:
+            self.id = int(spec["id"])
+            self.type = spec["type"]
+            self.protocol = spec["protocol"]
+            self.encoder = spec["encoder"]
+            self.payloads = list(spec["payloads"])
+            self.flags = list(spec["flags"])
+        except KeyError as e:
+            raise ValueError(f"challenge {spec.get('type', spec.get('id'))!r} is missing {e}") from None
+        # The raw entry, for encoder/decoder options such as shift and key
+        self.spec = spec
+        self.label = spec.get("label", self.type.upper())
+        self.group = spec.get("group", self.type)
+        self.port = spec.get("port")
+        self.marker = spec.get("marker", "")
+        self.message = spec.get("message", "Sent: {flag}")
+        self.segment_size = spec.get("segment_size", DEFAULT_SEGMENT_SIZE)
+
+        destinations = spec.get("destinations", [])
+        if isinstance(destinations, str):
+            if destinations not in destination_sets:
+                raise ValueError(f"challenge {self.type!r} uses unknown destination set {destinations!r}")
+            destinations = destination_sets[destinations]
+        self.destinations = list(destinations)
+
+        if self.protocol not in PROTOCOL_LAYERS:
+            raise ValueError(f"challenge {self.type!r} has unknown protocol {self.protocol!r}, "
+                             f"expected one of {', '.join(PROTOCOL_LAYERS)}")
+        if self.protocol in PORTED_PROTOCOLS and self.port is None:
+            raise ValueError(f"challenge {self.type!r} needs a port for {self.protocol}")
+        if not isinstance(self.segment_size, int) or self.segment_size < 1:
+            raise ValueError(f"challenge {self.type!r} has an invalid segment_size {self.segment_size!r}")
+        try:
+            # Compiled once: tables and keys are built here, not per flag
+            self.encode = make_encoder(self.encoder, spec)
+        except ValueError as e:
+            raise ValueError(f"challenge {self.type!r}: {e}") from None
+        if not self.flags or not self.payloads or not self.destinations:
+            raise ValueError(f"challenge {self.type!r} needs at least one flag, payload and destination")
+        self.layer = PROTOCOL_LAYERS[self.protocol]
+
+    def render_payloads(self, encoded_flag):
+        """The payload templates with the marker and encoded flag filled in"""
+        return [
+            template.replace("{marker}", self.marker).replace("{flag}", encoded_flag)
+            for template in self.payloads
+        ]
+
+    def resolve_destinations(self, network_info):
+        return [
+            network_info[NETWORK_DESTINATIONS[dst]] if dst in NETWORK_DESTINATIONS else dst
+            for dst in self.destinations
+        ]
+
+    def describe(self, flag, encoded_flag):
+        """The line printed after a send"""
+        return self.message.replace("{flag}", flag).replace("{encoded}", encoded_flag)
+
+
+class ChallengeRegistry:
+    """All challenges, indexed by type and id, in config order"""
+
+    def __init__(self, config):
+        destination_sets = config.get("destination_sets", {})
+        self.challenges = [Challenge(spec, destination_sets) for spec in config.get("challenges", [])]
+        self.by_type = {}
+        self.by_id = {}
+        self.groups = {}
+        for challenge in self.challenges:
+            if challenge.type in self.by_type or challenge.id in self.by_id:
+                raise ValueError(f"duplicate challenge {challenge.type!r} (id {challenge.id})")
+            self.by_type[challenge.type] = challenge
+            self.by_id[challenge.id] = challenge
+            self.groups.setdefault(challenge.group, []).append(challenge)
+
+    def __iter__(self):
+        return iter(self.challenges)
+
+    def __len__(self):
+        return len(self.challenges)
+
+    def __getitem__(self, challenge_type):
+        return self.by_type[challenge_type]
+
+
+def load_challenge_registry(path=None):
+    """Load challenges.json (or another registry file)"""
+    path = path or DEFAULT_REGISTRY_PATH
+    with open(path) as f:
+        try:
+            config = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}") from None
+    return ChallengeRegistry(config)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Clocks for the CTF network generator.
+Everything that schedules or timestamps goes through a clock object, so the
+real one can be swapped for a VirtualClock that jumps straight to the next
+event: hours of schedule then run in well under a second.
+"""
+
+import threading
+import time
+
+
+class SystemClock:
+    """Wall-clock time and real sleeps"""
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def wait(self, event, seconds):
+        """Sleep until an event is set or the time is up; returns whether it was set"""
+        return event.wait(seconds)
+
+    def strftime(self, fmt):
+        return time.strftime(fmt, time.localtime(self.time()))
+
+
+class VirtualClock:
+    """Simulated time that only moves when something sleeps or advances it"""
+
+    def __init__(self, start=None):
+        # Wall time the simulation starts at; monotonic time starts at 0
+        self.epoch = time.time() if start is None else start
+        self.now = 0.0
+        self.lock = threading.Lock()
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.epoch + self.now
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def wait(self, event, seconds):
+        if not event.is_set():
+            self.advance(seconds)
+        return event.is_set()
+
+    def advance(self, seconds):
+        if seconds > 0:
+            with self.lock:
+                self.now += seconds
+
+    def strftime(self, fmt):
+        return time.strftime(fmt, time.localtime(self.time()))
+
+
+SYSTEM_CLOCK = SystemClock()
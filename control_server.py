@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Flag control channel for the CTF network generator.
+The scoreboard (or anything else on this machine) tells the generator that a
+flag was stolen; the generator switches version and re-sends immediately
+instead of waiting for its next timed advance.
+
+Run this file directly to act as a local stand-in for the scoreboard:
+    python control_server.py advance http
+    python control_server.py set-index dns 3
+    python control_server.py reset all
+
+Every request must carry the generator's control token (X-Control-Token,
+or $CTF_CONTROL_TOKEN for this script). Browsers are further held to an
+Origin allowlist and JSON bodies, so another page can't steer the flags.
+"""
+
+import argparse
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from metrics import recent_events
+
+DEFAULT_CONTROL_PORT = 8765
+COMMANDS = ("advance", "set-index", "reset")
+TOKEN_ENV = "CTF_CONTROL_TOKEN"
+# Pages allowed to call the listener from a browser, on any port.
+# Requests without an Origin header (curl, control_server.py) are not browsers.
+DEFAULT_ORIGINS = ("http://localhost", "http://127.0.0.1")
+
+
+def origin_allowed(origin, allowed):
+    """Whether a browser Origin matches an allowlist entry; entries without a port match any port"""
+    if origin is None or origin in allowed:
+        return True
+    if origin == "null":
+        return False
+    parsed = urlparse(origin)
+    return f"{parsed.scheme}://{parsed.hostname}" in allowed
+
+
+class ControlError(Exception):
+    """A control command that cannot be applied (bad challenge, bad index, ...)"""
+
+
+class ControlServer:
+    """Localhost HTTP listener for advance / set-index / reset commands"""
+
+    def __init__(self, generator, port=DEFAULT_CONTROL_PORT, host="127.0.0.1", token=None, origins=None):
+        if not token:
+            raise ValueError("the control listener needs a token")
+        self.generator = generator
+        self.token = token
+        self.origins = set(origins or DEFAULT_ORIGINS)
+        # One command at a time, so two steals can't interleave an advance
+        self.lock = threading.Lock()
+        control = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_OPTIONS(handler):
+                # CORS preflight from the scoreboard page
+                if not control.origin_allowed(handler):
+                    control.respond(handler, 403, {"error": "origin not allowed"})
+                    return
+                handler.send_response(204)
+                control.cors_headers(handler)
+                handler.end_headers()
+
+            def do_GET(handler):
+                # Flags and events are secrets too
+                if not control.authorized(handler):
+                    return
+                url = urlparse(handler.path)
+                path = url.path.strip("/")
+                if path in ("", "flags"):
+                    control.respond(handler, 200, control.flag_state())
+                elif path == "events":
+                    control.respond(handler, 200, recent_events(control.generator.events, url.query))
+                else:
+                    control.respond(handler, 404, {"error": f"unknown path /{path}"})
+
+            def do_POST(handler):
+                control.handle_post(handler)
+
+            def log_message(handler, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="ctf-control", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def origin_allowed(self, handler):
+        return origin_allowed(handler.headers.get("Origin"), self.origins)
+
+    def authorized(self, handler):
+        """Check the Origin and the token, answering 403 if either is wrong"""
+        if not self.origin_allowed(handler):
+            self.respond(handler, 403, {"error": "origin not allowed"})
+            return False
+        if not secrets.compare_digest(handler.headers.get("X-Control-Token", "").encode(), self.token.encode()):
+            self.respond(handler, 403, {"error": "bad or missing control token"})
+            return False
+        return True
+
+    def cors_headers(self, handler):
+        origin = handler.headers.get("Origin")
+        if origin is None or not self.origin_allowed(handler):
+            return
+        handler.send_header("Access-Control-Allow-Origin", origin)
+        handler.send_header("Vary", "Origin")
+        handler.send_header("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
+        handler.send_header("Access-Control-Allow-Headers", "Content-Type, X-Control-Token")
+
+    def respond(self, handler, status, payload):
+        body = json.dumps(payload).encode()
+        handler.send_response(status)
+        self.cors_headers(handler)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def handle_post(self, handler):
+        url = urlparse(handler.path)
+        command = url.path.strip("/")
+        if not self.authorized(handler):
+            return
+        # Forms and text/plain posts skip the CORS preflight; JSON can't
+        content_type = handler.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self.respond(handler, 415, {"error": "commands must be sent as application/json"})
+            return
+
+        # Parameters may come from the query string or a JSON body
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            length = int(handler.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self.respond(handler, 400, {"error": "bad Content-Length"})
+            return
+        if length:
+            try:
+                params.update(json.loads(handler.rfile.read(length) or b"{}"))
+            except (ValueError, TypeError):
+                self.respond(handler, 400, {"error": "body must be a JSON object"})
+                return
+
+        try:
+            result = self.execute(command, params.get("challenge"), params.get("index"))
+        except ControlError as e:
+            self.respond(handler, 400, {"error": str(e)})
+            return
+        self.respond(handler, 200, result)
+
+    def execute(self, command, challenge_type, index=None):
+        """Apply a command, re-send the affected challenges and report the new flags"""
+        generator = self.generator
+        if command not in COMMANDS:
+            raise ControlError(f"unknown command {command!r}, expected one of {', '.join(COMMANDS)}")
+        if challenge_type == "all":
+            challenges = list(generator.current_flag_index)
+        elif challenge_type in generator.current_flag_index:
+            challenges = [challenge_type]
+        else:
+            raise ControlError(f"unknown challenge {challenge_type!r}")
+        if command == "set-index":
+            # Check every challenge first so "all" never applies halfway
+            try:
+                index = int(index)
+                for challenge in challenges:
+                    generator.check_flag_index(challenge, index)
+            except (TypeError, ValueError, IndexError) as e:
+                raise ControlError(f"bad index {index!r}: {e}")
+
+        started = time.perf_counter()
+        with self.lock:
+            for challenge in challenges:
+                if command == "advance":
+                    generator.advance_flag(challenge)
+                elif command == "reset":
+                    generator.set_flag_index(challenge, 0)
+                else:
+                    generator.set_flag_index(challenge, index)
+            for challenge in challenges:
+                generator.resend_challenge(challenge)
+
+        return {
+            "command": command,
+            "flags": {challenge: self.describe(challenge) for challenge in challenges},
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+
+    def describe(self, challenge_type):
+        return {
+            "index": self.generator.current_flag_index[challenge_type],
+            "flag": self.generator.get_current_flag(challenge_type)
+        }
+
+    def flag_state(self):
+        return {challenge: self.describe(challenge) for challenge in self.generator.current_flag_index}
+
+
+def send_command(command, challenge_type, index=None, port=DEFAULT_CONTROL_PORT,
+                 host="127.0.0.1", token=None, timeout=5):
+    """Send one command to a running generator and return its JSON reply"""
+    payload = {"challenge": challenge_type}
+    if index is not None:
+        payload["index"] = index
+    request = urllib.request.Request(
+        f"http://{host}:{port}/{command}",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    if token:
+        request.add_header("X-Control-Token", token)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        raise ControlError(json.load(e).get("error", str(e)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a flag command to a running CTF network generator")
+    parser.add_argument("command", choices=COMMANDS)
+    parser.add_argument("challenge", help="challenge type (http, dns, ..., easydns) or 'all'")
+    parser.add_argument("index", nargs="?", type=int, help="flag index for set-index")
+    parser.add_argument("--port", type=int, default=DEFAULT_CONTROL_PORT)
+    parser.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                        help=f"the generator's control token (default: ${TOKEN_ENV})")
+    args = parser.parse_args()
+
+    try:
+        reply = send_command(args.command, args.challenge, args.index, port=args.port, token=args.token)
+    except (ControlError, OSError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    for challenge, state in reply["flags"].items():
+        print(f"✅ {challenge}: index {state['index']} -> {state['flag']}")
+    print(f"⏱️  Applied in {reply['elapsed_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Structured event log for the CTF network generator.
+Send paths hand events to emit(), which never blocks: a background thread
+writes them in batches as JSON lines (and prints the human-readable ones),
+while a ring buffer keeps the most recent events for the control and metrics
+endpoints. When the writer falls behind, per-packet events are sampled and,
+once the queue is full, dropped, so a slow terminal or disk can't stall sends.
+"""
+
+import json
+import queue
+import sys
+import threading
+from collections import deque
+
+from clock import SYSTEM_CLOCK
+
+DEFAULT_QUEUE_SIZE = 8192
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_RING_SIZE = 2048
+# Past this share of the queue, sampled events are thinned to 1 in SAMPLE_EVERY
+SAMPLE_HIGH_WATER = 0.5
+SAMPLE_EVERY = 10
+STOP_TIMEOUT = 5
+
+_STOP = object()
+
+
+class EventLog:
+    """Non-blocking JSON-lines event sink with a ring buffer of recent events"""
+
+    def __init__(self, path=None, console=True, queue_size=DEFAULT_QUEUE_SIZE,
+                 batch_size=DEFAULT_BATCH_SIZE, ring_size=DEFAULT_RING_SIZE, clock=SYSTEM_CLOCK):
+        self.path = path
+        self.console = console
+        self.batch_size = batch_size
+        self.clock = clock
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.high_water = int(queue_size * SAMPLE_HIGH_WATER)
+        self.recent = deque(maxlen=ring_size)
+        self.file = open(path, "a", encoding="utf-8") if path else None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.sample_tick = 0
+        self.counts = {"emitted": 0, "written": 0, "sampled": 0, "dropped": 0}
+
+    def start(self):
+        """Write from a background thread from now on (until then, emit writes directly)"""
+        self.thread = threading.Thread(target=self._writer_loop, name="ctf-events", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """Write out everything queued and close the file"""
+        if self.thread is not None:
+            try:
+                self.queue.put(_STOP, timeout=STOP_TIMEOUT)
+            except queue.Full:
+                pass
+            self.thread.join(STOP_TIMEOUT)
+            self.thread = None
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def emit(self, event, message=None, sample=False, **fields):
+        """
+        Record one event. message is the line shown on the console; sample=True
+        marks high-volume events that may be thinned out when the writer lags.
+        """
+        record = {"ts": round(self.clock.time(), 6), "event": event}
+        record.update(fields)
+        if message is not None:
+            record["message"] = message
+        self.recent.append(record)
+        with self.lock:
+            self.counts["emitted"] += 1
+            if self.thread is None:
+                self.counts["written"] += 1
+                direct = True
+            else:
+                direct = False
+                if sample and self.queue.qsize() >= self.high_water:
+                    self.sample_tick += 1
+                    if self.sample_tick % SAMPLE_EVERY:
+                        self.counts["sampled"] += 1
+                        return
+        if direct:
+            self.write([record])
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.lock:
+                self.counts["dropped"] += 1
+
+    def write(self, records):
+        """Write a batch to the console and the JSON-lines file"""
+        if self.console:
+            lines = [record["message"] for record in records if "message" in record]
+            if lines:
+                sys.stdout.write("\n".join(lines) + "\n")
+                sys.stdout.flush()
+        if self.file:
+            self.file.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+            self.file.flush()
+
+    def _writer_loop(self):
+        stopping = False
+        while not stopping:
+            record = self.queue.get()
+            if record is _STOP:
+                break
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            try:
+                self.write(batch)
+            except (OSError, ValueError) as e:
+                print(f"[EVENTS] Write failed: {e}", file=sys.stderr)
+            with self.lock:
+                self.counts["written"] += len(batch)
+
+    def events(self, limit=100, challenge=None, event=None):
+        """The most recent events, oldest first, optionally for one challenge or event type"""
+        selected = [
+            record for record in list(self.recent)
+            if (challenge is None or record.get("challenge") == challenge)
+            and (event is None or record["event"] == event)
+        ]
+        return selected[-limit:] if limit else selected
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts, queued=self.queue.qsize())
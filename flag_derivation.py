@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Per-team flag derivation for the CTF network generator.
+Instead of a fixed list of five flags shared by everyone, each flag is the
+HMAC of an event secret, the team, the challenge and the flag index. Flags
+are computed on demand, any index is valid (so flags never run out), and
+only a bounded number of recent flags are kept in memory.
+"""
+
+import hashlib
+import hmac
+import json
+import threading
+from collections import OrderedDict
+
+DEFAULT_FLAG_CACHE = 4096
+# Hex characters of the HMAC put in the flag (64 bits)
+FLAG_DIGEST_CHARS = 16
+
+
+class FlagDeriver:
+    """Deterministic flags: CTF{<CHALLENGE>_<hmac>} per (team, challenge, index)"""
+
+    def __init__(self, secret, cache_size=DEFAULT_FLAG_CACHE):
+        if not secret:
+            raise ValueError("flag derivation needs a non-empty secret")
+        self.key = secret.encode() if isinstance(secret, str) else bytes(secret)
+        self.cache_size = cache_size
+        # (team, challenge, index) -> flag, least recently used first
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def derive(self, team, challenge_type, index):
+        """The flag for one team's version of a challenge; team None is the shared flag"""
+        key = (team, challenge_type, index)
+        with self.lock:
+            flag = self.cache.get(key)
+            if flag is not None:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return flag
+            self.misses += 1
+
+        # NUL-separated so the fields can't run into each other
+        message = f"{team or ''}\0{challenge_type}\0{index}".encode()
+        digest = hmac.new(self.key, message, hashlib.sha256).hexdigest()[:FLAG_DIGEST_CHARS]
+        flag = f"CTF{{{challenge_type.upper()}_{digest.upper()}}}"
+        with self.lock:
+            self.cache[key] = flag
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return flag
+
+    def __len__(self):
+        return len(self.cache)
+
+
+def load_teams(path):
+    """Read a JSON object mapping team name to the address its flags are sent to"""
+    with open(path) as f:
+        try:
+            teams = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path}: {e}") from None
+    if not isinstance(teams, dict) or not all(isinstance(address, str) for address in teams.values()):
+        raise ValueError(f"{path}: expected a JSON object of team name -> address")
+    return teams
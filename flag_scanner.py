@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Capture scanner for the CTF network generator.
+Checks which flag versions actually reached the wire, without opening
+Wireshark. Every challenge's signature (the base64 User-Agent on /secret, the
+hex DNS label, the CAESAR and PLAINTEXT markers, the easydnsflag query, ...)
+is compiled from challenges.json into regexes that run over the
+memory-mapped capture, so multi-GB files are scanned in constant memory.
+The regexes run in C, but every record header is still walked in Python,
+to place matches in their records and to put the stream challenges'
+sessions (flags split over TCP segments) back together as they go past, so
+the speed depends on the number of records more than on their size. The
+scan prints the rate it got on the machine it ran on.
+
+    python flag_scanner.py session.pcapng
+    python flag_scanner.py live.pcap --follow
+"""
+
+import argparse
+import heapq
+import json
+import mmap
+import os
+import re
+import socket
+import struct
+import sys
+import time
+
+from challenge_registry import STREAM_PROTOCOLS, load_challenge_registry
+from flag_derivation import FlagDeriver, load_teams
+from flag_encoders import make_decoder
+from packet_builders import stream_numbers
+from pcap_io import PcapReader
+
+FLAG_PREFIX = "CTF{"
+DNS_PORT = 53
+# Derived flag versions recognised per challenge and team
+DEFAULT_MAX_INDEX = 32
+# Distinct unrecognised flags remembered, so garbage can't grow memory
+MAX_UNKNOWN = 1000
+FOLLOW_INTERVAL = 1.0
+# The capture is searched a window at a time, and the pages behind it are
+# handed back, so resident memory stays flat however big the file is
+SCAN_WINDOW = 64 << 20
+# Longest match a window may run over into the next one
+WINDOW_OVERLAP = 1 << 16
+# Open TCP sessions followed at once (only the generator's own sessions are
+# followed), and the most client data kept per session
+MAX_STREAMS = 1000
+MAX_STREAM_BYTES = 1 << 16
+
+IP_PROTOCOLS = {"tcp": 6, "tcp_stream": 6, "udp": 17, "icmp": 1, "dns": 17}
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+# seq, data offset and flags of a TCP header
+TCP_SEQ_FLAGS = struct.Struct("!4xI4xBB")
+ETHERTYPE_ARP = b"\x08\x06"
+
+
+def common_prefix(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return a[:length]
+
+
+class Signature:
+    """How one challenge's flag appears in its packets, compiled from the registry entry"""
+
+    def __init__(self, challenge):
+        self.challenge = challenge
+        alphabet, self.decode = make_decoder(challenge.encoder, challenge.spec)
+        flag_group = b"(?P<flag>" + alphabet + b")"
+        template = next(payload for payload in challenge.payloads if "{flag}" in payload)
+        template = template.replace("{marker}", challenge.marker)
+
+        # A signature that doesn't start with fixed bytes is anchored on the part
+        # of the encoded "CTF{" that doesn't depend on what follows it, so the
+        # regex engine can still skip ahead with a literal search. The anchor
+        # sits outside the group; lead says how far before the group the flag starts
+        anchor = common_prefix(challenge.encode(FLAG_PREFIX + "A"), challenge.encode(FLAG_PREFIX + "z")).encode()
+        anchored_group = re.escape(anchor) + flag_group
+        self.lead = 0
+        # Fixed bytes the match starts with; signatures sharing them are searched together
+        self.literal = anchor
+        if challenge.protocol == "dns":
+            # Query names are length-prefixed labels on the wire
+            labels = []
+            for label in template.split("."):
+                if "{flag}" in label:
+                    before, after = label.split("{flag}", 1)
+                    if labels or before:
+                        labels.append(b"[\x01-\x3f]" + re.escape(before.encode()) + flag_group)
+                    else:
+                        # Leading flag label: its length byte is left out of the match
+                        labels.append(anchored_group)
+                        self.lead = len(anchor)
+                    labels.append(re.escape(after.encode()))
+                else:
+                    if not labels:
+                        self.literal = bytes([len(label)]) + label.encode()
+                    labels.append(re.escape(bytes([len(label)]) + label.encode()))
+            self.pattern = b"".join(labels) + b"\x00"
+        else:
+            before, after = (part.encode() for part in template.split("{flag}", 1))
+            if before:
+                self.literal = before
+                self.pattern = re.escape(before) + flag_group + re.escape(after)
+            else:
+                self.lead = len(anchor)
+                self.pattern = anchored_group + re.escape(after)
+        # Streams are searched one reassembled session at a time instead
+        self.regex = re.compile(self.pattern) if challenge.protocol in STREAM_PROTOCOLS else None
+
+    def matches_packet(self, data, layer, start, stop):
+        """Whether a packet (by position in the capture) has this challenge's protocol and port"""
+        protocol = self.challenge.protocol
+        if protocol == "arp":
+            return layer == 2 and data[start + 12:start + 14] == ETHERTYPE_ARP
+        if layer != 3 or stop - start < 20 or data[start + 9] != IP_PROTOCOLS[protocol]:
+            return False
+        if protocol == "icmp":
+            return True
+        port = DNS_PORT if protocol == "dns" else self.challenge.port
+        header_len = (data[start] & 0x0F) * 4
+        return int.from_bytes(data[start + header_len + 2:start + header_len + 4], "big") == port
+
+
+class Sighting:
+    """How often and when one flag version was seen"""
+
+    def __init__(self, timestamp):
+        self.count = 0
+        self.first = timestamp
+        self.last = timestamp
+
+    def add(self, timestamp):
+        self.count += 1
+        self.last = max(self.last, timestamp)
+        self.first = min(self.first, timestamp)
+
+    def as_dict(self):
+        return {"count": self.count, "first_seen": self.first, "last_seen": self.last}
+
+
+class Stream:
+    """The client half of one TCP session to a stream challenge, in sequence order"""
+
+    def __init__(self, signature, next_seq):
+        self.signature = signature
+        self.next_seq = next_seq
+        self.data = bytearray()
+
+
+class FlagScanner:
+    """Finds every known flag version in a capture and records when it was seen"""
+
+    def __init__(self, registry=None, flag_deriver=None, teams=None, max_index=DEFAULT_MAX_INDEX):
+        self.registry = registry or load_challenge_registry()
+        # Challenges with identical signatures (the bare hex payloads) share
+        # one alternative and are told apart by protocol and port
+        alternatives = {}
+        # server port (as wire bytes) -> signature, for the challenges sent as TCP sessions
+        self.stream_signatures = {}
+        for challenge in self.registry:
+            signature = Signature(challenge)
+            if signature.regex is not None:
+                self.stream_signatures[challenge.port.to_bytes(2, "big")] = signature
+                continue
+            alternatives.setdefault(signature.pattern, []).append(signature)
+        # One regex pass per leading literal: the engine only skips ahead
+        # quickly when every alternative starts with the same bytes (e.g. the
+        # three CAESAR markers), so a single regex of everything is far slower.
+        # Each alternative's flag group is named, and says which one matched.
+        passes = {}
+        self.flag_groups = {}
+        for number, (pattern, signatures) in enumerate(alternatives.items()):
+            name = f"f{number}"
+            self.flag_groups[name] = (signatures[0].lead, signatures)
+            passes.setdefault(signatures[0].literal[:4], []).append(
+                pattern.replace(b"(?P<flag>", b"(?P<%s>" % name.encode()))
+        self.passes = [re.compile(b"|".join(patterns)) for patterns in passes.values()]
+
+        # (challenge, encoded flag bytes) -> (index, team)
+        self.versions = {}
+        team_names = list(teams or {}) or [None]
+        for challenge in self.registry:
+            if flag_deriver is not None:
+                for team in team_names:
+                    for index in range(max_index + 1):
+                        flag = flag_deriver.derive(team, challenge.type, index)
+                        self.versions[(challenge.type, challenge.encode(flag).encode())] = (index, team)
+            else:
+                for index, flag in enumerate(challenge.flags):
+                    self.versions[(challenge.type, challenge.encode(flag).encode())] = (index, None)
+
+        # (client and server addresses, client and server ports) -> Stream
+        self.streams = {}
+        # (challenge, index, team) -> Sighting; (challenge, decoded text) -> Sighting
+        self.seen = {}
+        self.unknown = {}
+        self.packets = 0
+        self.bytes = 0
+
+    def scan(self, reader, on_new=None):
+        """
+        Scan a reader from its offset up to its last complete record, leaving
+        the offset there. on_new(challenge, index, team, timestamp) is called the
+        first time a version is seen.
+        """
+        data = reader.map
+        size = len(data)
+        start_offset = reader.offset
+        packets = reader.packets()
+        if self.stream_signatures:
+            packets = self.follow_streams(data, packets, on_new)
+        current = None
+        window = start_offset
+        while window < size and current != ():
+            window_end = min(size, window + SCAN_WINDOW)
+            # Every pass's matches in this window, in file order
+            matches = heapq.merge(*(self.find(pattern, data, window, window_end) for pattern in self.passes),
+                                  key=lambda match: match[0])
+            for position, end, signatures in matches:
+                # Walk the records up to the one holding the match
+                while current is None or current[3] <= position:
+                    current = next(packets, ())
+                    if not current:
+                        break
+                    self.packets += 1
+                if not current:
+                    break  # inside a record that isn't fully written yet
+                timestamp, layer, start, stop = current
+                if position < start:
+                    continue  # matched across record headers
+                for signature in signatures:
+                    if signature.matches_packet(data, layer, start, stop):
+                        self.record(signature, data[position:min(end, stop)], timestamp, on_new)
+                        break
+            # Catch the record walk up with the window, then let go of what's behind it
+            while current is None or (current and current[3] <= window_end):
+                current = next(packets, ())
+                if current:
+                    self.packets += 1
+            if current and hasattr(data, "madvise"):
+                done = min(current[2], window_end) // mmap.PAGESIZE * mmap.PAGESIZE
+                if done:
+                    data.madvise(mmap.MADV_DONTNEED, 0, done)
+            window = window_end
+        for _ in packets:
+            self.packets += 1
+        self.bytes += reader.offset - start_offset
+
+    def find(self, pattern, data, window, window_end):
+        """(flag start, flag end, candidate signatures) for each match of one pass starting in a window"""
+        for match in pattern.finditer(data, window, min(len(data), window_end + WINDOW_OVERLAP)):
+            if match.start() >= window_end:
+                break  # the next window finds it
+            name = match.lastgroup
+            lead, signatures = self.flag_groups[name]
+            yield match.start(name) - lead, match.end(name), signatures
+
+    def follow_streams(self, data, packets, on_new=None):
+        """Pass the records through, reassembling stream challenge sessions on the way"""
+        signatures = self.stream_signatures
+        tcp_protocol = IP_PROTOCOLS["tcp"]
+        for record in packets:
+            timestamp, layer, start, stop = record
+            if layer == 3 and stop - start >= 40 and data[start + 9] == tcp_protocol:
+                tcp = start + (data[start] & 0x0F) * 4
+                signature = signatures.get(data[tcp + 2:tcp + 4])
+                if signature is not None and tcp + 20 <= stop:
+                    seq, offset, flags = TCP_SEQ_FLAGS.unpack_from(data, tcp)
+                    # Short frames carry Ethernet padding past the IP total length
+                    end = min(stop, start + int.from_bytes(data[start + 2:start + 4], "big"))
+                    key = (data[start + 12:start + 20], data[tcp:tcp + 4])
+                    self.stream_segment(signature, key, seq, flags, data[tcp + (offset >> 4) * 4:end],
+                                        timestamp, on_new)
+            yield record
+
+    def stream_segment(self, signature, key, seq, flags, payload, timestamp, on_new=None):
+        """Add one client segment to its session; the flag is looked for once the session ends"""
+        if flags & TCP_SYN:
+            # The generator opens its sessions from a port and sequence number
+            # fixed per destination; any other SYN to the port can't carry a flag
+            sport, client_isn, _ = stream_numbers(socket.inet_ntoa(key[0][4:]), signature.challenge.port)
+            if seq != client_isn or int.from_bytes(key[1][:2], "big") != sport:
+                return
+            if key not in self.streams and len(self.streams) >= MAX_STREAMS:
+                del self.streams[next(iter(self.streams))]
+            self.streams[key] = Stream(signature, (seq + 1) & 0xFFFFFFFF)
+            return
+        stream = self.streams.get(key)
+        if stream is None:
+            return
+        # Only in-order data counts; retransmissions and gaps are skipped
+        if payload and seq == stream.next_seq and len(stream.data) < MAX_STREAM_BYTES:
+            stream.data += payload
+            stream.next_seq = (seq + len(payload)) & 0xFFFFFFFF
+        if flags & (TCP_FIN | TCP_RST):
+            del self.streams[key]
+            for match in signature.regex.finditer(stream.data):
+                self.record(signature, bytes(stream.data[match.start("flag") - signature.lead:match.end("flag")]),
+                            timestamp, on_new)
+
+    def record(self, signature, encoded, timestamp, on_new=None):
+        challenge_type = signature.challenge.type
+        version = self.versions.get((challenge_type, encoded))
+        if version is None:
+            try:
+                decoded = signature.decode(encoded)
+            except (ValueError, UnicodeDecodeError):
+                return
+            key = (challenge_type, decoded)
+            table = self.unknown
+            if key not in table and len(table) >= MAX_UNKNOWN:
+                return
+        else:
+            key = (challenge_type,) + version
+            table = self.seen
+        sighting = table.get(key)
+        if sighting is None:
+            sighting = table[key] = Sighting(timestamp)
+            if on_new and version is not None:
+                on_new(challenge_type, version[0], version[1], timestamp)
+        sighting.add(timestamp)
+
+    def report(self):
+        """Everything seen so far as a JSON-friendly dict"""
+        challenges = {}
+        for challenge in self.registry:
+            versions = [
+                dict(sighting.as_dict(), index=index, team=team)
+                for (challenge_type, index, team), sighting in sorted(
+                    self.seen.items(), key=lambda item: (item[0][1], item[0][2] or ""))
+                if challenge_type == challenge.type
+            ]
+            unknown = [
+                dict(sighting.as_dict(), flag=flag)
+                for (challenge_type, flag), sighting in self.unknown.items()
+                if challenge_type == challenge.type
+            ]
+            challenges[challenge.type] = {"versions": versions, "unknown": unknown}
+        return {"packets": self.packets, "bytes": self.bytes, "challenges": challenges}
+
+
+def format_time(timestamp):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+
+def print_report(scanner, report):
+    for challenge in scanner.registry:
+        entry = report["challenges"][challenge.type]
+        if not entry["versions"] and not entry["unknown"]:
+            print(f"❌ [{challenge.label}] no flag seen")
+        for version in entry["versions"]:
+            team = f" for {version['team']}" if version["team"] else ""
+            print(f"✅ [{challenge.label}] version {version['index']}{team}: {version['count']}x, "
+                  f"{format_time(version['first_seen'])} -> {format_time(version['last_seen'])}")
+        for version in entry["unknown"]:
+            print(f"⚠️  [{challenge.label}] unrecognised flag {version['flag']!r}: {version['count']}x, "
+                  f"first at {format_time(version['first_seen'])}")
+
+
+def scan_file(scanner, path):
+    with PcapReader(path) as reader:
+        scanner.scan(reader)
+
+
+def follow_file(scanner, path, interval=FOLLOW_INTERVAL):
+    """Keep scanning a capture that is still being written, reporting new versions as they appear"""
+    def announce(challenge_type, index, team, timestamp):
+        team = f" for {team}" if team else ""
+        print(f"👀 [{scanner.registry[challenge_type].label}] version {index}{team} "
+              f"first seen at {format_time(timestamp)}")
+
+    previous = None
+    try:
+        while True:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            if previous is not None and size < previous.offset:
+                # Truncated or replaced: start over
+                previous.close()
+                previous = None
+            if size and (previous is None or size > previous.offset):
+                try:
+                    reader = PcapReader(path)
+                except ValueError:
+                    reader = None  # header not written yet
+                if reader is not None:
+                    if previous is not None:
+                        reader.resume(previous)
+                        previous.close()
+                    scanner.scan(reader, on_new=announce)
+                    previous = reader
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if previous is not None:
+            previous.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report which CTF flag versions appear in a capture file")
+    parser.add_argument("capture", help="pcap or pcapng file")
+    parser.add_argument("--follow", action="store_true",
+                        help="keep reading the file as it grows (a live capture) until Ctrl+C")
+    parser.add_argument("--interval", type=float, default=FOLLOW_INTERVAL,
+                        help=f"seconds between checks for new data with --follow (default: {FOLLOW_INTERVAL:g})")
+    parser.add_argument("--challenges", metavar="FILE", help="challenge registry (default: challenges.json)")
+    parser.add_argument("--flag-secret", default=os.environ.get("CTF_FLAG_SECRET"),
+                        help="recognise flags derived from this event secret (default: $CTF_FLAG_SECRET)")
+    parser.add_argument("--teams", metavar="FILE", help="the generator's teams file, to recognise per-team flags")
+    parser.add_argument("--max-index", type=int, default=DEFAULT_MAX_INDEX,
+                        help=f"highest derived flag version to recognise (default: {DEFAULT_MAX_INDEX})")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    try:
+        registry = load_challenge_registry(args.challenges)
+        teams = load_teams(args.teams) if args.teams else None
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    flag_deriver = FlagDeriver(args.flag_secret) if args.flag_secret else None
+    scanner = FlagScanner(registry, flag_deriver, teams, args.max_index)
+
+    started = time.perf_counter()
+    try:
+        if args.follow:
+            follow_file(scanner, args.capture, args.interval)
+        else:
+            scan_file(scanner, args.capture)
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    elapsed = time.perf_counter() - started
+
+    report = scanner.report()
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    if args.follow:
+        print(f"\n🔎 Followed {scanner.packets} packets ({scanner.bytes / 1e6:.1f} MB)")
+    else:
+        rate = scanner.bytes / elapsed / 1e6 if elapsed else 0
+        print(f"🔎 Scanned {scanner.packets} packets ({scanner.bytes / 1e6:.1f} MB) in {elapsed:.2f}s ({rate:.0f} MB/s)")
+    print_report(scanner, report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Flag verification service for the CTF network generator.
+Checks submissions against the flags the generator is actually sending,
+instead of trusting the copy held by the browser. Runs an asyncio HTTP
+listener on localhost inside the generator process, so it always sees the
+current flag versions.
+
+    POST /verify  {"user": "alice", "challenge": "http" or 1, "flag": "CTF{...}", "team": "red"}
+    GET  /stats
+
+Browsers may only call it from the scoreboard's origins (the same allowlist
+as the control listener), and /verify only takes application/json bodies.
+"""
+
+import asyncio
+import hmac
+import json
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from control_server import DEFAULT_ORIGINS, origin_allowed
+from rate_limiter import TokenBucket
+
+DEFAULT_VERIFY_PORT = 8766
+# Seconds a replaced flag is still accepted, so a capture made just before a
+# steal isn't wasted
+DEFAULT_GRACE = 60.0
+# Submissions per second from one team (or user, without teams), and how many
+# can come at once
+DEFAULT_USER_RATE = 5.0
+DEFAULT_USER_BURST = 10
+# Submissions per second from everyone together. The user field is whatever the
+# client sends, so this is what bounds guessing under made-up names
+DEFAULT_GLOBAL_RATE = 50.0
+# Teams/users whose rate-limit state is kept; the least recently seen are dropped
+MAX_TRACKED_USERS = 10000
+MAX_BODY = 4096
+STOP_TIMEOUT = 5
+
+STATUS_TEXT = {200: "OK", 204: "No Content", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+               413: "Payload Too Large", 415: "Unsupported Media Type", 429: "Too Many Requests"}
+
+
+class VerificationError(Exception):
+    """A submission that can't be checked (unknown challenge, missing field, ...)"""
+
+
+class RateLimited(VerificationError):
+    """The team or user (or everyone together) is submitting faster than allowed"""
+
+
+class FlagVerifier:
+    """Constant-time flag checks against the generator's current and recently retired flags"""
+
+    def __init__(self, generator, grace=DEFAULT_GRACE, user_rate=DEFAULT_USER_RATE,
+                 user_burst=DEFAULT_USER_BURST, max_users=MAX_TRACKED_USERS, global_rate=DEFAULT_GLOBAL_RATE):
+        self.generator = generator
+        self.grace = grace
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_users = max_users
+        # team (or user, without teams) -> TokenBucket, least recently seen first
+        self.user_buckets = OrderedDict()
+        # None turns the global cap off
+        self.global_bucket = None
+        if global_rate:
+            self.global_bucket = TokenBucket(global_rate, max(global_rate, user_burst), generator.clock)
+        self.lock = threading.Lock()
+        self.counts = {"correct": 0, "incorrect": 0, "stale": 0, "throttled": 0, "invalid": 0}
+        self.submissions = None
+        if getattr(generator, "metrics", None) is not None:
+            self.submissions = generator.metrics.registry.counter(
+                "ctf_flag_submissions_total", "Flag submissions checked, by challenge and result",
+                ("challenge", "result"))
+
+    def record(self, challenge_type, result):
+        self.counts[result] += 1
+        if self.submissions is not None:
+            self.submissions.inc((challenge_type or "", result))
+
+    def allow(self, client):
+        """Take one submission from the client's bucket, then from the global one"""
+        with self.lock:
+            bucket = self.user_buckets.get(client)
+            if bucket is None:
+                bucket = TokenBucket(self.user_rate, self.user_burst, self.generator.clock)
+                self.user_buckets[client] = bucket
+                if len(self.user_buckets) > self.max_users:
+                    self.user_buckets.popitem(last=False)
+            else:
+                self.user_buckets.move_to_end(client)
+        if not bucket.try_take():
+            return False
+        if self.global_bucket is not None and not self.global_bucket.try_take():
+            bucket.give_back(1)
+            return False
+        return True
+
+    def resolve_challenge(self, challenge):
+        """Challenge type from a type name or a numeric challenge id"""
+        registry = self.generator.registry
+        if isinstance(challenge, str) and challenge in registry.by_type:
+            return challenge
+        try:
+            return registry.by_id[int(challenge)].type
+        except (KeyError, TypeError, ValueError):
+            raise VerificationError(f"unknown challenge {challenge!r}") from None
+
+    def candidate_indexes(self, challenge_type):
+        """The current flag index plus any retired within the grace window"""
+        generator = self.generator
+        # Snapshot both together: advances append to the deque from other threads
+        with generator.flag_lock:
+            current = generator.current_flag_index[challenge_type]
+            history = list(generator.retired_flags[challenge_type])
+        cutoff = generator.clock.monotonic() - self.grace
+        retired = [index for index, retired_at in history if retired_at >= cutoff and index != current]
+        return [current] + retired
+
+    def check(self, user, challenge, flag, team=None):
+        """
+        Check one submission and return the verdict as a dict. Submissions are
+        rate limited per team when teams are configured, else per user.
+        """
+        challenge_type = None
+        try:
+            if not user or not isinstance(flag, str):
+                raise VerificationError("user and flag are required")
+            challenge_type = self.resolve_challenge(challenge)
+            if self.generator.teams and team not in self.generator.teams:
+                raise VerificationError(f"unknown team {team!r}")
+        except VerificationError:
+            self.record(challenge_type, "invalid")
+            raise
+        client = ("team", team) if self.generator.teams else ("user", user)
+        if not self.allow(client):
+            self.record(challenge_type, "throttled")
+            raise RateLimited(f"too many submissions from {client[0]} {client[1]}, slow down")
+
+        submitted = flag.strip().encode()
+        matched = None
+        indexes = self.candidate_indexes(challenge_type)
+        # Compare against every candidate, so timing doesn't say which one was close
+        for index in indexes:
+            expected = self.generator.flag_for(challenge_type, index, team).encode()
+            if hmac.compare_digest(submitted, expected) and matched is None:
+                matched = index
+
+        if matched is None:
+            result = "incorrect"
+        elif matched == indexes[0]:
+            result = "correct"
+        else:
+            result = "stale"
+        self.record(challenge_type, result)
+        return {
+            "correct": matched is not None,
+            "challenge": challenge_type,
+            "index": matched,
+            "current_index": indexes[0],
+            "stale": result == "stale"
+        }
+
+    def stats(self):
+        return dict(self.counts, tracked_clients=len(self.user_buckets))
+
+
+class VerificationServer:
+    """asyncio HTTP/1.1 listener for /verify, on its own thread and event loop"""
+
+    def __init__(self, verifier, port=DEFAULT_VERIFY_PORT, host="127.0.0.1", origins=None):
+        self.verifier = verifier
+        self.host = host
+        self.origins = set(origins or DEFAULT_ORIGINS)
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self.handle, host, port, backlog=1024))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.thread = threading.Thread(target=self.loop.run_forever, name="ctf-verify", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.thread.is_alive():
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop).result(STOP_TIMEOUT)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(STOP_TIMEOUT)
+        else:
+            self.server.close()
+        if not self.loop.is_running():
+            self.loop.close()
+
+    async def shutdown(self):
+        """Stop accepting and drop any open keep-alive connections"""
+        self.server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection until the client closes it"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                origin = headers.get("origin")
+                try:
+                    length = int(headers.get("content-length") or 0)
+                    if length < 0:
+                        raise ValueError
+                except ValueError:
+                    # Can't tell where the body ends, so this is the last request
+                    writer.write(self.response(400, {"error": "bad Content-Length"}, False, origin))
+                    await writer.drain()
+                    break
+                if length > MAX_BODY:
+                    writer.write(self.response(413, {"error": "request body too large"}, False, origin))
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = self.route(method, urlparse(target).path, body, headers)
+                writer.write(self.response(status, payload, keep_alive, origin))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Shutting down; finish quietly rather than propagate into asyncio's
+            # connection callback
+            pass
+        finally:
+            writer.close()
+
+    def route(self, method, path, body, headers=None):
+        """(status, payload) for one request; headers are keyed by lowercase name"""
+        headers = headers or {}
+        path = path.strip("/")
+        if not origin_allowed(headers.get("origin"), self.origins):
+            return 403, {"error": "origin not allowed"}
+        if method == "OPTIONS":
+            # CORS preflight from the scoreboard page
+            return 204, None
+        if method == "GET" and path == "stats":
+            return 200, self.verifier.stats()
+        if method != "POST" or path != "verify":
+            return 404, {"error": f"unknown path /{path}"}
+        # Forms and text/plain can be posted cross-site without a preflight
+        if headers.get("content-type", "").split(";")[0].strip().lower() != "application/json":
+            return 415, {"error": "Content-Type must be application/json"}
+        try:
+            submission = json.loads(body or b"{}")
+            if not isinstance(submission, dict):
+                raise ValueError
+        except ValueError:
+            return 400, {"error": "body must be a JSON object"}
+        try:
+            return 200, self.verifier.check(submission.get("user"), submission.get("challenge"),
+                                            submission.get("flag"), submission.get("team"))
+        except RateLimited as e:
+            return 429, {"error": str(e)}
+        except VerificationError as e:
+            return 400, {"error": str(e)}
+
+    def cors_headers(self, origin):
+        """Echo an allowed browser Origin back; nothing for other origins or non-browsers"""
+        if origin is None or not origin_allowed(origin, self.origins):
+            return ""
+        return (
+            f"Access-Control-Allow-Origin: {origin}\r\n"
+            "Vary: Origin\r\n"
+            "Access-Control-Allow-Methods: GET, POST, OPTIONS\r\n"
+            "Access-Control-Allow-Headers: Content-Type\r\n"
+        )
+
+    def response(self, status, payload, keep_alive, origin=None):
+        body = b"" if payload is None else json.dumps(payload).encode()
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"{self.cors_headers(origin)}"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        return head.encode() + body
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Metrics for the CTF network generator.
+A small in-process registry of counters, gauges and histograms, rendered in
+the Prometheus text format and served on a localhost HTTP port.
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Seconds; covers cached sends (microseconds) up to badly late cycles
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+DRIFT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values, extra=""):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with a fixed set of label names"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, label_values=(), amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, label_values=()):
+        return self.values.get(label_values, 0)
+
+    def drain(self):
+        """Take the counts recorded so far and start again from zero"""
+        with self.lock:
+            values, self.values = self.values, {}
+        return values
+
+    def absorb(self, values):
+        """Add counts drained from another counter"""
+        with self.lock:
+            for label_values, amount in values.items():
+                self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            items = list(self.values.items())
+        for label_values, value in items:
+            yield f"{self.name}{format_labels(self.labels, label_values)} {value}"
+
+
+class Gauge:
+    """Value read from a callback at scrape time: callback() -> {label_values: value}"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labels, callback):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.callback = callback
+
+    def samples(self):
+        for label_values, value in self.callback().items():
+            yield f"{self.name}{format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect and two additions"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label_values -> [per-bucket counts (+Inf last), sum, count]
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, label_values=()):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(label_values)
+            if state is None:
+                state = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][slot] += 1
+            state[1] += value
+            state[2] += 1
+
+    def drain(self):
+        """Take the observations recorded so far and start again from empty"""
+        with self.lock:
+            values, self.values = self.values, {}
+        return values
+
+    def absorb(self, values):
+        """Add observations drained from another histogram with the same buckets"""
+        with self.lock:
+            for label_values, (counts, total, count) in values.items():
+                state = self.values.get(label_values)
+                if state is None:
+                    state = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                state[0] = [mine + theirs for mine, theirs in zip(state[0], counts)]
+                state[1] += total
+                state[2] += count
+
+    def samples(self):
+        with self.lock:
+            items = [(labels, (list(counts), total, count)) for labels, (counts, total, count) in self.values.items()]
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = format_labels(self.labels, label_values, 'le="' + le + '"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labels, label_values)} {total}"
+            yield f"{self.name}_count{format_labels(self.labels, label_values)} {count}"
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels, callback):
+        return self.register(Gauge(name, help_text, labels, callback))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class GeneratorMetrics:
+    """The generator's metrics, grouped so call sites stay one-liners"""
+
+    def __init__(self, generator):
+        self.registry = MetricsRegistry()
+        self.packets = self.registry.counter(
+            "ctf_packets_sent_total", "Packets sent", ("challenge", "destination"))
+        self.bytes = self.registry.counter(
+            "ctf_bytes_sent_total", "Bytes sent", ("challenge", "destination"))
+        self.errors = self.registry.counter(
+            "ctf_errors_total", "Build and send errors", ("challenge", "stage", "exception"))
+        self.build_seconds = self.registry.histogram(
+            "ctf_build_seconds", "Time to assemble a challenge burst (cache lookups and builds)", ("challenge",))
+        self.send_seconds = self.registry.histogram(
+            "ctf_send_seconds", "Time to write a challenge burst to the sender", ("challenge",))
+        self.cycle_drift = self.registry.histogram(
+            "ctf_cycle_drift_seconds", "How late scheduled jobs started", ("job",), DRIFT_BUCKETS)
+        self.registry.gauge(
+            "ctf_flag_index", "Current flag version per challenge", ("challenge",),
+            lambda: {(challenge,): index for challenge, index in generator.current_flag_index.items()})
+        self.registry.gauge(
+            "ctf_events_total", "Log events by what happened to them (written, sampled, dropped)", ("result",),
+            lambda: {(result,): count for result, count in generator.events.stats().items()
+                     if result != "queued"})
+        self.registry.gauge(
+            "ctf_rate_limiter_throttled_total", "Bursts that waited on the rate limiter", (),
+            lambda: {(): generator.rate_limiter.stats()["throttled"]})
+
+    def record_burst(self, challenge_type, packets, errors=()):
+        """Count a burst's delivered packets and bytes; returns {destination: [packets, bytes]}"""
+        per_destination = {}
+        for dst, wire in packets:
+            totals = per_destination.setdefault(dst, [0, 0])
+            totals[0] += 1
+            totals[1] += len(wire)
+        for dst, error in errors:
+            self.record_error(challenge_type, "send", error)
+            # Failures don't say which packet failed, so take off an average one
+            totals = per_destination.get(dst)
+            if totals and totals[0]:
+                totals[1] -= totals[1] // totals[0]
+                totals[0] -= 1
+        for dst, (count, size) in per_destination.items():
+            if count:
+                self.packets.inc((challenge_type, dst), count)
+                self.bytes.inc((challenge_type, dst), size)
+        return per_destination
+
+    def record_error(self, challenge_type, stage, error):
+        self.errors.inc((challenge_type, stage, type(error).__name__))
+
+    def drain(self):
+        """Counter and histogram values recorded since the last drain (a shard worker's report)"""
+        return {metric.name: metric.drain() for metric in self.registry.metrics if metric.kind != "gauge"}
+
+    def absorb(self, report):
+        """Add a drain() report from another process, e.g. a shard worker, to these metrics"""
+        for metric in self.registry.metrics:
+            if metric.name in report:
+                metric.absorb(report[metric.name])
+
+    def render(self):
+        return self.registry.render()
+
+
+def recent_events(events, query):
+    """The /events reply: recent events filtered by ?limit=&challenge=&event= plus log stats"""
+    params = {key: values[-1] for key, values in parse_qs(query).items()}
+    try:
+        limit = int(params.get("limit", 100))
+    except ValueError:
+        limit = 100
+    return {
+        "events": events.events(limit, params.get("challenge"), params.get("event")),
+        "stats": events.stats()
+    }
+
+
+class MetricsServer:
+    """
+    Serves /metrics from a daemon thread. Recent events carry flags, so they
+    are only on the control listener's /events, behind its token.
+    """
+
+    def __init__(self, metrics, port, host="127.0.0.1"):
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if urlparse(handler.path).path not in ("/", "/metrics"):
+                    handler.send_error(404)
+                    return
+                body = self.metrics.render().encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass  # scrapes every few seconds would drown the console
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="ctf-metrics", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
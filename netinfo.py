@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Local network addressing for the CTF network generator.
+Reads the routing table (/proc/net/route) and interface addresses (ioctl)
+straight from the kernel, so detection never waits on an outbound lookup and
+knows the real prefix, gateway and broadcast address instead of assuming a /24.
+"""
+
+import fcntl
+import ipaddress
+import socket
+import struct
+
+SIOCGIFFLAGS = 0x8913
+SIOCGIFADDR = 0x8915
+SIOCGIFNETMASK = 0x891B
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+RTF_UP = 0x1
+RTF_GATEWAY = 0x2
+ROUTE_TABLE = "/proc/net/route"
+
+# Used only when no interface has an IPv4 address at all
+FALLBACK_NETWORK = {
+    "local_ip": "192.168.1.100",
+    "broadcast_ip": "192.168.1.255",
+    "router_ip": "192.168.1.1",
+    "network": "192.168.1.0/24",
+    "iface": None
+}
+
+
+def _ioctl_ipv4(sock, request, iface):
+    packed = fcntl.ioctl(sock.fileno(), request, struct.pack("256s", iface.encode()[:15]))
+    return socket.inet_ntoa(packed[20:24])
+
+
+def _hex_to_ipv4(value):
+    # /proc/net/route prints addresses as host-order hex
+    return socket.inet_ntoa(struct.pack("=L", int(value, 16)))
+
+
+def read_routes(path=ROUTE_TABLE):
+    """The IPv4 routing table as dicts of iface, destination, gateway, mask, flags and metric"""
+    routes = []
+    try:
+        with open(path) as f:
+            next(f, None)
+            for line in f:
+                fields = line.split()
+                if len(fields) < 8:
+                    continue
+                routes.append({
+                    "iface": fields[0],
+                    "destination": _hex_to_ipv4(fields[1]),
+                    "gateway": _hex_to_ipv4(fields[2]),
+                    "flags": int(fields[3], 16),
+                    "metric": int(fields[6]),
+                    "mask": _hex_to_ipv4(fields[7])
+                })
+    except OSError:
+        pass
+    return routes
+
+
+def default_route(path=ROUTE_TABLE):
+    """(interface, gateway) of the preferred default route, or None"""
+    defaults = [
+        route for route in read_routes(path)
+        if route["destination"] == "0.0.0.0" and route["mask"] == "0.0.0.0" and route["flags"] & RTF_UP
+    ]
+    if not defaults:
+        return None
+    route = min(defaults, key=lambda route: route["metric"])
+    gateway = route["gateway"] if route["flags"] & RTF_GATEWAY else None
+    return route["iface"], gateway
+
+
+def interface_flags(iface):
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        packed = fcntl.ioctl(sock.fileno(), SIOCGIFFLAGS, struct.pack("256s", iface.encode()[:15]))
+    return struct.unpack("H", packed[16:18])[0]
+
+
+def first_interface():
+    """First interface that is up, not loopback and has an IPv4 address (offline LANs)"""
+    for _, iface in socket.if_nameindex():
+        try:
+            flags = interface_flags(iface)
+            if flags & IFF_UP and not flags & IFF_LOOPBACK:
+                interface_ipv4(iface)
+                return iface
+        except OSError:
+            continue
+    return None
+
+
+def interface_ipv4(iface):
+    """(address, netmask) of an interface's primary IPv4 address"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            return _ioctl_ipv4(sock, SIOCGIFADDR, iface), _ioctl_ipv4(sock, SIOCGIFNETMASK, iface)
+        except OSError as e:
+            raise OSError(f"no IPv4 address on interface {iface}: {e}") from e
+
+
+def build_network_info(local_ip, network, router_ip=None, iface=None):
+    """
+    The generator's network_info dict for an address inside a subnet.
+    network may be a CIDR string or an IPv4Network; without a known router
+    the first host of the subnet is assumed, as the /24 detection always did.
+    """
+    network = ipaddress.ip_network(network, strict=False)
+    if router_ip is None:
+        router_ip = str(network.network_address + 1) if network.num_addresses > 2 else local_ip
+    return {
+        "local_ip": local_ip,
+        "broadcast_ip": str(network.broadcast_address),
+        "router_ip": router_ip,
+        "network": str(network),
+        "iface": iface
+    }
+
+
+def interface_network_info(iface, subnet=None):
+    """network_info for an interface, optionally overriding its subnet"""
+    local_ip, netmask = interface_ipv4(iface)
+    return build_network_info(local_ip, subnet or f"{local_ip}/{netmask}", iface=iface)
+
+
+class NetworkDetector:
+    """
+    network_info for the default interface, cached. refresh() re-reads the
+    routing table and interface address (both cheap, local reads) and only
+    rebuilds network_info when the interface, gateway or address changed.
+    """
+
+    def __init__(self):
+        self.info = None
+        self.signature = None
+        # True while no interface has an IPv4 address and FALLBACK_NETWORK is in use
+        self.fallback = False
+
+    def current_signature(self):
+        route = default_route()
+        iface, gateway = route if route else (first_interface(), None)
+        if iface is None:
+            return None
+        try:
+            return iface, gateway, interface_ipv4(iface)
+        except OSError:
+            return iface, gateway, None
+
+    def refresh(self):
+        """Re-detect if anything changed; returns True when network_info was rebuilt"""
+        signature = self.current_signature()
+        if self.info is not None and signature == self.signature:
+            return False
+        self.signature = signature
+        self.fallback = signature is None or signature[2] is None
+        if self.fallback:
+            self.info = dict(FALLBACK_NETWORK)
+        else:
+            iface, gateway, (local_ip, netmask) = signature
+            self.info = build_network_info(local_ip, f"{local_ip}/{netmask}", router_ip=gateway, iface=iface)
+        return True
+
+    def get(self):
+        if self.info is None:
+            self.refresh()
+        return self.info
+
+
+# Shared by every generator in the process
+DETECTOR = NetworkDetector()
+
+
+def detect_network():
+    """Cached network_info for the default interface"""
+    return DETECTOR.get()
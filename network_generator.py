@@ -5,538 +5,1005 @@ This script generates the actual network traffic that users need to capture with
 Run this script on the same network where users are competing.
 """
 
+import time
+
+# Taken before anything else is imported so startup can be reported
+STARTED = time.perf_counter()
+
 import socket
 import struct
-import time
 import threading
-import base64
-import binascii
-from scapy.all import *
+import argparse
+import functools
+import os
+import re
+import secrets
+from collections import deque
+from packet_sender import BurstSender, NullSender, default_interface
+from packet_cache import PacketCache
+from scheduler import ChallengeScheduler
+from rate_limiter import RateLimiter, parse_challenge_rates, parse_rate
+from pcap_io import PcapReader, PcapWriter
+from metrics import GeneratorMetrics, MetricsServer
+from control_server import ControlServer, DEFAULT_CONTROL_PORT, TOKEN_ENV
+from packet_builders import (SCAPY_LOAD_TIMES, TCP_FLAGS_FIN, TCP_FLAGS_SYN, make_packet_builder,
+                             scapy_module, stream_numbers)
+from noise import NoiseGenerator, parse_noise_mix
+from challenge_registry import STREAM_PROTOCOLS, load_challenge_registry
+from flag_encoders import caesar_cipher, encode_batch
+from flag_derivation import FlagDeriver, load_teams
+from flag_scanner import Signature
+from netinfo import DETECTOR
+from clock import SYSTEM_CLOCK, VirtualClock
+from event_log import EventLog
+from flag_verifier import (DEFAULT_GLOBAL_RATE, DEFAULT_GRACE, DEFAULT_USER_RATE, DEFAULT_VERIFY_PORT,
+                           FlagVerifier, VerificationServer)
+
+# Default cadence, matching the original serial loop
+CHALLENGE_GAP = 2          # seconds between consecutive challenges
+CYCLE_IDLE = 30            # pause after the last challenge of a cycle
+ADVANCE_EVERY_CYCLES = 3   # flags advance every third cycle
+
+# Rewritten replay packets kept before the memo is reset
+REPLAY_REWRITE_CACHE = 4096
+# Derived flag versions recognised in a replayed capture, per challenge and team
+REPLAY_MAX_INDEX = 32
+# Ports and sequence number at the start of a TCP header
+TCP_PORTS_SEQ = struct.Struct("!HHI")
+
+# Replaced flag versions remembered per challenge for late submissions
+RETIRED_FLAG_HISTORY = 16
 
 class CTFNetworkGenerator:
-    def __init__(self):
-        # Detect network interface and broadcast address
-        self.network_info = self.detect_network()
-        print(f"🌐 Detected network: {self.network_info}")
+    def __init__(self, sender=None, rate_limiter=None, packet_backend="scapy", network_info=None,
+                 registry=None, flag_deriver=None, teams=None, clock=None, events=None):
+        # Every sleep and timestamp goes through this; a VirtualClock runs the
+        # schedule in simulated time (see simulate)
+        self.clock = clock or SYSTEM_CLOCK
+        
+        # Status lines and per-destination send events; written directly until
+        # someone calls events.start() (main does, once everything is up)
+        self.events = events or EventLog(clock=self.clock)
+        # scapy modules (see SCAPY_LOAD_TIMES) already logged
+        self.scapy_loads_reported = 0
+        self.report_lock = threading.Lock()
+        
+        # Detect network interface and broadcast address; a detected network is
+        # re-checked every cycle, one passed in explicitly is left alone
+        self.network_detector = None if network_info else DETECTOR
+        self.network_info = network_info or self.detect_network()
+        self.report_network("🌐 Detected network")
+        
+        # One persistent socket per interface instead of one per packet
+        self.sender = sender or BurstSender(iface=self.network_info.get("iface") or default_interface())
         
-        # Initial flags - these will be updated based on game state
-        self.flags = {
-            "http": "CTF{HTTP_H3AD3R_FL4G}",
-            "dns": "CTF{DNS_3XF1LTR4T10N}",
-            "ftp": "CTF{FTP_CR3D3NT14LS}",
-            "icmp": "CTF{1CMP_C0V3RT_CH4NN3L}",
-            "arp": "CTF{ARP_SP00F1NG_D3T3CT3D}",
-            "tcp": "CTF{TCP_STR34M_FL4G}",
-            "caesar1": "CTF{EASY_CAESAR_ONE}",
-            "caesar2": "CTF{EASY_CAESAR_TWO}",
-            "caesar3": "CTF{EASY_CAESAR_THREE}",
-            "plaintext": "CTF{EASY_PLAINTEXT}",
-            "easydns": "CTF{EASY_DNS_FLAG}"
+        # scapy, or the struct-based builder that produces the same bytes faster
+        self.packet_builder = make_packet_builder(packet_backend, self.network_info["local_ip"])
+        # Registry protocol -> packet build, all taking (dst, port, payload)
+        self.protocol_builders = {
+            "tcp": lambda dst, port, load: self.packet_builder.tcp(dst, port, load),
+            "udp": lambda dst, port, load: self.packet_builder.udp(dst, port, load),
+            "icmp": lambda dst, port, load: self.packet_builder.icmp(dst, load),
+            "dns": lambda dst, port, qname: self.packet_builder.dns_query(dst, qname),
+            "arp": lambda dst, port, load: self.packet_builder.arp_broadcast(self.network_info["local_ip"], dst, load)
         }
         
-        # Alternative flags for different steal states
-        self.flag_variations = {
-            "http": [
-                "CTF{HTTP_H3AD3R_FL4G}",
-                "CTF{HTTP_ST0L3N_FL4G}",
-                "CTF{HTTP_N3W_FL4G}",
-                "CTF{HTTP_R3ST0L3N_FL4G}",
-                "CTF{HTTP_F1N4L_FL4G}"
-            ],
-            "dns": [
-                "CTF{DNS_3XF1LTR4T10N}",
-                "CTF{DNS_ST0L3N_FL4G}",
-                "CTF{DNS_N3W_FL4G}",
-                "CTF{DNS_R3ST0L3N_FL4G}",
-                "CTF{DNS_F1N4L_FL4G}"
-            ],
-            "ftp": [
-                "CTF{FTP_CR3D3NT14LS}",
-                "CTF{FTP_ST0L3N_FL4G}",
-                "CTF{FTP_N3W_FL4G}",
-                "CTF{FTP_R3ST0L3N_FL4G}",
-                "CTF{FTP_F1N4L_FL4G}"
-            ],
-            "icmp": [
-                "CTF{1CMP_C0V3RT_CH4NN3L}",
-                "CTF{1CMP_ST0L3N_FL4G}",
-                "CTF{1CMP_N3W_FL4G}",
-                "CTF{1CMP_R3ST0L3N_FL4G}",
-                "CTF{1CMP_F1N4L_FL4G}"
-            ],
-            "arp": [
-                "CTF{ARP_SP00F1NG_D3T3CT3D}",
-                "CTF{ARP_ST0L3N_FL4G}",
-                "CTF{ARP_N3W_FL4G}",
-                "CTF{ARP_R3ST0L3N_FL4G}",
-                "CTF{ARP_F1N4L_FL4G}"
-            ],
-            "tcp": [
-                "CTF{TCP_STR34M_FL4G}",
-                "CTF{TCP_ST0L3N_FL4G}",
-                "CTF{TCP_N3W_FL4G}",
-                "CTF{TCP_R3ST0L3N_FL4G}",
-                "CTF{TCP_F1N4L_FL4G}"
-            ],
-            "caesar1": [
-                "CTF{EASY_CAESAR_ONE}",
-                "CTF{EASY_ST0L3N_ONE}",
-                "CTF{EASY_N3W_ONE}",
-                "CTF{EASY_R3ST0L3N_ONE}",
-                "CTF{EASY_F1N4L_ONE}"
-            ],
-            "caesar2": [
-                "CTF{EASY_CAESAR_TWO}",
-                "CTF{EASY_ST0L3N_TWO}",
-                "CTF{EASY_N3W_TWO}",
-                "CTF{EASY_R3ST0L3N_TWO}",
-                "CTF{EASY_F1N4L_TWO}"
-            ],
-            "caesar3": [
-                "CTF{EASY_CAESAR_THREE}",
-                "CTF{EASY_ST0L3N_THREE}",
-                "CTF{EASY_N3W_THREE}",
-                "CTF{EASY_R3ST0L3N_THREE}",
-                "CTF{EASY_F1N4L_THREE}"
-            ],
-            "plaintext": [
-                "CTF{EASY_PLAINTEXT}",
-                "CTF{EASY_ST0L3N_TEXT}",
-                "CTF{EASY_N3W_TEXT}",
-                "CTF{EASY_R3ST0L3N_TEXT}",
-                "CTF{EASY_F1N4L_TEXT}"
-            ],
-            "easydns": [
-                "CTF{EASY_DNS_FLAG}",
-                "CTF{EASY_ST0L3N_DNS}",
-                "CTF{EASY_N3W_DNS}",
-                "CTF{EASY_R3ST0L3N_DNS}",
-                "CTF{EASY_F1N4L_DNS}"
-            ]
+        # Pre-built wire bytes, rebuilt only when a challenge's flag advances
+        self.packet_cache = PacketCache()
+        
+        # Shared pacing for every send path (unlimited unless configured)
+        self.rate_limiter = rate_limiter or RateLimiter()
+        
+        # Counters and latency histograms, cheap enough to stay on permanently
+        self.metrics = GeneratorMetrics(self)
+        
+        # Each challenge runs on its own timer; jobs can be added or removed live
+        self.scheduler = ChallengeScheduler(
+            on_dispatch=lambda job, late: self.metrics.cycle_drift.observe(late, (job,)),
+            on_error=lambda job, e: self.events.emit("error", f"[SCHEDULER] Job {job} failed: {e}",
+                                                     job=job, stage="scheduler", error=str(e)),
+            clock=self.clock
+        )
+        self.cycle_count = 0
+        
+        # Held while a flag version changes, so readers see the index and
+        # retired_flags agree (the verifier runs on its own thread)
+        self.flag_lock = threading.RLock()
+        # Optional decoy traffic, sent from its own thread (see start_noise)
+        self.noise = None
+        
+        # Challenges, their encodings and flag versions come from challenges.json
+        self.registry = registry or load_challenge_registry()
+        self.flag_variations = {challenge.type: challenge.flags for challenge in self.registry}
+        self.flags = {challenge_type: flags[0] for challenge_type, flags in self.flag_variations.items()}
+        self.flag_encoders = {challenge.type: challenge.encode for challenge in self.registry}
+        # Every fixed flag version encoded up front, one batch per challenge
+        self.encoded_variations = {
+            challenge.type: encode_batch(challenge.encode, challenge.flags) for challenge in self.registry
         }
         
         # Track current flag index for each challenge
-        self.current_flag_index = {
-            "http": 0,
-            "dns": 0,
-            "ftp": 0,
-            "icmp": 0,
-            "arp": 0,
-            "tcp": 0,
-            "caesar1": 0,
-            "caesar2": 0,
-            "caesar3": 0,
-            "plaintext": 0,
-            "easydns": 0
+        self.current_flag_index = {challenge.type: 0 for challenge in self.registry}
+        
+        # challenge -> recent (flag index, monotonic time it was replaced), newest last,
+        # so a just-stolen flag can still be accepted for a short grace period
+        self.retired_flags = {
+            challenge_type: deque(maxlen=RETIRED_FLAG_HISTORY) for challenge_type in self.current_flag_index
         }
+        
+        # With a deriver, flags come from an HMAC of the event secret and never run out
+        self.flag_deriver = flag_deriver
+        # team name -> address; with teams, every challenge goes to each team's address
+        # carrying that team's own flag
+        self.teams = dict(teams or {})
+        self.team_by_address = {address: team for team, address in self.teams.items()}
+        self.report_scapy_loads()
+    
+    def report_network(self, message):
+        if self.network_detector is not None and self.network_detector.fallback:
+            self.events.emit("network", "⚠️  No interface with an IPv4 address; using fallback addresses",
+                             fallback=True)
+        self.events.emit("network", f"{message}: {self.network_info}", network=self.network_info)
+    
+    def report_scapy_loads(self):
+        """Log the scapy modules imported since the last call (each loads on first use)"""
+        if len(SCAPY_LOAD_TIMES) == self.scapy_loads_reported:
+            return
+        with self.report_lock:
+            loaded = list(SCAPY_LOAD_TIMES.items())
+            new = loaded[self.scapy_loads_reported:]
+            self.scapy_loads_reported = len(loaded)
+        for name, seconds in new:
+            self.events.emit("scapy", f"📦 Loaded {name} in {seconds * 1000:.0f} ms",
+                             module=name, seconds=round(seconds, 3))
     
     def detect_network(self):
-        """Detect the current network interface and broadcast address"""
-        try:
-            # Get the default gateway (router IP)
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            s.connect(("8.8.8.8", 80))
-            local_ip = s.getsockname()[0]
-            s.close()
-            
-            # Extract network prefix (assuming /24 subnet)
-            network_prefix = '.'.join(local_ip.split('.')[:-1])
-            broadcast_ip = f"{network_prefix}.255"
-            router_ip = f"{network_prefix}.1"
-            
-            return {
-                "local_ip": local_ip,
-                "broadcast_ip": broadcast_ip,
-                "router_ip": router_ip,
-                "network_prefix": network_prefix
-            }
-        except Exception as e:
-            print(f"⚠️  Network detection failed: {e}")
-            # Fallback to common network addresses
-            return {
-                "local_ip": "192.168.1.100",
-                "broadcast_ip": "192.168.1.255",
-                "router_ip": "192.168.1.1",
-                "network_prefix": "192.168.1"
-            }
-        
-    def get_current_flag(self, challenge_type):
-        """Get the current flag for a challenge type"""
-        if challenge_type in self.flag_variations:
-            index = self.current_flag_index[challenge_type]
-            return self.flag_variations[challenge_type][index]
+        """Detect the local interface, subnet, gateway and broadcast address (cached)"""
+        return DETECTOR.get()
+    
+    def refresh_network(self):
+        """Pick up a changed interface, address or gateway; returns True if anything changed"""
+        if self.network_detector is None:
+            return False
+        self.network_detector.refresh()
+        info = self.network_detector.get()
+        if info is self.network_info:
+            return False
+        self.network_info = info
+        self.report_network("🌐 Network changed")
+        # Everything built so far carries the old addresses
+        self.packet_builder = make_packet_builder(self.packet_builder.name, info["local_ip"])
+        self.packet_cache.clear()
+        if isinstance(self.sender, BurstSender) and info["iface"] and info["iface"] != self.sender.iface:
+            # Waits for bursts still using the old interface's sockets
+            self.sender.switch_interface(info["iface"])
+        if self.noise:
+            pps, mix, background = self.noise.pps, self.noise.mix, self.noise.thread is not None
+            self.stop_noise()
+            self.start_noise(pps, mix, background)
+        return True
+    
+    def get_current_flag(self, challenge_type, team=None):
+        """Get the current flag for a challenge type (and team, with derived flags)"""
+        if challenge_type in self.current_flag_index:
+            return self.flag_for(challenge_type, self.current_flag_index[challenge_type], team)
         return self.flags.get(challenge_type, "FLAG_NOT_FOUND")
     
+    def flag_for(self, challenge_type, index, team=None):
+        """A specific flag version, derived per team when a flag deriver is set"""
+        if self.flag_deriver is not None:
+            return self.flag_deriver.derive(team, challenge_type, index)
+        return self.flag_variations[challenge_type][index]
+    
+    def flag_limit(self, challenge_type):
+        """Number of flag versions, or None when they are derived and unlimited"""
+        if self.flag_deriver is not None:
+            return None
+        return len(self.flag_variations[challenge_type])
+    
     def advance_flag(self, challenge_type):
         """Advance to the next flag for a challenge type (called when stolen)"""
         if challenge_type in self.current_flag_index:
-            self.current_flag_index[challenge_type] = min(
-                self.current_flag_index[challenge_type] + 1,
-                len(self.flag_variations[challenge_type]) - 1
-            )
-            print(f"[FLAG UPDATE] {challenge_type} flag advanced to: {self.get_current_flag(challenge_type)}")
+            with self.flag_lock:
+                index = self.current_flag_index[challenge_type] + 1
+                limit = self.flag_limit(challenge_type)
+                if limit is not None:
+                    index = min(index, limit - 1)
+                if index == self.current_flag_index[challenge_type]:
+                    # Already on the last fixed version: keep it and its cached packets
+                    return
+                self.retire_flag(challenge_type, index)
+                self.current_flag_index[challenge_type] = index
+            self.packet_cache.invalidate(challenge_type)
+            self.events.emit("flag", f"[FLAG UPDATE] {challenge_type} flag advanced to: {self.get_current_flag(challenge_type)}",
+                             challenge=challenge_type, index=index)
     
-    def generate_http_traffic(self):
-        """Generate HTTP traffic with flag in User-Agent header using raw packets"""
-        flag = self.get_current_flag("http")
-        encoded_flag = base64.b64encode(flag.encode()).decode()
-        
-        # Create HTTP request as raw packet
-        http_request = f"""GET /secret HTTP/1.1
-Host: ctf-challenge.local
-User-Agent: {encoded_flag}
-Accept: */*
-Connection: close
+    def check_flag_index(self, challenge_type, index):
+        """Raise IndexError unless a challenge has this flag version"""
+        limit = self.flag_limit(challenge_type)
+        if index < 0 or (limit is not None and index >= limit):
+            if limit is None:
+                raise IndexError(f"{challenge_type} flag indexes can't be negative")
+            raise IndexError(f"{challenge_type} has flag indexes 0-{limit - 1}")
 
-"""
-        
-        # Send HTTP packet using scapy to make it visible on network
-        try:
-            # Send to multiple destinations to ensure visibility
-            destinations = [
-                self.network_info["broadcast_ip"],  # Broadcast to all devices
-                self.network_info["router_ip"],     # Router
-                "8.8.8.8",                          # Google DNS
-                "1.1.1.1"                           # Cloudflare DNS
-            ]
-            
-            for dst in destinations:
-                try:
-                    http_packet = IP(dst=dst)/TCP(dport=80)/Raw(load=http_request)
-                    send(http_packet, verbose=False)
-                    time.sleep(0.1)
-                except Exception as e:
-                    print(f"[HTTP] Error sending to {dst}: {e}")
-            
-            print(f"[HTTP] Sent flag to multiple destinations: {flag}")
-        except Exception as e:
-            print(f"[HTTP] Error sending packet: {e}")
-    
-    def generate_dns_traffic(self):
-        """Generate DNS traffic with flag in subdomain"""
-        flag = self.get_current_flag("dns")
-        hex_flag = binascii.hexlify(flag.encode()).decode()
-        
-        # Create DNS query with flag in subdomain
-        dns_query = f"{hex_flag}.ctf-challenge.local"
-        
-        # Send DNS query using scapy
-        try:
-            # Send to multiple DNS servers for better visibility
-            dns_servers = ["8.8.8.8", "1.1.1.1", "208.67.222.222"]
-            
-            for dns_server in dns_servers:
-                try:
-                    dns_packet = IP(dst=dns_server)/UDP(dport=53)/DNS(rd=1, qd=DNSQR(qname=dns_query))
-                    send(dns_packet, verbose=False)
-                    time.sleep(0.1)
-                except Exception as e:
-                    print(f"[DNS] Error sending to {dns_server}: {e}")
-            
-            print(f"[DNS] Sent flag to multiple DNS servers: {flag}")
-        except Exception as e:
-            print(f"[DNS] Error sending packet: {e}")
+    def set_flag_index(self, challenge_type, index):
+        """Jump a challenge to a specific flag version (0 resets it)"""
+        self.check_flag_index(challenge_type, index)
+        with self.flag_lock:
+            self.retire_flag(challenge_type, index)
+            self.current_flag_index[challenge_type] = index
+        self.packet_cache.invalidate(challenge_type)
+        self.events.emit("flag", f"[FLAG UPDATE] {challenge_type} flag set to: {self.get_current_flag(challenge_type)}",
+                         challenge=challenge_type, index=index)
     
-    def generate_ftp_traffic(self):
-        """Generate FTP traffic with flag in password using raw packets"""
-        flag = self.get_current_flag("ftp")
-        
-        ftp_commands = [
-            f"USER admin\r\n",
-            f"PASS {flag}\r\n"
-        ]
-        
-        # Send FTP commands as raw packets
-        try:
-            destinations = [
-                self.network_info["broadcast_ip"],
-                self.network_info["router_ip"],
-                "8.8.8.8"
-            ]
-            
-            for dst in destinations:
-                for cmd in ftp_commands:
-                    try:
-                        ftp_packet = IP(dst=dst)/TCP(dport=21)/Raw(load=cmd)
-                        send(ftp_packet, verbose=False)
-                        time.sleep(0.1)
-                    except Exception as e:
-                        print(f"[FTP] Error sending to {dst}: {e}")
-            
-            print(f"[FTP] Sent flag to multiple destinations: {flag}")
-        except Exception as e:
-            print(f"[FTP] Error sending packet: {e}")
+    def retire_flag(self, challenge_type, new_index):
+        """Remember when the current flag version stopped being sent"""
+        old_index = self.current_flag_index[challenge_type]
+        if old_index != new_index:
+            self.retired_flags[challenge_type].append((old_index, self.clock.monotonic()))
     
-    def generate_icmp_traffic(self):
-        """Generate ICMP traffic with flag in payload"""
-        flag = self.get_current_flag("icmp")
-        hex_flag = binascii.hexlify(flag.encode()).decode()
-        
-        # Send ICMP packet with flag in payload
-        try:
-            destinations = [
-                self.network_info["broadcast_ip"],
-                self.network_info["router_ip"],
-                "8.8.8.8",
-                "1.1.1.1"
-            ]
-            
-            for dst in destinations:
-                try:
-                    icmp_packet = IP(dst=dst)/ICMP()/Raw(load=hex_flag)
-                    send(icmp_packet, verbose=False)
-                    time.sleep(0.1)
-                except Exception as e:
-                    print(f"[ICMP] Error sending to {dst}: {e}")
-            
-            print(f"[ICMP] Sent flag to multiple destinations: {flag}")
-        except Exception as e:
-            print(f"[ICMP] Error sending packet: {e}")
+    def resend_challenge(self, challenge_type):
+        """Send one challenge right away, outside its normal schedule"""
+        self.generate_challenge_traffic(challenge_type)
     
-    def generate_arp_traffic(self):
-        """Generate ARP traffic with flag in payload"""
-        flag = self.get_current_flag("arp")
-        hex_flag = binascii.hexlify(flag.encode()).decode()
-        
-        # Send ARP packet with flag in payload
-        try:
-            # ARP broadcast to all devices on network
-            arp_packet = Ether(dst="ff:ff:ff:ff:ff:ff")/ARP(
-                op=1, 
-                psrc=self.network_info["local_ip"], 
-                pdst=self.network_info["broadcast_ip"]
-            )/Raw(load=hex_flag)
-            send(arp_packet, verbose=False)
-            print(f"[ARP] Sent flag via broadcast: {flag}")
-        except Exception as e:
-            print(f"[ARP] Error sending packet: {e}")
-    
-    def generate_tcp_traffic(self):
-        """Generate TCP traffic with flag in payload"""
-        flag = self.get_current_flag("tcp")
-        hex_flag = binascii.hexlify(flag.encode()).decode()
-        
-        # Send TCP packet with flag in payload
-        try:
-            destinations = [
-                self.network_info["broadcast_ip"],
-                self.network_info["router_ip"],
-                "8.8.8.8",
-                "1.1.1.1"
-            ]
-            
-            for dst in destinations:
-                try:
-                    tcp_packet = IP(dst=dst)/TCP(dport=80)/Raw(load=hex_flag)
-                    send(tcp_packet, verbose=False)
-                    time.sleep(0.1)
-                except Exception as e:
-                    print(f"[TCP] Error sending to {dst}: {e}")
-            
-            print(f"[TCP] Sent flag to multiple destinations: {flag}")
-        except Exception as e:
-            print(f"[TCP] Error sending packet: {e}")
-    
-    def generate_caesar_challenges(self):
-        # Caesar I: TCP port 1337, shift 3, marker 'CAESAR1'
-        flag1 = self.caesar_cipher(self.get_current_flag("caesar1"), 3)
-        destinations = [self.network_info["broadcast_ip"], self.network_info["router_ip"], "8.8.8.8"]
-        for dst in destinations:
-            try:
-                pkt1 = IP(dst=dst)/TCP(dport=1337)/Raw(load=f"CAESAR1:{flag1}")
-                send(pkt1, verbose=False)
-                time.sleep(0.1)
-            except Exception as e:
-                print(f"[CAESAR1] Error sending to {dst}: {e}")
-        print(f"[CAESAR1] Sent: {flag1}")
+    def send_packets(self, label, packets, layer=3, challenge_type=None):
+        """Send a burst of (destination, wire_bytes) pairs and report failures"""
+        challenge_type = challenge_type or label.lower()
+        if self.rate_limiter.enabled and packets:
+            # Paced piece by piece, so a long burst (a TCP stream) can't go out back to back
+            chunks = self.rate_limiter.split(challenge_type, packets)
+        else:
+            chunks = [packets]
+        errors = []
+        send_seconds = 0.0
+        for chunk in chunks:
+            if self.rate_limiter.enabled:
+                self.rate_limiter.acquire(challenge_type, len(chunk), sum(len(wire) for _, wire in chunk))
+            started = time.perf_counter()
+            errors.extend(self.sender.send_burst(chunk, layer=layer))
+            send_seconds += time.perf_counter() - started
+        self.metrics.send_seconds.observe(send_seconds, (challenge_type,))
+        delivered = self.metrics.record_burst(challenge_type, packets, errors)
+        index = self.current_flag_index.get(challenge_type)
+        for dst, e in errors:
+            self.events.emit("error", f"[{label}] Error sending to {dst}: {e}", challenge=challenge_type,
+                             index=index, destination=dst, stage="send", error=str(e))
+        for dst, (count, size) in delivered.items():
+            if count:
+                self.events.emit("send", sample=True, challenge=challenge_type, index=index,
+                                 destination=dst, packets=count, bytes=size, outcome="sent")
 
-        # Caesar II: UDP port 4242, shift 5, marker 'CAESAR2'
-        flag2 = self.caesar_cipher(self.get_current_flag("caesar2"), 5)
+    def send_challenge(self, challenge_type, label, destinations, build, layer=3):
+        """Send a challenge's cached packets to every destination as one burst"""
+        started = time.perf_counter()
+        index = self.current_flag_index[challenge_type]
+        packets = []
         for dst in destinations:
             try:
-                pkt2 = IP(dst=dst)/UDP(dport=4242)/Raw(load=f"CAESAR2:{flag2}")
-                send(pkt2, verbose=False)
-                time.sleep(0.1)
+                wires = self.packet_cache.get_or_build(challenge_type, index, dst, build)
             except Exception as e:
-                print(f"[CAESAR2] Error sending to {dst}: {e}")
-        print(f"[CAESAR2] Sent: {flag2}")
+                self.metrics.record_error(challenge_type, "build", e)
+                self.events.emit("error", f"[{label}] Error building packet for {dst}: {e}",
+                                 challenge=challenge_type, index=index, destination=dst,
+                                 stage="build", error=str(e))
+                continue
+            packets.extend((dst, wire) for wire in wires)
+        self.metrics.build_seconds.observe(time.perf_counter() - started, (challenge_type,))
+        self.send_packets(label, packets, layer=layer, challenge_type=challenge_type)
 
-        # Caesar III: ICMP, shift 7, marker 'CAESAR3'
-        flag3 = self.caesar_cipher(self.get_current_flag("caesar3"), 7)
-        for dst in destinations:
-            try:
-                pkt3 = IP(dst=dst)/ICMP()/Raw(load=f"CAESAR3:{flag3}")
-                send(pkt3, verbose=False)
-                time.sleep(0.1)
-            except Exception as e:
-                print(f"[CAESAR3] Error sending to {dst}: {e}")
-        print(f"[CAESAR3] Sent: {flag3}")
+    def encode_flag(self, challenge_type, flag):
+        """Encode a flag the way its challenge puts it on the wire"""
+        return self.flag_encoders[challenge_type](flag)
 
-    def caesar_cipher(self, text, shift):
-        result = ''
-        for char in text:
-            if char.isalpha():
-                base = ord('A') if char.isupper() else ord('a')
-                result += chr((ord(char) - base + shift) % 26 + base)
+    def get_encoded_flag(self, challenge_type, index=None, team=None):
+        """Get a flag version (current by default) encoded, cached per version and team"""
+        if index is None:
+            index = self.current_flag_index[challenge_type]
+        if self.flag_deriver is None:
+            return self.encoded_variations[challenge_type][index]
+        # Derived flags are unlimited, so they are encoded on first use instead
+        return self.packet_cache.get_encoded(
+            challenge_type, index if team is None else (index, team),
+            lambda: self.encode_flag(challenge_type, self.flag_for(challenge_type, index, team))
+        )
+
+    def build_challenge_packets(self, challenge_type, dst):
+        """Build a challenge's packets for one destination from its registry entry"""
+        challenge = self.registry[challenge_type]
+        encoded_flag = self.get_encoded_flag(challenge_type, team=self.team_by_address.get(dst))
+        payloads = challenge.render_payloads(encoded_flag)
+        if challenge.protocol in STREAM_PROTOCOLS:
+            # Each payload is a whole TCP session of segment_size pieces
+            return [
+                packet for payload in payloads
+                for packet in self.packet_builder.tcp_stream(dst, challenge.port, payload, challenge.segment_size)
+            ]
+        build = self.protocol_builders[challenge.protocol]
+        return [build(dst, challenge.port, payload) for payload in payloads]
+
+    def generate_challenge_traffic(self, challenge_type):
+        """Send one challenge to all of its destinations"""
+        challenge = self.registry[challenge_type]
+        if self.teams:
+            destinations = list(self.teams.values())
+        else:
+            destinations = challenge.resolve_destinations(self.network_info)
+        try:
+            self.send_challenge(challenge_type, challenge.label, destinations,
+                                functools.partial(self.build_challenge_packets, challenge_type),
+                                layer=challenge.layer)
+            index = self.current_flag_index[challenge_type]
+            if self.teams:
+                message = f"[{challenge.label}] Sent flag version {index} to {len(self.teams)} teams"
             else:
-                result += char
-        return result
+                message = (f"[{challenge.label}] "
+                           f"{challenge.describe(self.get_current_flag(challenge_type), self.get_encoded_flag(challenge_type))}")
+            self.events.emit("challenge", message, challenge=challenge_type, index=index)
+        except Exception as e:
+            self.events.emit("error", f"[{challenge.label}] Error sending packet: {e}",
+                             challenge=challenge_type, stage="challenge", error=str(e))
+
+    def generate_challenge_group(self, group):
+        """Send every challenge in a group (e.g. the three Caesar challenges)"""
+        for challenge in self.registry.groups[group]:
+            self.generate_challenge_traffic(challenge.type)
+
+    # Per-challenge entry points kept for scripts written against the old API;
+    # each one just sends that challenge from the registry
+    def generate_http_traffic(self):
+        self.generate_challenge_traffic("http")
+
+    def generate_dns_traffic(self):
+        self.generate_challenge_traffic("dns")
+
+    def generate_ftp_traffic(self):
+        self.generate_challenge_traffic("ftp")
+
+    def generate_icmp_traffic(self):
+        self.generate_challenge_traffic("icmp")
+
+    def generate_arp_traffic(self):
+        self.generate_challenge_traffic("arp")
+
+    def generate_tcp_traffic(self):
+        self.generate_challenge_traffic("tcp")
+
+    def generate_caesar1_traffic(self):
+        self.generate_challenge_traffic("caesar1")
+
+    def generate_caesar2_traffic(self):
+        self.generate_challenge_traffic("caesar2")
+
+    def generate_caesar3_traffic(self):
+        self.generate_challenge_traffic("caesar3")
+
+    def generate_caesar_challenges(self):
+        self.generate_challenge_group("caesar")
+
+    def generate_plaintext_traffic(self):
+        self.generate_challenge_traffic("plaintext")
+
+    def generate_easydns_traffic(self):
+        self.generate_challenge_traffic("easydns")
 
     def generate_easy_challenges(self):
-        # Plaintext Flag: TCP port 2024, marker 'PLAINTEXT'
-        flag1 = self.get_current_flag("plaintext")
-        destinations = [self.network_info["broadcast_ip"], self.network_info["router_ip"], "8.8.8.8"]
-        for dst in destinations:
-            try:
-                pkt1 = IP(dst=dst)/TCP(dport=2024)/Raw(load=f"PLAINTEXT:{flag1}")
-                send(pkt1, verbose=False)
-                time.sleep(0.1)
-            except Exception as e:
-                print(f"[PLAINTEXT] Error sending to {dst}: {e}")
-        print(f"[PLAINTEXT] Sent: {flag1}")
-
-        # Easy DNS Flag: subdomain 'easydnsflag'
-        flag2 = self.get_current_flag("easydns")
-        dns_query = f"easydnsflag.{flag2.lower().replace('{', '').replace('}', '')}.ctf.local"
-        dns_servers = ["8.8.8.8", "1.1.1.1", "208.67.222.222"]
-        for dns_server in dns_servers:
-            try:
-                pkt2 = IP(dst=dns_server)/UDP(dport=53)/DNS(rd=1, qd=DNSQR(qname=dns_query))
-                send(pkt2, verbose=False)
-                time.sleep(0.1)
-            except Exception as e:
-                print(f"[EASY_DNS_FLAG] Error sending to {dns_server}: {e}")
-        print(f"[EASY_DNS_FLAG] Sent: {flag2}")
+        self.generate_challenge_group("easy")
+
+    def caesar_cipher(self, text, shift):
+        return caesar_cipher(text, shift)
 
     def generate_specific_challenge(self, challenge_id):
         """Generate traffic for a specific challenge only"""
-        print(f"Generating traffic for challenge {challenge_id}...")
+        challenge = self.registry.by_id.get(challenge_id)
+        if challenge is None:
+            self.events.emit("error", f"Unknown challenge ID: {challenge_id}", stage="challenge",
+                             error="unknown challenge id")
+            return
+        self.events.emit("challenge", f"Generating traffic for challenge {challenge_id}...",
+                         challenge=challenge.type)
+        self.generate_challenge_traffic(challenge.type)
+
+    def challenge_senders(self):
+        """The method that sends each individual challenge type"""
+        return {
+            challenge.type: functools.partial(self.generate_challenge_traffic, challenge.type)
+            for challenge in self.registry
+        }
+
+    def challenge_jobs(self):
+        """Challenge groups in registry order"""
+        return [
+            (group, functools.partial(self.generate_challenge_group, group))
+            for group in self.registry.groups
+        ]
+
+    def start_cycle(self):
+        """Print the cycle header and advance flags every few cycles"""
+        self.cycle_count += 1
+        self.events.emit("cycle", f"\n⏰ {self.clock.strftime('%H:%M:%S')} - Generating traffic (Cycle {self.cycle_count})...",
+                         cycle=self.cycle_count)
+        self.refresh_network()
         
-        if challenge_id == 1:
-            self.generate_http_traffic()
-        elif challenge_id == 2:
-            self.generate_dns_traffic()
-        elif challenge_id == 3:
-            self.generate_ftp_traffic()
-        elif challenge_id == 4:
-            self.generate_icmp_traffic()
-        elif challenge_id == 5:
-            self.generate_arp_traffic()
-        elif challenge_id == 6:
-            self.generate_tcp_traffic()
-        elif challenge_id == 7:
-            # Caesar I
-            flag = self.caesar_cipher(self.get_current_flag("caesar1"), 3)
-            destinations = [self.network_info["broadcast_ip"], self.network_info["router_ip"], "8.8.8.8"]
-            for dst in destinations:
-                try:
-                    pkt = IP(dst=dst)/TCP(dport=1337)/Raw(load=f"CAESAR1:{flag}")
-                    send(pkt, verbose=False)
-                    time.sleep(0.1)
-                except Exception as e:
-                    print(f"[CAESAR1] Error sending to {dst}: {e}")
-            print(f"[CAESAR1] Sent: {flag}")
-        elif challenge_id == 8:
-            # Caesar II
-            flag = self.caesar_cipher(self.get_current_flag("caesar2"), 5)
-            destinations = [self.network_info["broadcast_ip"], self.network_info["router_ip"], "8.8.8.8"]
-            for dst in destinations:
-                try:
-                    pkt = IP(dst=dst)/UDP(dport=4242)/Raw(load=f"CAESAR2:{flag}")
-                    send(pkt, verbose=False)
-                    time.sleep(0.1)
-                except Exception as e:
-                    print(f"[CAESAR2] Error sending to {dst}: {e}")
-            print(f"[CAESAR2] Sent: {flag}")
-        elif challenge_id == 9:
-            # Caesar III
-            flag = self.caesar_cipher(self.get_current_flag("caesar3"), 7)
-            destinations = [self.network_info["broadcast_ip"], self.network_info["router_ip"], "8.8.8.8"]
-            for dst in destinations:
-                try:
-                    pkt = IP(dst=dst)/ICMP()/Raw(load=f"CAESAR3:{flag}")
-                    send(pkt, verbose=False)
-                    time.sleep(0.1)
-                except Exception as e:
-                    print(f"[CAESAR3] Error sending to {dst}: {e}")
-            print(f"[CAESAR3] Sent: {flag}")
-        elif challenge_id == 10:
-            # Plaintext
-            flag = self.get_current_flag("plaintext")
-            destinations = [self.network_info["broadcast_ip"], self.network_info["router_ip"], "8.8.8.8"]
-            for dst in destinations:
-                try:
-                    pkt = IP(dst=dst)/TCP(dport=2024)/Raw(load=f"PLAINTEXT:{flag}")
-                    send(pkt, verbose=False)
-                    time.sleep(0.1)
-                except Exception as e:
-                    print(f"[PLAINTEXT] Error sending to {dst}: {e}")
-            print(f"[PLAINTEXT] Sent: {flag}")
-        elif challenge_id == 11:
-            # Easy DNS
-            flag = self.get_current_flag("easydns")
-            dns_query = f"easydnsflag.{flag.lower().replace('{', '').replace('}', '')}.ctf.local"
-            dns_servers = ["8.8.8.8", "1.1.1.1", "208.67.222.222"]
-            for dns_server in dns_servers:
-                try:
-                    pkt = IP(dst=dns_server)/UDP(dport=53)/DNS(rd=1, qd=DNSQR(qname=dns_query))
-                    send(pkt, verbose=False)
-                    time.sleep(0.1)
-                except Exception as e:
-                    print(f"[EASY_DNS_FLAG] Error sending to {dns_server}: {e}")
-            print(f"[EASY_DNS_FLAG] Sent: {flag}")
-        else:
-            print(f"Unknown challenge ID: {challenge_id}")
+        # Automatically advance flags every 3 cycles (90 seconds)
+        if self.cycle_count % ADVANCE_EVERY_CYCLES == 0:
+            self.events.emit("advance", "🔄 Advancing all flags for dynamic gameplay...", cycle=self.cycle_count)
+            for challenge_type in self.current_flag_index.keys():
+                self.advance_flag(challenge_type)
 
-    def run_all_traffic(self):
-        """Generate all types of network traffic"""
+    def run_all_traffic(self, schedule=None, advance_flags=True):
+        """
+        Generate all types of network traffic, each challenge on its own timer.
+        schedule maps a job name from challenge_jobs() to {"interval": s, "jitter": s};
+        the defaults reproduce the old serial loop (2 s apart, 30 s pause).
+        advance_flags=False leaves flag changes to someone else (a shard coordinator).
+        """
         print("🚀 Starting CTF Network Traffic Generator...")
         print("📡 Generating traffic for all challenges...")
         print("=" * 50)
-        cycle_count = 0
-        while True:
-            cycle_count += 1
-            print(f"\n⏰ {time.strftime('%H:%M:%S')} - Generating traffic (Cycle {cycle_count})...")
-            
-            # Automatically advance flags every 3 cycles (90 seconds)
-            if cycle_count % 3 == 0:
-                print("🔄 Advancing all flags for dynamic gameplay...")
-                for challenge_type in self.current_flag_index.keys():
-                    self.advance_flag(challenge_type)
-            
-            self.generate_http_traffic()
-            time.sleep(2)
-            self.generate_dns_traffic()
-            time.sleep(2)
-            self.generate_ftp_traffic()
-            time.sleep(2)
-            self.generate_icmp_traffic()
-            time.sleep(2)
-            self.generate_arp_traffic()
-            time.sleep(2)
-            self.generate_tcp_traffic()
-            time.sleep(2)
-            self.generate_caesar_challenges()
-            time.sleep(2)
-            self.generate_easy_challenges()
-            time.sleep(2)
-            print("✅ All traffic generated. Waiting 30 seconds before next cycle...")
-            time.sleep(30)
-
-def main():
+        self.schedule_traffic(schedule, advance_flags)
+        self.scheduler.run_forever()
+
+    def cycle_interval(self):
+        """Seconds per cycle: every challenge group CHALLENGE_GAP apart, then CYCLE_IDLE"""
+        return len(self.challenge_jobs()) * CHALLENGE_GAP + CYCLE_IDLE
+
+    def schedule_advances(self):
+        """Add just the cycle job (cycle headers and flag advances); returns the cycle length"""
+        cycle_interval = self.cycle_interval()
+        self.cycle_count = 0
+        self.scheduler.add_job("cycle", self.start_cycle, cycle_interval, inline=True)
+        return cycle_interval
+
+    def schedule_traffic(self, schedule=None, advance_flags=True):
+        """Add the cycle and challenge jobs to the scheduler without starting it; returns the cycle length"""
+        schedule = schedule or {}
+        jobs = self.challenge_jobs()
+        cycle_interval = self.cycle_interval()
+        
+        self.cycle_count = 0
+        if advance_flags:
+            self.schedule_advances()
+        for offset, (name, func) in enumerate(jobs):
+            options = schedule.get(name, {})
+            self.scheduler.add_job(
+                name, func,
+                options.get("interval", cycle_interval),
+                jitter=options.get("jitter", 0.0),
+                delay=offset * CHALLENGE_GAP
+            )
+        return cycle_interval
+
+    def simulate(self, duration, schedule=None, advance_flags=True):
+        """
+        Run duration seconds of the normal schedule on this thread, in the
+        generator's clock. With a VirtualClock (and a Null/RecordingSender)
+        hours of cycles, flag advances and sends take well under a second.
+        Returns the number of jobs run.
+        """
+        self.schedule_traffic(schedule, advance_flags)
+        if self.noise is not None and self.noise.thread is None:
+            # No noise thread in simulated time: its batches are jobs too
+            self.scheduler.add_job("noise", self.noise.send_batch, self.noise.batch_size / self.noise.pps)
+        try:
+            return self.scheduler.run_until(self.clock.monotonic() + duration)
+        finally:
+            for name in list(self.scheduler.jobs):
+                self.scheduler.remove_job(name)
+
+    def start_noise(self, pps, mix=None, background=True):
+        """
+        Start background decoy traffic at pps packets per second alongside the
+        challenges. With background=False no thread is started; simulate()
+        then sends the noise batches as scheduler jobs.
+        """
+        # Separate sockets, so noise bursts never hold the challenges' send lock
+        if isinstance(self.sender, BurstSender):
+            sender = BurstSender(iface=self.sender.iface)
+        else:
+            sender = self.sender
+        self.noise = NoiseGenerator(self.packet_builder, self.network_info, sender,
+                                    pps=pps, mix=mix, metrics=self.metrics,
+                                    clock=self.clock, rate_limiter=self.rate_limiter)
+        if background:
+            self.noise.start()
+        self.events.emit("noise", f"🔊 Background noise: {pps:g} packets/s ({', '.join(self.noise.mix)})",
+                         pps=pps, mix=self.noise.mix)
+        return self.noise
+    
+    def stop_noise(self):
+        if self.noise:
+            self.noise.stop()
+            if self.noise.sender is not self.sender:
+                self.noise.sender.close()
+            self.noise = None
+    
+    def flag_signatures(self):
+        """
+        One regex finding an encoded flag in a packet, built from each challenge's
+        payload template the way the capture scanner does, plus a map from its
+        named groups to the signatures (challenges) a match may belong to. Its
+        size depends on the challenges only, not on the teams or flag versions.
+        """
+        alternatives = {}
+        for challenge in self.registry:
+            if challenge.protocol in STREAM_PROTOCOLS:
+                continue  # split over segments; see replay_stream_segment
+            signature = Signature(challenge)
+            alternatives.setdefault(signature.pattern, []).append(signature)
+        groups = {}
+        patterns = []
+        for number, (pattern, signatures) in enumerate(alternatives.items()):
+            name = f"f{number}"
+            groups[name] = signatures
+            patterns.append(pattern.replace(b"(?P<flag>", b"(?P<%s>" % name.encode()))
+        return re.compile(b"|".join(patterns)), groups
+
+    def flag_version(self, challenge_type, encoded):
+        """(index, team) of an encoded flag, or None if it isn't one of this challenge's versions"""
+        current = self.current_flag_index[challenge_type]
+        # Derived flags are unlimited; recognise the first few dozen versions
+        # (the capture may come from a run that got further than this one)
+        limit = self.flag_limit(challenge_type) or max(current + 1, REPLAY_MAX_INDEX + 1)
+        # Only derived flags differ per team
+        teams = list(self.teams) if self.flag_deriver is not None and self.teams else [None]
+        for team in teams:
+            for index in range(limit):
+                if self.encode_flag(challenge_type, self.flag_for(challenge_type, index, team)).encode() == encoded:
+                    return index, team
+        return None
+
+    def substitute_flag(self, data, layer, old, new):
+        """Swap one encoded flag for another, letting scapy redo lengths and checksums"""
+        inet = scapy_module("scapy.layers.inet")
+        IP, TCP, UDP, ICMP = inet.IP, inet.TCP, inet.UDP, inet.ICMP
+        Raw, Padding = scapy_module("scapy.packet").Raw, scapy_module("scapy.packet").Padding
+        DNSQR = scapy_module("scapy.layers.dns").DNSQR
+        Ether = scapy_module("scapy.layers.l2").Ether
+        self.report_scapy_loads()
+        if layer == 2:
+            # The ARP challenge: flag bytes trail the ARP header as padding
+            pkt = Ether(bytes(data))
+            for payload_cls in (Raw, Padding):
+                if payload_cls in pkt:
+                    pkt[payload_cls].load = pkt[payload_cls].load.replace(old, new)
+            return bytes(pkt)
+        
+        pkt = IP(bytes(data))
+        if DNSQR in pkt and UDP in pkt and pkt[UDP].dport == 53:
+            pkt[DNSQR].qname = pkt[DNSQR].qname.replace(old, new)
+        else:
+            # Don't trust scapy's guess at the payload (UDP from port 53 looks
+            # like DNS to it); cut the raw bytes after the transport header
+            header_len = (data[0] & 0x0F) * 4
+            if pkt.proto == 6:
+                header_len += (data[header_len + 12] >> 4) * 4
+            else:
+                header_len += 8
+            transport = pkt.getlayer(1)
+            transport.remove_payload()
+            transport.add_payload(Raw(load=bytes(data[header_len:]).replace(old, new)))
+        
+        for layer_cls, fields in ((IP, ("len", "chksum")), (TCP, ("chksum",)),
+                                  (UDP, ("len", "chksum")), (ICMP, ("chksum",))):
+            if layer_cls in pkt:
+                for field in fields:
+                    delattr(pkt[layer_cls], field)
+        return bytes(pkt)
+
+    def replay_stream_segment(self, data, stream_ports, sessions):
+        """
+        Packets to send in place of a recorded TCP segment of a stream challenge
+        session, as (challenge, [(dst, wire), ...]); None for any other packet.
+        The session is rebuilt with the current flag and its packets are handed
+        out one per recorded packet, with the teardown lined up with the
+        recorded FINs, so a flag of a different length still makes a whole
+        session with consistent sequence numbers.
+        """
+        header = (data[0] & 0x0F) * 4
+        if len(data) < header + 20:
+            return None
+        sport, dport, seq = TCP_PORTS_SEQ.unpack_from(data, header)
+        flags = data[header + 13]
+        if dport in stream_ports:
+            client, key = True, (bytes(data[16:20]), sport)
+        elif sport in stream_ports:
+            client, key = False, (bytes(data[12:16]), dport)
+        else:
+            return None
+        
+        if client and flags == TCP_FLAGS_SYN:
+            dst = socket.inet_ntoa(data[16:20])
+            # Only sessions the generator made: their port and ISN are fixed per destination
+            if (sport, seq) == stream_numbers(dst, dport)[:2]:
+                challenge_type = stream_ports[dport]
+                wires = self.packet_cache.get_or_build(
+                    challenge_type, self.current_flag_index[challenge_type], dst,
+                    functools.partial(self.build_challenge_packets, challenge_type))
+                sessions[key] = {"challenge": challenge_type, "dst": dst, "wires": wires, "next": 0}
+        session = sessions.get(key)
+        if session is None:
+            return None
+        
+        wires, position = session["wires"], session["next"]
+        # The last three packets: client FIN, server FIN, client ACK
+        tail = len(wires) - 3
+        if flags & TCP_FLAGS_FIN and client:
+            # Whatever is left of the body goes out ahead of the FIN
+            out = wires[position:tail + 1]
+            session["next"] = tail + 1
+        elif flags & TCP_FLAGS_FIN:
+            out = wires[tail + 1:tail + 2]
+            session["next"] = tail + 2
+        elif position >= tail + 2:
+            out = wires[tail + 2:]
+            del sessions[key]
+        elif position < tail:
+            out = wires[position:position + 1]
+            session["next"] = position + 1
+        else:
+            out = ()  # the recorded flag was longer; its extra segments are dropped
+        return session["challenge"], [(session["dst"], wire) for wire in out]
+
+    def replay_pcap(self, path, speed=1.0, loop=False):
+        """
+        Replay a capture through the persistent sender. speed scales the original
+        inter-packet gaps (2.0 = twice as fast, 0 = as fast as possible). Any flag
+        found in the capture is swapped for its challenge's current version;
+        stream challenge sessions are rebuilt whole with it.
+        """
+        pattern, groups = self.flag_signatures()
+        # (challenge, encoded flag) -> (index, team) or None, looked up once each
+        versions = {}
+        stream_ports = {challenge.port: challenge.type for challenge in self.registry
+                        if challenge.protocol in STREAM_PROTOCOLS}
+        tcp_protocol = socket.IPPROTO_TCP
+        # (record, current index) -> rewritten wire bytes, so each distinct
+        # stale packet goes through scapy once per flag version
+        rewritten = {}
+        sent = 0
+        reader = PcapReader(path)
+        try:
+            while True:
+                first_timestamp = None
+                started = self.clock.monotonic()
+                # (server address, client port) -> stream session being replayed
+                sessions = {}
+                for timestamp, layer, data in reader.records():
+                    if first_timestamp is None:
+                        first_timestamp = timestamp
+                    if speed:
+                        delay = (timestamp - first_timestamp) / speed - (self.clock.monotonic() - started)
+                        if delay > 0:
+                            self.clock.sleep(delay)
+                    
+                    if layer == 3 and stream_ports and data[9] == tcp_protocol:
+                        stream = self.replay_stream_segment(data, stream_ports, sessions)
+                        if stream is not None:
+                            challenge_type, packets = stream
+                            if packets:
+                                self.send_packets("REPLAY", packets, challenge_type=challenge_type)
+                                sent += len(packets)
+                            continue
+                    
+                    challenge_type = None
+                    match = pattern.search(data)
+                    version = None
+                    if match:
+                        name = match.lastgroup
+                        signatures = groups[name]
+                        old = bytes(data[match.start(name) - signatures[0].lead:match.end(name)])
+                        # Challenges with the same payload layout are told apart by their flags
+                        for signature in signatures:
+                            key = (signature.challenge.type, old)
+                            if key not in versions:
+                                if len(versions) >= REPLAY_REWRITE_CACHE:
+                                    versions.clear()
+                                versions[key] = self.flag_version(*key)
+                            version = versions[key]
+                            if version is not None:
+                                challenge_type = signature.challenge.type
+                                break
+                    if version is not None:
+                        index, team = version
+                        current = self.current_flag_index[challenge_type]
+                        if index != current:
+                            key = (data, current)
+                            wire = rewritten.get(key)
+                            if wire is None:
+                                if len(rewritten) >= REPLAY_REWRITE_CACHE:
+                                    rewritten.clear()
+                                new = self.get_encoded_flag(challenge_type, team=team).encode()
+                                wire = self.substitute_flag(data, layer, old, new)
+                                rewritten[key] = wire
+                            data = wire
+                    
+                    dst = socket.inet_ntoa(data[16:20]) if layer == 3 else self.network_info["broadcast_ip"]
+                    self.send_packets("REPLAY", [(dst, data)], layer=layer,
+                                      challenge_type=challenge_type or "replay")
+                    sent += 1
+                if not loop:
+                    break
+        finally:
+            rewritten.clear()
+            reader.close()
+        return sent
+
+    def export_traffic(self, cycles, start_time=None):
+        """
+        Run whole cycles back to back without sleeping, stamping each packet
+        with the time it would have gone out live. Meant for a PcapWriter sender.
+        """
+        jobs = self.challenge_jobs()
+        cycle_interval = self.cycle_interval()
+        start_time = self.clock.time() if start_time is None else start_time
+        
+        for cycle in range(cycles):
+            cycle_start = start_time + cycle * cycle_interval
+            self.sender.timestamp = cycle_start
+            self.start_cycle()
+            for offset, (name, func) in enumerate(jobs):
+                self.sender.timestamp = cycle_start + offset * CHALLENGE_GAP
+                func()
+
+def report_startup():
+    """Print how long the generator took to get ready and whether scapy was needed"""
+    elapsed = (time.perf_counter() - STARTED) * 1000
+    if SCAPY_LOAD_TIMES:
+        scapy_ms = sum(SCAPY_LOAD_TIMES.values()) * 1000
+        print(f"⚡ Ready in {elapsed:.0f} ms ({scapy_ms:.0f} ms of it loading scapy layers)")
+    else:
+        print(f"⚡ Ready in {elapsed:.0f} ms (scapy layers load on each challenge's first use)")
+
+def replay_pcap(path, speed, loop, packet_backend="scapy", flag_deriver=None, teams=None,
+                control_port=DEFAULT_CONTROL_PORT, control_token=None, rate_limiter=None,
+                control_origins=None, event_log=None, quiet=False):
+    """
+    Replay a capture file onto the network. Flags advance on the live schedule
+    and through the control channel (unless control_port is None) meanwhile,
+    so the replayed packets carry whatever version is current.
+    """
+    generator = CTFNetworkGenerator(rate_limiter=rate_limiter, packet_backend=packet_backend,
+                                    flag_deriver=flag_deriver, teams=teams,
+                                    events=EventLog(event_log, console=not quiet))
+    generator.events.start()
+    control_server = None
+    if control_port is not None:
+        control_server = ControlServer(generator, control_port, token=control_token,
+                                       origins=control_origins).start()
+        print(f"🎛️  Flag control at http://127.0.0.1:{control_server.port}/advance")
+    # Only the cycle job runs: the capture supplies the traffic
+    generator.schedule_advances()
+    generator.scheduler.start()
+    try:
+        sent = generator.replay_pcap(path, speed=speed, loop=loop)
+        generator.events.emit("replay", f"📼 Replayed {sent} packets from {path}",
+                              path=str(path), packets=sent)
+    except KeyboardInterrupt:
+        generator.events.emit("replay", "\n🛑 Replay stopped by user.", path=str(path), outcome="stopped")
+    finally:
+        generator.scheduler.stop()
+        if control_server:
+            control_server.stop()
+        generator.sender.close()
+        generator.events.stop()
+
+def export_pcap(path, cycles, packet_backend="scapy", flag_deriver=None, teams=None,
+                event_log=None, quiet=False):
+    """Write a number of traffic cycles to a capture file"""
+    writer = PcapWriter(path)
+    # Written synchronously: the export runs on this thread alone
+    generator = CTFNetworkGenerator(sender=writer, packet_backend=packet_backend,
+                                    flag_deriver=flag_deriver, teams=teams,
+                                    events=EventLog(event_log, console=not quiet))
+    started = time.perf_counter()
+    try:
+        generator.export_traffic(cycles)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - started
+    generator.events.emit("export", f"💾 Wrote {writer.packets_sent} packets ({writer.bytes_sent} bytes, "
+                          f"{cycles} cycles) to {path} in {elapsed:.2f}s",
+                          path=str(path), packets=writer.packets_sent, bytes=writer.bytes_sent,
+                          cycles=cycles, seconds=round(elapsed, 3))
+    generator.events.stop()
+
+def simulate(duration, packet_backend="scapy", rate_options=None, flag_deriver=None, teams=None,
+             event_log=None, quiet=False, noise_pps=None, noise_mix=None):
+    """Run a stretch of the live schedule in simulated time, sending nothing"""
+    clock = VirtualClock()
+    sender = NullSender()
+    # The network is detected once: nothing changes during simulated time
+    generator = CTFNetworkGenerator(sender=sender, packet_backend=packet_backend,
+                                    rate_limiter=RateLimiter(**(rate_options or {}), clock=clock),
+                                    network_info=DETECTOR.get(), flag_deriver=flag_deriver,
+                                    teams=teams, clock=clock,
+                                    # Written synchronously: nothing is sampled or dropped,
+                                    # and timestamps are simulated
+                                    events=EventLog(event_log, console=not quiet, clock=clock))
+    if noise_pps:
+        generator.start_noise(noise_pps, noise_mix, background=False)
+    started = time.perf_counter()
+    try:
+        runs = generator.simulate(duration)
+    finally:
+        generator.stop_noise()
+        generator.events.stop()
+    elapsed = time.perf_counter() - started
+    print(f"\n🧪 Simulated {duration:g}s ({generator.cycle_count} cycles, {runs} jobs, "
+          f"{sender.packets_sent} packets) in {elapsed:.2f}s")
+    print("🏁 Flag versions: " + ", ".join(
+        f"{challenge_type}={index}" for challenge_type, index in generator.current_flag_index.items()))
+    return generator
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate CTF challenge traffic on the local network")
+    parser.add_argument("--pps", type=float,
+                        help="global packets-per-second ceiling across all challenges")
+    parser.add_argument("--bandwidth", type=float,
+                        help="global bandwidth ceiling in bytes per second")
+    parser.add_argument("--challenge-pps", action="append", metavar="CHALLENGE=PPS",
+                        help="per-challenge packets-per-second cap, e.g. http=5 (repeatable)")
+    parser.add_argument("--pcap-out", metavar="FILE",
+                        help="write the traffic to a .pcap/.pcapng file instead of sending it (no root needed)")
+    parser.add_argument("--cycles", type=int, default=1,
+                        help="number of cycles to write with --pcap-out (default: 1)")
+    parser.add_argument("--backend", choices=("scapy", "native"), default="scapy",
+                        help="packet builder: scapy, or the faster struct-based native builder "
+                             "(byte-identical output; scapy still builds the ARP frame)")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--control-port", type=int, default=DEFAULT_CONTROL_PORT,
+                        help=f"localhost port for flag advance/set-index/reset commands (default: {DEFAULT_CONTROL_PORT})")
+    parser.add_argument("--control-token",
+                        help="value control commands must send in X-Control-Token "
+                             f"(default: ${TOKEN_ENV}, else a random token printed at startup)")
+    parser.add_argument("--control-origin", action="append", metavar="ORIGIN",
+                        help="browser origin allowed to use the control and verification listeners, e.g. "
+                             "https://scoreboard.example (repeatable; default: localhost and 127.0.0.1 on any port)")
+    parser.add_argument("--no-control", action="store_true",
+                        help="don't start the flag control listener")
+    parser.add_argument("--noise-pps", type=float,
+                        help="also send this many packets per second of decoy background traffic")
+    parser.add_argument("--noise-mix", action="append", metavar="KIND=WEIGHT",
+                        help="relative share of a noise kind: http, dns, icmp, tcp or udp, "
+                             "e.g. dns=50 (repeatable; unset kinds keep their defaults)")
+    parser.add_argument("--flag-secret", default=os.environ.get("CTF_FLAG_SECRET"),
+                        help="derive flags as an HMAC of this event secret instead of the fixed lists "
+                             "(default: $CTF_FLAG_SECRET); flags then never run out")
+    parser.add_argument("--teams", metavar="FILE",
+                        help="JSON object of team name -> address; each team is sent its own "
+                             "derived flags (needs --flag-secret)")
+    parser.add_argument("--shard", action="append", metavar="IFACE[=CIDR]",
+                        help="run a worker process on this interface, optionally for an explicit subnet "
+                             "(repeatable; all shards share one flag schedule)")
+    parser.add_argument("--verify-port", type=int, default=DEFAULT_VERIFY_PORT,
+                        help=f"localhost port for the flag verification service (default: {DEFAULT_VERIFY_PORT})")
+    parser.add_argument("--no-verify", action="store_true",
+                        help="don't start the flag verification service")
+    parser.add_argument("--verify-grace", type=float, default=DEFAULT_GRACE,
+                        help=f"seconds a replaced flag is still accepted (default: {DEFAULT_GRACE:g})")
+    parser.add_argument("--verify-rate", type=float, default=DEFAULT_USER_RATE,
+                        help=f"flag submissions per second allowed per team, or per user without --teams "
+                             f"(default: {DEFAULT_USER_RATE:g})")
+    parser.add_argument("--verify-global-rate", type=float, default=DEFAULT_GLOBAL_RATE,
+                        help=f"flag submissions per second allowed from everyone together, 0 for no cap "
+                             f"(default: {DEFAULT_GLOBAL_RATE:g})")
+    parser.add_argument("--event-log", metavar="FILE",
+                        help="append every event (cycles, flag changes, per-destination sends, errors) "
+                             "to FILE as JSON lines")
+    parser.add_argument("--quiet", action="store_true",
+                        help="don't print the per-challenge status lines")
+    parser.add_argument("--simulate", type=float, metavar="SECONDS",
+                        help="run this many seconds of the schedule in simulated time, sending nothing "
+                             "(hours take well under a second)")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="replay a capture file instead of generating traffic")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed multiplier; 0 replays as fast as possible (default: 1.0)")
+    parser.add_argument("--loop", action="store_true",
+                        help="keep replaying the capture until interrupted")
+    args = parser.parse_args(argv)
+    try:
+        # --simulate 0 would otherwise quietly run live
+        for option in ("pps", "bandwidth", "simulate"):
+            if getattr(args, option) is not None:
+                setattr(args, option, parse_rate(getattr(args, option), f"--{option}"))
+        args.challenge_pps = parse_challenge_rates(
+            args.challenge_pps, [challenge.type for challenge in load_challenge_registry()])
+        args.noise_mix = parse_noise_mix(args.noise_mix)
+        args.teams = load_teams(args.teams) if args.teams else None
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    if args.teams and not args.flag_secret:
+        parser.error("--teams needs --flag-secret (or CTF_FLAG_SECRET)")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    
     print("🎯 CTF Network Traffic Generator")
     print("=" * 40)
     print("This script generates the network traffic needed for CTF challenges.")
     print("Users must capture this traffic with Wireshark to find the flags.")
     print("=" * 40)
     
-    generator = CTFNetworkGenerator()
+    flag_deriver = FlagDeriver(args.flag_secret) if args.flag_secret else None
+    if args.pcap_out:
+        export_pcap(args.pcap_out, args.cycles, args.backend, flag_deriver, args.teams,
+                    args.event_log, args.quiet)
+        return
+    
+    rate_options = {
+        "pps": args.pps,
+        "bandwidth": args.bandwidth,
+        "challenge_pps": args.challenge_pps
+    }
+    control_token = args.control_token or os.environ.get(TOKEN_ENV)
+    if not control_token and not args.no_control:
+        control_token = secrets.token_urlsafe(16)
+        print(f"🔑 Control token: {control_token}")
+        print(f"   Open the scoreboard once with ?controlToken={control_token} to let it advance flags")
+    if args.replay:
+        replay_pcap(args.replay, args.speed, args.loop, args.backend, flag_deriver, args.teams,
+                    None if args.no_control else args.control_port, control_token,
+                    RateLimiter(**rate_options), args.control_origin, args.event_log, args.quiet)
+        return
+    if args.simulate is not None:
+        simulate(args.simulate, args.backend, rate_options, flag_deriver, args.teams,
+                 args.event_log, args.quiet, args.noise_pps, args.noise_mix)
+        return
+    rate_limiter = RateLimiter(**rate_options)
+    events = EventLog(args.event_log, console=not args.quiet)
+    if args.shard:
+        # Imported here: sharding subclasses CTFNetworkGenerator from this module
+        from sharding import ShardCoordinator
+        # Every shard gets its own copy of the rate limits
+        generator = ShardCoordinator(args.shard, args.backend, rate_options,
+                                     flag_secret=args.flag_secret, teams=args.teams, events=events)
+    else:
+        generator = CTFNetworkGenerator(rate_limiter=rate_limiter, packet_backend=args.backend,
+                                        flag_deriver=flag_deriver, teams=args.teams, events=events)
+    report_startup()
+    # Status lines and the event log are written from a background thread from here on
+    generator.events.start()
+    metrics_server = None
+    if args.metrics_port is not None:
+        metrics_server = MetricsServer(generator.metrics, args.metrics_port).start()
+        print(f"📈 Metrics at http://127.0.0.1:{metrics_server.port}/metrics")
+    control_server = None
+    if not args.no_control:
+        control_server = ControlServer(generator, args.control_port, token=control_token,
+                                       origins=args.control_origin).start()
+        print(f"🎛️  Flag control at http://127.0.0.1:{control_server.port}/advance")
+    verify_server = None
+    if not args.no_verify:
+        verifier = FlagVerifier(generator, grace=args.verify_grace, user_rate=args.verify_rate,
+                                global_rate=args.verify_global_rate)
+        verify_server = VerificationServer(verifier, args.verify_port, origins=args.control_origin).start()
+        print(f"🔐 Flag verification at http://127.0.0.1:{verify_server.port}/verify")
+    if args.noise_pps:
+        generator.start_noise(args.noise_pps, args.noise_mix)
     
     try:
         generator.run_all_traffic()
     except KeyboardInterrupt:
         print("\n🛑 Traffic generation stopped by user.")
         print("Thanks for using CTF Network Traffic Generator!")
+    finally:
+        generator.scheduler.stop()
+        generator.stop_noise()
+        generator.sender.close()
+        generator.events.stop()
+        if metrics_server:
+            metrics_server.stop()
+        if control_server:
+            control_server.stop()
+        if verify_server:
+            verify_server.stop()
+        if rate_limiter.enabled and not args.shard:
+            stats = rate_limiter.stats()
+            print(f"📊 Rate limiter: {stats['throttled']} of {stats['requests']} bursts throttled "
+                  f"({stats['throttled_seconds']}s waiting)")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
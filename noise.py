@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Background noise traffic for the CTF network generator.
+Fills the capture with plausible decoy traffic (web requests, DNS lookups,
+pings and chatter on the challenge ports) so the flags have to be found
+rather than simply being the only packets on the wire. Packets are built in
+batches into a pool up front and sent from their own thread and sockets, so
+noise never holds up the flag traffic's sends. Under --pps and --bandwidth,
+noise only gets the spare capacity: packets that don't fit right now are
+skipped rather than waited for, so flag traffic never waits behind noise.
+"""
+
+import random
+import threading
+
+from clock import SYSTEM_CLOCK
+
+NOISE_PORTS = (1337, 4242, 2024)
+DEFAULT_NOISE_MIX = {"http": 30, "dns": 30, "icmp": 15, "tcp": 15, "udp": 10}
+NOISE_POOL_SIZE = 1024
+NOISE_BATCH_SIZE = 64
+# Fraction of the pool rebuilt after every full pass, so the capture doesn't
+# repeat the exact same packets
+NOISE_REFRESH = 0.125
+
+PUBLIC_HOSTS = ("8.8.8.8", "8.8.4.4", "1.1.1.1", "9.9.9.9", "208.67.222.222")
+DOMAINS = (
+    "www.google.com", "github.com", "pypi.org", "www.wikipedia.org", "cdn.jsdelivr.net",
+    "api.github.com", "fonts.googleapis.com", "ocsp.digicert.com", "time.windows.com",
+    "detectportal.firefox.com", "connectivitycheck.gstatic.com", "update.ubuntu.com"
+)
+HTTP_PATHS = (
+    "/", "/index.html", "/login", "/api/v1/status", "/static/app.js", "/static/style.css",
+    "/favicon.ico", "/images/logo.png", "/search?q=wireshark", "/robots.txt"
+)
+USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_2) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Safari/605.1.15",
+    "curl/8.4.0",
+    "python-requests/2.31.0"
+)
+CHATTER = (
+    "HELLO", "PING", "PONG", "STATUS OK", "READY", "ACK", "SYNC", "HEARTBEAT",
+    "GET /status", "LOGIN guest", "NOOP", "BYE"
+)
+
+
+def parse_noise_mix(values):
+    """Parse ["http=50", "dns=20"] into {"http": 50.0, "dns": 20.0}"""
+    mix = {}
+    for value in values or []:
+        kind, sep, weight = value.partition("=")
+        kind = kind.strip()
+        if not sep:
+            raise ValueError(f"expected KIND=WEIGHT, got {value!r}")
+        if kind not in DEFAULT_NOISE_MIX:
+            raise ValueError(f"unknown noise kind {kind!r}, expected one of {', '.join(DEFAULT_NOISE_MIX)}")
+        mix[kind] = float(weight)
+    return mix
+
+
+class NoiseGenerator:
+    """Sends a steady stream of decoy packets from a pre-built pool"""
+
+    def __init__(self, packet_builder, network_info, sender, pps=1000, mix=None,
+                 pool_size=NOISE_POOL_SIZE, batch_size=NOISE_BATCH_SIZE, metrics=None, seed=None,
+                 clock=SYSTEM_CLOCK, rate_limiter=None):
+        if pps <= 0:
+            raise ValueError("noise pps must be positive")
+        self.packet_builder = packet_builder
+        self.sender = sender
+        self.pps = float(pps)
+        # Kinds left out of mix keep their default weight; a weight of 0 disables one
+        mix = dict(DEFAULT_NOISE_MIX, **(mix or {}))
+        self.mix = {kind: weight for kind, weight in mix.items() if weight > 0}
+        if not self.mix:
+            raise ValueError("noise mix has no positive weights")
+        self.pool_size = pool_size
+        self.batch_size = max(1, min(batch_size, pool_size))
+        self.metrics = metrics
+        self.random = random.Random(seed)
+        self.clock = clock
+        self.rate_limiter = rate_limiter
+
+        local_hosts = [network_info["broadcast_ip"], network_info["router_ip"]]
+        self.destinations = {
+            "http": local_hosts + list(PUBLIC_HOSTS),
+            "dns": [network_info["router_ip"]] + list(PUBLIC_HOSTS),
+            "icmp": local_hosts + list(PUBLIC_HOSTS),
+            "tcp": local_hosts + list(PUBLIC_HOSTS),
+            "udp": local_hosts + list(PUBLIC_HOSTS)
+        }
+        self.builders = {
+            "http": self.build_http,
+            "dns": self.build_dns,
+            "icmp": self.build_icmp,
+            "tcp": self.build_tcp,
+            "udp": self.build_udp
+        }
+
+        self.pool = []
+        self.position = 0
+        self.errors = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def build_http(self, dst):
+        rng = self.random
+        request = (f"GET {rng.choice(HTTP_PATHS)} HTTP/1.1\r\n"
+                   f"Host: {rng.choice(DOMAINS)}\r\n"
+                   f"User-Agent: {rng.choice(USER_AGENTS)}\r\n"
+                   "Accept: */*\r\n"
+                   "Connection: keep-alive\r\n\r\n")
+        return self.packet_builder.tcp(dst, 80, request)
+
+    def build_dns(self, dst):
+        return self.packet_builder.dns_query(dst, self.random.choice(DOMAINS))
+
+    def build_icmp(self, dst):
+        # Echo payload shaped like ping's: 8 bytes of timestamp, then filler
+        return self.packet_builder.icmp(dst, self.random.randbytes(8) + bytes(range(0x10, 0x38)))
+
+    def build_tcp(self, dst):
+        return self.packet_builder.tcp(dst, self.random.choice(NOISE_PORTS), self.chatter())
+
+    def build_udp(self, dst):
+        return self.packet_builder.udp(dst, self.random.choice(NOISE_PORTS), self.chatter())
+
+    def chatter(self):
+        return f"{self.random.choice(CHATTER)} {self.random.getrandbits(32):08x}\n"
+
+    def build_batch(self, count):
+        """Build count (destination, wire_bytes) pairs in the configured mix"""
+        kinds = self.random.choices(list(self.mix), weights=list(self.mix.values()), k=count)
+        batch = []
+        for kind in kinds:
+            dst = self.random.choice(self.destinations[kind])
+            try:
+                batch.append((dst, self.builders[kind](dst)))
+            except Exception as e:
+                self.errors += 1
+                if self.metrics:
+                    self.metrics.record_error("noise", "build", e)
+        return batch
+
+    def fill_pool(self):
+        """Build the whole pool, one batch at a time (stops early if asked to)"""
+        self.pool = []
+        while len(self.pool) < self.pool_size and not self.stop_event.is_set():
+            batch = self.build_batch(min(self.batch_size, self.pool_size - len(self.pool)))
+            if not batch:
+                break  # every build failed; don't spin on a broken builder
+            self.pool.extend(batch)
+        self.position = 0
+
+    def refresh_pool(self):
+        """Rebuild a random slice of the pool with fresh packets"""
+        if not self.pool:
+            return
+        count = max(1, int(len(self.pool) * NOISE_REFRESH))
+        start = self.random.randrange(len(self.pool))
+        for offset, packet in enumerate(self.build_batch(count)):
+            self.pool[(start + offset) % len(self.pool)] = packet
+
+    def next_batch(self):
+        """The next batch_size packets from the pool, wrapping around"""
+        end = self.position + self.batch_size
+        batch = self.pool[self.position:end]
+        if end >= len(self.pool):
+            end -= len(self.pool)
+            batch += self.pool[:end]
+            self.refresh_pool()
+        self.position = end
+        return batch
+
+    def send_batch(self):
+        """Send as much of the next batch as the rate limits have spare; returns the packets delivered"""
+        if not self.pool:
+            self.fill_pool()
+            if not self.pool:
+                return 0  # every build failed
+        batch = self.next_batch()
+        limiter = self.rate_limiter
+        if limiter is not None and limiter.enabled:
+            batch = batch[:limiter.take_spare("noise", batch)]
+            if not batch:
+                return 0
+        errors = self.sender.send_burst(batch)
+        self.errors += len(errors)
+        if self.metrics:
+            self.metrics.record_burst("noise", batch, errors)
+        return len(batch) - len(errors)
+
+    def run(self):
+        """Send batches at the configured rate until stopped"""
+        if not self.pool:
+            self.fill_pool()
+        interval = self.batch_size / self.pps
+        next_send = self.clock.monotonic()
+        while not self.stop_event.is_set():
+            self.send_batch()
+            next_send += interval
+            delay = next_send - self.clock.monotonic()
+            if delay > 0:
+                self.clock.wait(self.stop_event, delay)
+            elif delay < -interval:
+                # Fell behind (slow sends); don't try to catch up in a burst
+                next_send = self.clock.monotonic()
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="ctf-noise", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
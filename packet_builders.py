@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Packet builders for the CTF network generator.
+ScapyPacketBuilder builds through scapy's layer objects. NativePacketBuilder
+writes the same IPv4/TCP/UDP/ICMP/DNS headers directly with struct and
+produces byte-identical packets far faster, using scapy only once for the
+ARP frame's Ethernet/ARP header. Both can also build a whole TCP session
+(handshake, the payload split over acknowledged segments, FIN); the native
+one fills in pre-built headers and patches their checksums incrementally.
+"""
+
+import array
+import importlib
+import socket
+import struct
+import sys
+import time
+import zlib
+
+# scapy's defaults for the fields the generator never sets, which the native
+# builder copies so both produce the same bytes
+IP_ID = 1
+IP_TTL = 64
+TCP_SPORT = 20          # ftp_data
+TCP_FLAGS_FIN = 0x01
+TCP_FLAGS_SYN = 0x02
+TCP_FLAGS_PSH = 0x08
+TCP_FLAGS_ACK = 0x10
+TCP_WINDOW = 8192
+UDP_SPORT = 53
+ICMP_ECHO_REQUEST = 8
+DNS_FLAGS_RD = 0x0100
+DNS_TYPE_A = 1
+DNS_CLASS_IN = 1
+
+# Ethernet header + ARP request; the target protocol address is its last field
+ARP_FRAME_LEN = 14 + 28
+ARP_TPA_OFFSET = ARP_FRAME_LEN - 4
+
+# TCP sessions: payload bytes per data segment, the client's ephemeral port
+# range, and sequence numbers wrap at 2**32
+DEFAULT_SEGMENT_SIZE = 8
+STREAM_SPORT_BASE = 49152
+STREAM_SPORT_RANGE = 16384
+SEQ_MOD = 1 << 32
+
+PROTO_ICMP = 1
+PROTO_TCP = 6
+PROTO_UDP = 17
+
+IP_HEADER = struct.Struct("!BBHHHBBH4s4s")
+TCP_HEADER = struct.Struct("!HHIIBBHHH")
+UDP_HEADER = struct.Struct("!HHHH")
+ICMP_HEADER = struct.Struct("!BBHHH")
+DNS_HEADER = struct.Struct("!HHHHHH")
+PSEUDO_HEADER = struct.Struct("!4s4sBBH")
+WORD = struct.Struct("!H")
+SEQ_ACK = struct.Struct("!II")
+
+
+# scapy modules imported so far and how long each took; nothing from scapy is
+# imported until a challenge that needs it is first built
+SCAPY_LOAD_TIMES = {}
+
+
+def scapy_module(name):
+    """Import a single scapy module on first use instead of all of scapy up front"""
+    module = sys.modules.get(name)
+    if module is None:
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        # The generator logs new entries (report_scapy_loads)
+        SCAPY_LOAD_TIMES[name] = time.perf_counter() - started
+    return module
+
+
+def ones_sum(data):
+    """One's-complement sum of data as big-endian 16-bit words, summed natively by array"""
+    if len(data) % 2:
+        data += b"\x00"
+    total = sum(array.array("H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total = (total + (total >> 16)) & 0xFFFF
+    # One's-complement sums are byte-order independent; swap once at the end
+    if sys.byteorder == "little":
+        total = ((total >> 8) | (total << 8)) & 0xFFFF
+    return total
+
+
+def checksum(data):
+    """RFC 1071 internet checksum"""
+    return ~ones_sum(data) & 0xFFFF
+
+
+def update_checksum(chksum, old, new):
+    """
+    RFC 1624 incremental update (eqn. 3, HC' = ~(~HC + ~m + m')): the checksum
+    after words summing to old are replaced by words summing to new. new may
+    be an unfolded sum of several words.
+    """
+    total = (~chksum & 0xFFFF) + (~old & 0xFFFF) + new
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def encode_load(load):
+    return load.encode() if isinstance(load, str) else bytes(load)
+
+
+def encode_qname(name):
+    """DNS wire format for a dotted name"""
+    labels = [label for label in name.rstrip(".").split(".") if label]
+    return b"".join(bytes([len(label)]) + label.encode() for label in labels) + b"\x00"
+
+
+def stream_numbers(dst, dport):
+    """
+    Client port and initial sequence numbers of the TCP session to a
+    destination, fixed per destination and port so a rebuilt stream (and the
+    scapy and native builds of it) match byte for byte
+    """
+    client_isn = zlib.crc32(f"{dst}:{dport}".encode())
+    server_isn = zlib.crc32(f"{dport}:{dst}".encode())
+    return STREAM_SPORT_BASE + client_isn % STREAM_SPORT_RANGE, client_isn, server_isn
+
+
+def tcp_session(client, server, payload, segment_size, client_isn, server_isn):
+    """
+    A whole TCP session as packets: handshake, payload in segment_size pieces
+    each acknowledged by the server, then FIN from both ends. client and
+    server build one segment from (seq, ack, flags, payload).
+    """
+    if segment_size < 1:
+        raise ValueError("segment_size must be at least 1")
+    seq, ack = client_isn, (server_isn + 1) % SEQ_MOD
+    packets = [client(seq, 0, TCP_FLAGS_SYN)]
+    seq = (seq + 1) % SEQ_MOD
+    packets.append(server(server_isn, seq, TCP_FLAGS_SYN | TCP_FLAGS_ACK))
+    packets.append(client(seq, ack, TCP_FLAGS_ACK))
+    for offset in range(0, len(payload), segment_size):
+        chunk = payload[offset:offset + segment_size]
+        packets.append(client(seq, ack, TCP_FLAGS_PSH | TCP_FLAGS_ACK, chunk))
+        seq = (seq + len(chunk)) % SEQ_MOD
+        packets.append(server(ack, seq, TCP_FLAGS_ACK))
+    packets.append(client(seq, ack, TCP_FLAGS_FIN | TCP_FLAGS_ACK))
+    seq = (seq + 1) % SEQ_MOD
+    packets.append(server(ack, seq, TCP_FLAGS_FIN | TCP_FLAGS_ACK))
+    packets.append(client(seq, (ack + 1) % SEQ_MOD, TCP_FLAGS_ACK))
+    return packets
+
+
+class TCPSegmentTemplate:
+    """
+    One direction of a TCP connection with its IPv4 and TCP headers built
+    once. segment() fills in sequence numbers, flags and payload and patches
+    both checksums incrementally, so its cost doesn't depend on the headers
+    or on how long the stream is.
+    """
+
+    def __init__(self, source, destination, sport, dport):
+        # Checksums of the empty segment with seq, ack and flags all zero
+        ip = IP_HEADER.pack(0x45, 0, 40, IP_ID, 0, IP_TTL, PROTO_TCP, 0, source, destination)
+        tcp = TCP_HEADER.pack(sport, dport, 0, 0, 5 << 4, 0, TCP_WINDOW, 0, 0)
+        self.ip_checksum = checksum(ip)
+        self.tcp_checksum = checksum(PSEUDO_HEADER.pack(source, destination, 0, PROTO_TCP, 20) + tcp)
+        self.header = ip + tcp
+
+    def segment(self, seq, ack, flags, payload=b""):
+        length = len(payload)
+        packet = bytearray(self.header)
+        packet += payload
+        # IP: only the total length changes
+        WORD.pack_into(packet, 2, 40 + length)
+        WORD.pack_into(packet, 10, update_checksum(self.ip_checksum, 40, 40 + length))
+        # TCP: seq, ack and flags were zero, the pseudo-header length was 20
+        changed = (seq >> 16) + (seq & 0xFFFF) + (ack >> 16) + (ack & 0xFFFF) + flags + 20 + length
+        if length:
+            changed += ones_sum(payload)
+        SEQ_ACK.pack_into(packet, 24, seq, ack)
+        packet[33] = flags
+        WORD.pack_into(packet, 36, update_checksum(self.tcp_checksum, 20, changed))
+        return bytes(packet)
+
+
+class NativePacketBuilder:
+    """struct-based builder for the IPv4 challenges; no scapy on the hot path"""
+
+    name = "native"
+
+    def __init__(self, source_ip):
+        self.source = socket.inet_aton(source_ip)
+        # Only imported if the ARP challenge actually runs
+        self.fallback = None
+        self.arp_headers = {}
+        # (dst, dport) -> client and server segment templates
+        self.stream_templates = {}
+
+    def ipv4(self, dst, proto, payload):
+        destination = socket.inet_aton(dst)
+        header = IP_HEADER.pack(0x45, 0, 20 + len(payload), IP_ID, 0, IP_TTL, proto, 0,
+                                self.source, destination)
+        header = header[:10] + struct.pack("!H", checksum(header)) + header[12:]
+        return header + payload
+
+    def transport_checksum(self, dst, proto, segment):
+        pseudo = PSEUDO_HEADER.pack(self.source, socket.inet_aton(dst), 0, proto, len(segment))
+        return checksum(pseudo + segment)
+
+    def tcp(self, dst, dport, load):
+        payload = encode_load(load)
+        segment = TCP_HEADER.pack(TCP_SPORT, dport, 0, 0, 5 << 4, TCP_FLAGS_SYN, TCP_WINDOW, 0, 0) + payload
+        chksum = self.transport_checksum(dst, PROTO_TCP, segment)
+        return self.ipv4(dst, PROTO_TCP, segment[:16] + struct.pack("!H", chksum) + segment[18:])
+
+    def udp(self, dst, dport, load, sport=UDP_SPORT):
+        payload = encode_load(load)
+        datagram = UDP_HEADER.pack(sport, dport, 8 + len(payload), 0) + payload
+        # A computed checksum of zero is sent as all ones (zero means "none")
+        chksum = self.transport_checksum(dst, PROTO_UDP, datagram) or 0xFFFF
+        return self.ipv4(dst, PROTO_UDP, datagram[:6] + struct.pack("!H", chksum) + datagram[8:])
+
+    def icmp(self, dst, load):
+        payload = encode_load(load)
+        message = ICMP_HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, 0, 0) + payload
+        message = message[:2] + struct.pack("!H", checksum(message)) + message[4:]
+        return self.ipv4(dst, PROTO_ICMP, message)
+
+    def dns_query(self, dst, qname):
+        query = DNS_HEADER.pack(0, DNS_FLAGS_RD, 1, 0, 0, 0) + encode_qname(qname) + \
+            struct.pack("!HH", DNS_TYPE_A, DNS_CLASS_IN)
+        return self.udp(dst, 53, query)
+
+    def tcp_stream(self, dst, dport, load, segment_size=DEFAULT_SEGMENT_SIZE):
+        sport, client_isn, server_isn = stream_numbers(dst, dport)
+        templates = self.stream_templates.get((dst, dport))
+        if templates is None:
+            destination = socket.inet_aton(dst)
+            templates = (TCPSegmentTemplate(self.source, destination, sport, dport),
+                         TCPSegmentTemplate(destination, self.source, dport, sport))
+            self.stream_templates[(dst, dport)] = templates
+        client, server = templates
+        return tcp_session(client.segment, server.segment, encode_load(load), segment_size,
+                           client_isn, server_isn)
+
+    def arp_broadcast(self, psrc, pdst, load):
+        # Layer 2 needs the interface MAC and scapy's ARP defaults, so scapy
+        # builds the header once per sender address; after that only the
+        # target address and payload change
+        header = self.arp_headers.get(psrc)
+        if header is None:
+            if self.fallback is None:
+                self.fallback = ScapyPacketBuilder()
+            header = self.fallback.arp_broadcast(psrc, pdst, b"")[:ARP_FRAME_LEN]
+            self.arp_headers[psrc] = header
+        return header[:ARP_TPA_OFFSET] + socket.inet_aton(pdst) + encode_load(load)
+
+
+class ScapyPacketBuilder:
+    """Reference builder using scapy's layer objects"""
+
+    name = "scapy"
+
+    def __init__(self, source_ip=None):
+        # The address of the interface being sent on (a shard's, say); scapy
+        # picks the source from the routing table when it isn't given
+        self.source_ip = source_ip
+
+    def ip(self, dst):
+        inet = scapy_module("scapy.layers.inet")
+        return inet.IP(src=self.source_ip, dst=dst) if self.source_ip else inet.IP(dst=dst)
+
+    def tcp(self, dst, dport, load):
+        inet = scapy_module("scapy.layers.inet")
+        raw = scapy_module("scapy.packet").Raw
+        return bytes(self.ip(dst)/inet.TCP(dport=dport)/raw(load=load))
+
+    def tcp_stream(self, dst, dport, load, segment_size=DEFAULT_SEGMENT_SIZE):
+        inet = scapy_module("scapy.layers.inet")
+        raw = scapy_module("scapy.packet").Raw
+        source = self.source_ip or inet.IP(dst=dst).src
+        sport, client_isn, server_isn = stream_numbers(dst, dport)
+
+        def client(seq, ack, flags, payload=b""):
+            segment = inet.IP(src=source, dst=dst)/inet.TCP(sport=sport, dport=dport, seq=seq, ack=ack, flags=flags)
+            return bytes(segment/raw(load=payload) if payload else segment)
+
+        def server(seq, ack, flags, payload=b""):
+            segment = inet.IP(src=dst, dst=source)/inet.TCP(sport=dport, dport=sport, seq=seq, ack=ack, flags=flags)
+            return bytes(segment/raw(load=payload) if payload else segment)
+
+        return tcp_session(client, server, encode_load(load), segment_size, client_isn, server_isn)
+
+    def udp(self, dst, dport, load):
+        inet = scapy_module("scapy.layers.inet")
+        raw = scapy_module("scapy.packet").Raw
+        return bytes(self.ip(dst)/inet.UDP(dport=dport)/raw(load=load))
+
+    def icmp(self, dst, load):
+        inet = scapy_module("scapy.layers.inet")
+        raw = scapy_module("scapy.packet").Raw
+        return bytes(self.ip(dst)/inet.ICMP()/raw(load=load))
+
+    def dns_query(self, dst, qname):
+        inet = scapy_module("scapy.layers.inet")
+        dns = scapy_module("scapy.layers.dns")
+        return bytes(self.ip(dst)/inet.UDP(dport=53)/dns.DNS(rd=1, qd=dns.DNSQR(qname=qname)))
+
+    def arp_broadcast(self, psrc, pdst, load):
+        l2 = scapy_module("scapy.layers.l2")
+        raw = scapy_module("scapy.packet").Raw
+        return bytes(l2.Ether(dst="ff:ff:ff:ff:ff:ff")/l2.ARP(op=1, psrc=psrc, pdst=pdst)/raw(load=load))
+
+
+def make_packet_builder(backend, source_ip):
+    if backend == "native":
+        return NativePacketBuilder(source_ip)
+    if backend == "scapy":
+        return ScapyPacketBuilder(source_ip)
+    raise ValueError(f"unknown packet backend {backend!r}")
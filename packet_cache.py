@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Cache of fully built wire bytes for the CTF network generator.
+A challenge's packets only change when its flag advances, so they are built
+once per (challenge, flag index, destination) and replayed from here.
+"""
+
+
+class PacketCache:
+    """Wire bytes keyed by (challenge, flag index, destination)"""
+
+    def __init__(self):
+        # challenge -> {(flag_index, destination): (wire_bytes, ...)}
+        self.entries = {}
+        # challenge -> {flag_index: encoded flag}, used for logging
+        self.encodings = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, challenge, index, dst, build):
+        """Return the cached packets for a destination, building them on a miss"""
+        bucket = self.entries.setdefault(challenge, {})
+        key = (index, dst)
+        wires = bucket.get(key)
+        if wires is None:
+            self.misses += 1
+            wires = tuple(bytes(pkt) for pkt in build(dst))
+            bucket[key] = wires
+        else:
+            self.hits += 1
+        return wires
+
+    def get_encoded(self, challenge, index, encode):
+        """Return the encoded flag for a challenge version, encoding it once"""
+        bucket = self.encodings.setdefault(challenge, {})
+        encoded = bucket.get(index)
+        if encoded is None:
+            encoded = encode()
+            bucket[index] = encoded
+        return encoded
+
+    def invalidate(self, challenge):
+        """Drop every cached entry for one challenge"""
+        self.entries.pop(challenge, None)
+        self.encodings.pop(challenge, None)
+
+    def clear(self):
+        """Drop everything, e.g. after the network addresses change"""
+        self.entries.clear()
+        self.encodings.clear()
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.entries.values())
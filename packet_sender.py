@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Packet send backend for the CTF network generator.
+Keeps one raw socket open per interface and layer so a whole challenge
+can be pushed out as a single burst instead of one socket per packet.
+"""
+
+import socket
+import threading
+
+from netinfo import default_route
+
+# Linux constants not exported by every Python build
+ETH_P_ALL = 0x0003
+SO_BINDTODEVICE = getattr(socket, "SO_BINDTODEVICE", 25)
+
+
+class FakeSocket:
+    """In-memory stand-in for a raw socket that records every write"""
+
+    def __init__(self, layer=3, iface=None):
+        self.layer = layer
+        self.iface = iface
+        self.sent = []
+        self.closed = False
+
+    def sendto(self, data, address):
+        self.sent.append((bytes(data), address))
+        return len(data)
+
+    def send(self, data):
+        self.sent.append((bytes(data), None))
+        return len(data)
+
+    def close(self):
+        self.closed = True
+
+
+def default_interface():
+    """Interface of the default route, read from the kernel without importing scapy"""
+    route = default_route()
+    if route:
+        return route[0]
+    # Not Linux (or no default route): let scapy pick, paying its import cost
+    from scapy.config import conf
+    from scapy.interfaces import network_name
+    return network_name(conf.iface)
+
+
+def open_raw_socket(layer, iface):
+    """Open a raw socket for layer 3 (IP header included) or layer 2 frames"""
+    if layer == 2:
+        if not iface:
+            raise ValueError("a layer 2 socket needs an interface name")
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        sock.bind((iface, 0))
+        return sock
+
+    # IPPROTO_RAW implies IP_HDRINCL, so we send the packet exactly as built
+    sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_RAW)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    if iface:
+        sock.setsockopt(socket.SOL_SOCKET, SO_BINDTODEVICE, iface.encode())
+    return sock
+
+
+class BurstSender:
+    """Send bursts of wire-ready packets through long-lived raw sockets"""
+
+    def __init__(self, iface=None, socket_factory=None):
+        self.iface = iface
+        # socket_factory(layer, iface) -> socket; pass FakeSocket for tests
+        self.socket_factory = socket_factory or open_raw_socket
+        self.sockets = {}
+        # Challenges send from several scheduler threads at once
+        self.lock = threading.Lock()
+        # Bursts in flight on the current sockets, as a one-item list that
+        # switch_interface replaces; notified as each burst finishes
+        self.in_flight = [0]
+        self.idle = threading.Condition(self.lock)
+        self.packets_sent = 0
+        self.bytes_sent = 0
+
+    def get_socket(self, layer, iface=None):
+        """Return the cached socket for (layer, iface), opening it on first use"""
+        key = (layer, iface or self.iface)
+        sock = self.sockets.get(key)
+        if sock is None:
+            with self.lock:
+                sock = self.sockets.get(key)
+                if sock is None:
+                    sock = self.socket_factory(layer, key[1])
+                    self.sockets[key] = sock
+        return sock
+
+    def send_burst(self, packets, layer=3, iface=None):
+        """
+        Send a list of (destination, wire_bytes) pairs in one go.
+        Returns a list of (destination, exception) for packets that failed,
+        so one unreachable destination does not abort the rest of the burst.
+        """
+        errors = []
+        with self.lock:
+            in_flight = self.in_flight
+            in_flight[0] += 1
+        sent = 0
+        sent_bytes = 0
+        try:
+            sock = self.get_socket(layer, iface)
+            for dst, data in packets:
+                try:
+                    if layer == 2:
+                        sock.send(data)
+                    else:
+                        sock.sendto(data, (dst, 0))
+                    sent += 1
+                    sent_bytes += len(data)
+                except Exception as e:
+                    errors.append((dst, e))
+        except Exception as e:
+            errors = [(dst, e) for dst, _ in packets]
+        finally:
+            with self.idle:
+                in_flight[0] -= 1
+                self.packets_sent += sent
+                self.bytes_sent += sent_bytes
+                self.idle.notify_all()
+        return errors
+
+    def switch_interface(self, iface):
+        """
+        Send from another interface from now on. The old sockets are closed
+        once the bursts already going out on them have finished.
+        """
+        with self.idle:
+            self.iface = iface
+            old_sockets, self.sockets = self.sockets, {}
+            in_flight, self.in_flight = self.in_flight, [0]
+            self.idle.wait_for(lambda: in_flight[0] == 0)
+        for sock in old_sockets.values():
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def close(self):
+        """Close every socket opened by this sender"""
+        with self.lock:
+            sockets = list(self.sockets.values())
+            self.sockets.clear()
+        for sock in sockets:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+
+class NullSender:
+    """Sender that discards everything; for benchmarks and dry runs"""
+
+    def __init__(self):
+        # Offline export stamps this; accepted here so NullSender can stand in
+        self.timestamp = None
+        self.packets_sent = 0
+        self.bytes_sent = 0
+
+    def send_burst(self, packets, layer=3, iface=None):
+        for _, data in packets:
+            self.packets_sent += 1
+            self.bytes_sent += len(data)
+        return []
+
+    def close(self):
+        pass
+
+
+class RecordingSender(NullSender):
+    """NullSender that also keeps (time, layer, destination, wire bytes) for every packet"""
+
+    def __init__(self, clock):
+        super().__init__()
+        self.clock = clock
+        self.sent = []
+
+    def send_burst(self, packets, layer=3, iface=None):
+        now = self.clock.time()
+        self.sent.extend((now, layer, dst, data) for dst, data in packets)
+        return super().send_burst(packets, layer, iface)
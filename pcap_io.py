@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+pcap/pcapng support for the CTF network generator.
+PcapWriter is a drop-in replacement for BurstSender that streams every
+packet into a capture file instead of onto the network (no root needed).
+PcapReader walks a capture through mmap without copying the records.
+"""
+
+import mmap
+import struct
+import time
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101          # bare IPv4/IPv6 packets, no link header
+
+PCAP_MAGIC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# Synthetic link header for layer 3 packets in classic pcap files, which
+# only allow one link type per file: broadcast dst, zero src, IPv4
+ETHER_IPV4_HEADER = b"\xff" * 6 + b"\x00" * 6 + b"\x08\x00"
+
+ETHERTYPE_IPV4 = b"\x08\x00"
+
+SNAPLEN = 65535
+WRITE_BUFFER = 1 << 20
+
+
+def is_pcapng_path(path):
+    return str(path).lower().endswith(".pcapng")
+
+
+class PcapWriter:
+    """Buffered, incremental pcap/pcapng writer with a BurstSender interface"""
+
+    def __init__(self, path, pcapng=None):
+        self.path = path
+        self.pcapng = is_pcapng_path(path) if pcapng is None else pcapng
+        self.file = open(path, "wb", buffering=WRITE_BUFFER)
+        # Set by offline export to stamp packets on a simulated timeline;
+        # None means wall-clock time
+        self.timestamp = None
+        self.packets_sent = 0
+        self.bytes_sent = 0
+        self._write_header()
+
+    def _write_header(self):
+        if not self.pcapng:
+            self.file.write(struct.pack("<IHHiIII", PCAP_MAGIC, 2, 4, 0, 0, SNAPLEN, LINKTYPE_ETHERNET))
+            return
+        # Section header, then interface 0 for layer 3 and interface 1 for layer 2
+        self.file.write(struct.pack("<IIIHHqI", PCAPNG_SHB, 28, PCAPNG_BYTE_ORDER_MAGIC, 1, 0, -1, 28))
+        for linktype in (LINKTYPE_RAW, LINKTYPE_ETHERNET):
+            self.file.write(struct.pack("<IIHHII", PCAPNG_IDB, 20, linktype, 0, SNAPLEN, 20))
+
+    def write_packet(self, data, layer=3, timestamp=None):
+        """Append one packet record"""
+        if timestamp is None:
+            timestamp = self.timestamp if self.timestamp is not None else time.time()
+        micros = int(round(timestamp * 1_000_000))
+
+        if self.pcapng:
+            padding = -len(data) % 4
+            block_len = 32 + len(data) + padding
+            self.file.write(struct.pack("<IIIIIII", PCAPNG_EPB, block_len, 0 if layer == 3 else 1,
+                                        micros >> 32, micros & 0xFFFFFFFF, len(data), len(data)))
+            self.file.write(data)
+            self.file.write(b"\x00" * padding + struct.pack("<I", block_len))
+        else:
+            if layer == 3:
+                data = ETHER_IPV4_HEADER + data
+            seconds, micros = divmod(micros, 1_000_000)
+            self.file.write(struct.pack("<IIII", seconds, micros, len(data), len(data)))
+            self.file.write(data)
+
+    def send_burst(self, packets, layer=3, iface=None):
+        """Record a burst of (destination, wire_bytes) pairs; never fails per packet"""
+        for _, data in packets:
+            self.write_packet(data, layer)
+            self.packets_sent += 1
+            self.bytes_sent += len(data)
+        return []
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+class PcapReader:
+    """
+    Memory-mapped pcap/pcapng reader.
+    records() yields (timestamp, layer, data) where data is a memoryview into
+    the mapping; Ethernet frames carrying IPv4 are unwrapped to layer 3.
+    offset is where the next unread record starts, so a file that is still
+    being written can be reopened later and continued with resume().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # mmap refuses empty files
+            self.file.close()
+            raise ValueError(f"{path} is empty")
+        self.view = memoryview(self.map)
+        # pcapng section state: byte order and (linktype, ts divisor) per interface
+        self.endian = "<"
+        self.interfaces = []
+        if len(self.view) >= 4 and struct.unpack_from("<I", self.view)[0] == PCAPNG_SHB:
+            self.pcapng = True
+            self.offset = 0
+        else:
+            self.pcapng = False
+            self._read_pcap_header()
+            self.offset = 24
+
+    def _read_pcap_header(self):
+        if len(self.view) < 24:
+            raise ValueError(f"{self.path} is not a pcap file")
+        for endian in "<>":
+            magic = struct.unpack_from(endian + "I", self.view)[0]
+            if magic in (PCAP_MAGIC, PCAP_MAGIC_NSEC):
+                self.endian = endian
+                self.ts_divisor = 1_000_000_000 if magic == PCAP_MAGIC_NSEC else 1_000_000
+                self.linktype = struct.unpack_from(endian + "I", self.view, 20)[0]
+                return
+        raise ValueError(f"{self.path} is not a pcap file")
+
+    def resume(self, previous):
+        """Carry on from where an earlier reader of the same (growing) file stopped"""
+        self.offset = previous.offset
+        self.endian = previous.endian
+        self.interfaces = list(previous.interfaces)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __iter__(self):
+        return self.records()
+
+    def records(self):
+        """Yield (timestamp, layer, data) for every packet in the file"""
+        view = self.view
+        for timestamp, layer, start, stop in self.packets():
+            yield timestamp, layer, view[start:stop]
+
+    def packets(self):
+        """Yield (timestamp, layer, start, stop): each packet's position in the mapping"""
+        view = self.view
+        raw = self._pcapng_records() if self.pcapng else self._pcap_records()
+        for timestamp, linktype, start, stop in raw:
+            if linktype == LINKTYPE_RAW:
+                yield timestamp, 3, start, stop
+            elif linktype == LINKTYPE_ETHERNET and view[start + 12:start + 14] == ETHERTYPE_IPV4:
+                yield timestamp, 3, start + 14, stop
+            else:
+                yield timestamp, 2, start, stop
+
+    def _pcap_records(self):
+        view = self.view
+        header = struct.Struct(self.endian + "IIII")
+        offset = self.offset
+        end = len(view)
+        while offset + 16 <= end:
+            seconds, fraction, caplen, _ = header.unpack_from(view, offset)
+            start = offset + 16
+            if start + caplen > end:
+                break  # truncated final record (e.g. file still being written)
+            self.offset = offset = start + caplen
+            yield seconds + fraction / self.ts_divisor, self.linktype, start, offset
+
+    def _pcapng_records(self):
+        view = self.view
+        end = len(view)
+        offset = self.offset
+        while offset + 12 <= end:
+            endian = self.endian
+            block_type, block_len = struct.unpack_from(endian + "II", view, offset)
+            if block_type == PCAPNG_SHB:
+                # The byte-order magic decides how the rest of the section is read
+                magic = struct.unpack_from("<I", view, offset + 8)[0]
+                endian = "<" if magic == PCAPNG_BYTE_ORDER_MAGIC else ">"
+                block_len = struct.unpack_from(endian + "I", view, offset + 4)[0]
+            if block_len < 12 or offset + block_len > end:
+                break
+            if block_type == PCAPNG_SHB:
+                self.endian = endian
+                self.interfaces = []
+            block = offset
+            self.offset = offset = offset + block_len
+            if block_type == PCAPNG_IDB:
+                linktype = struct.unpack_from(endian + "H", view, block + 8)[0]
+                self.interfaces.append((linktype, self._tsresol(view, block + 16, offset - 4, endian)))
+            elif block_type == PCAPNG_EPB:
+                iface, ts_high, ts_low, caplen = struct.unpack_from(endian + "IIII", view, block + 8)
+                interfaces = self.interfaces
+                linktype, divisor = interfaces[iface] if iface < len(interfaces) else (LINKTYPE_ETHERNET, 1_000_000)
+                yield ((ts_high << 32) | ts_low) / divisor, linktype, block + 28, block + 28 + caplen
+            elif block_type == PCAPNG_SPB and self.interfaces:
+                # Simple packet blocks carry no timestamp or captured length
+                orig_len = struct.unpack_from(endian + "I", view, block + 8)[0]
+                caplen = min(orig_len, block_len - 16)
+                yield 0.0, self.interfaces[0][0], block + 12, block + 12 + caplen
+
+    @staticmethod
+    def _tsresol(view, offset, end, endian):
+        """Read if_tsresol from an interface block's options (default microseconds)"""
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + "HH", view, offset)
+            if code == 0:
+                break
+            if code == 9 and length >= 1:
+                value = view[offset + 4]
+                return 2 ** (value & 0x7F) if value & 0x80 else 10 ** value
+            offset += 4 + length + (-length % 4)
+        return 1_000_000
+
+    def close(self):
+        """Unmap the file and close it"""
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # Records are still referenced elsewhere; the mapping goes with them
+            pass
+        self.file.close()
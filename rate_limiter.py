@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Token-bucket pacing for the CTF network generator.
+Replaces the fixed sleeps between sends with a global packets/bandwidth
+ceiling plus optional per-challenge packet caps. Bursts bigger than a
+bucket are split, so they are paced out in bucket-sized pieces rather
+than going out back to back after one long wait.
+"""
+
+import math
+import threading
+
+from clock import SYSTEM_CLOCK
+
+# Share of each bucket that background traffic (noise) must leave for the flags
+SPARE_HEADROOM = 0.5
+
+
+class TokenBucket:
+    """Classic token bucket; rate is tokens per second, burst is the bucket size"""
+
+    def __init__(self, rate, burst=None, clock=SYSTEM_CLOCK):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else rate)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount=1):
+        """
+        Take tokens and return how long the caller must wait before sending.
+        The balance may go negative, so a burst larger than the bucket is
+        paced out instead of blocking forever.
+        """
+        with self.lock:
+            self._refill(self.clock.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def try_take(self, amount=1, keep=0.0):
+        """Take tokens only if at least keep are left afterwards; never goes into debt"""
+        with self.lock:
+            self._refill(self.clock.monotonic())
+            if self.tokens - amount < keep:
+                return False
+            self.tokens -= amount
+            return True
+
+    def give_back(self, amount):
+        """Return tokens taken by try_take that ended up unused"""
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Global pps/bandwidth ceiling plus per-challenge pps caps"""
+
+    def __init__(self, pps=None, bandwidth=None, challenge_pps=None, burst=None, clock=SYSTEM_CLOCK):
+        # bandwidth is in bytes per second; None disables a limit
+        self.clock = clock
+        self.global_pps = TokenBucket(pps, burst, clock) if pps else None
+        self.global_bandwidth = TokenBucket(bandwidth, clock=clock) if bandwidth else None
+        self.challenge_buckets = {
+            challenge: TokenBucket(rate, burst, clock)
+            for challenge, rate in (challenge_pps or {}).items()
+        }
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+
+    @property
+    def enabled(self):
+        return bool(self.global_pps or self.global_bandwidth or self.challenge_buckets)
+
+    def split(self, challenge_type, packets):
+        """
+        Cut a burst of (destination, wire_bytes) pairs into pieces that each fit
+        in every bucket that applies, so acquire() can pace them one by one
+        """
+        buckets = [bucket for bucket in (self.challenge_buckets.get(challenge_type), self.global_pps) if bucket]
+        max_packets = max(1, int(min((bucket.capacity for bucket in buckets), default=len(packets))))
+        max_bytes = self.global_bandwidth.capacity if self.global_bandwidth else None
+        chunk = []
+        chunk_bytes = 0
+        for packet in packets:
+            size = len(packet[1])
+            if chunk and (len(chunk) >= max_packets or (max_bytes and chunk_bytes + size > max_bytes)):
+                yield chunk
+                chunk = []
+                chunk_bytes = 0
+            chunk.append(packet)
+            chunk_bytes += size
+        if chunk:
+            yield chunk
+
+    def acquire(self, challenge_type, packets=1, nbytes=0):
+        """Block until a burst of packets/bytes may be sent for a challenge"""
+        wait = 0.0
+        buckets = (
+            (self.challenge_buckets.get(challenge_type), packets),
+            (self.global_pps, packets),
+            (self.global_bandwidth, nbytes)
+        )
+        for bucket, amount in buckets:
+            if bucket is not None and amount:
+                wait = max(wait, bucket.reserve(amount))
+
+        with self.lock:
+            self.requests += 1
+            if wait > 0:
+                self.throttled += 1
+                self.throttled_seconds += wait
+        if wait > 0:
+            self.clock.sleep(wait)
+        return wait
+
+    def take_spare(self, challenge_type, packets, headroom=SPARE_HEADROOM):
+        """
+        For background traffic: how many of a burst's leading packets may go now
+        out of spare capacity. Never waits or goes into debt, and leaves headroom
+        (a share of each bucket) untouched, so acquire() callers never wait
+        behind it. Takes the tokens for the packets it allows.
+        """
+        buckets = [bucket for bucket in (self.challenge_buckets.get(challenge_type), self.global_pps) if bucket]
+        allowed = 0
+        for _, wire in packets:
+            taken = []
+            for bucket, amount in [(bucket, 1) for bucket in buckets] + [(self.global_bandwidth, len(wire))]:
+                if bucket is None:
+                    continue
+                if not bucket.try_take(amount, bucket.capacity * headroom):
+                    for bucket, amount in taken:
+                        bucket.give_back(amount)
+                    return allowed
+                taken.append((bucket, amount))
+            allowed += 1
+        return allowed
+
+    def stats(self):
+        """Counters for reporting how often sends had to wait"""
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "throttled_seconds": round(self.throttled_seconds, 3)
+            }
+
+
+def parse_rate(value, name):
+    """A positive, finite rate from the command line"""
+    try:
+        rate = float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+    if not (rate > 0 and math.isfinite(rate)):
+        raise ValueError(f"{name} must be a positive number, got {value!r}")
+    return rate
+
+
+def parse_challenge_rates(values, challenges=None):
+    """
+    Parse ["http=5", "dns=2.5"] into {"http": 5.0, "dns": 2.5}; with
+    challenges, names that aren't one of them are rejected
+    """
+    rates = {}
+    for value in values or []:
+        challenge, sep, rate = value.partition("=")
+        challenge = challenge.strip()
+        if not sep:
+            raise ValueError(f"expected CHALLENGE=PPS, got {value!r}")
+        if challenges is not None and challenge not in challenges:
+            raise ValueError(f"unknown challenge {challenge!r} in --challenge-pps, "
+                             f"expected one of {', '.join(challenges)}")
+        rates[challenge] = parse_rate(rate, f"rate for {challenge}")
+    return rates
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Concurrent per-challenge scheduler for the CTF network generator.
+Every challenge runs on its own interval in a thread pool, so a slow or
+failing destination only delays that challenge instead of the whole cycle.
+With a VirtualClock, run_until() runs the same schedule on the calling
+thread, jumping from one due job to the next instead of waiting.
+"""
+
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from clock import SYSTEM_CLOCK
+
+
+class ScheduledJob:
+    """A callable with its own interval, jitter and next due time"""
+
+    def __init__(self, name, func, interval, jitter=0.0, delay=0.0, inline=False,
+                 clock=SYSTEM_CLOCK, rng=random):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.jitter = jitter
+        # inline jobs run on the dispatcher thread before anything else due
+        # at the same moment (used for the cycle header and flag advances)
+        self.inline = inline
+        self.clock = clock
+        self.rng = rng
+        self.next_base = clock.monotonic() + delay
+        self.next_run = self.next_base + self.random_jitter()
+        self.future = None
+        self.runs = 0
+        self.skipped = 0
+
+    def random_jitter(self):
+        return self.rng.uniform(0, self.jitter) if self.jitter else 0.0
+
+    def reschedule(self):
+        # Anchor on the un-jittered time so jitter never accumulates as drift
+        self.next_base += self.interval
+        now = self.clock.monotonic()
+        if self.next_base < now:
+            # We fell behind (e.g. the machine slept); don't fire a backlog
+            self.next_base = now
+        self.next_run = self.next_base + self.random_jitter()
+
+
+class ChallengeScheduler:
+    """Run challenge jobs concurrently, each on its own cadence"""
+
+    def __init__(self, max_workers=8, on_dispatch=None, clock=SYSTEM_CLOCK, rng=None, on_error=None):
+        self.max_workers = max_workers
+        # on_dispatch(job_name, lateness_seconds) is called as each job starts
+        self.on_dispatch = on_dispatch
+        # on_error(job_name, exception) is called when a job raises (default: print it)
+        self.on_error = on_error
+        self.clock = clock
+        # Source of jitter; pass a seeded random.Random for a repeatable schedule
+        self.rng = rng or random
+        self.jobs = {}
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+        self.executor = None
+        self.dispatcher = None
+
+    def add_job(self, name, func, interval, jitter=0.0, delay=0.0, inline=False):
+        """Add (or replace) a job; safe to call while the scheduler is running"""
+        with self.condition:
+            self.jobs[name] = ScheduledJob(name, func, interval, jitter, delay, inline,
+                                           clock=self.clock, rng=self.rng)
+            self.condition.notify()
+
+    def remove_job(self, name):
+        """Remove a job; a run already in progress is allowed to finish"""
+        with self.condition:
+            job = self.jobs.pop(name, None)
+            self.condition.notify()
+        return job is not None
+
+    def start(self):
+        """Start the dispatcher thread and worker pool"""
+        self.stopped.clear()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                           thread_name_prefix="ctf-challenge")
+        self.dispatcher = threading.Thread(target=self._dispatch_loop,
+                                           name="ctf-scheduler", daemon=True)
+        self.dispatcher.start()
+
+    def stop(self, wait=True):
+        """Stop dispatching; optionally wait for in-flight jobs to finish"""
+        self.stopped.set()
+        with self.condition:
+            self.condition.notify()
+        if self.dispatcher is not None:
+            self.dispatcher.join()
+            self.dispatcher = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=True)
+            self.executor = None
+
+    def run_forever(self):
+        """Block until stopped; Ctrl+C shuts the scheduler down cleanly"""
+        if self.dispatcher is None:
+            self.start()
+        try:
+            # Short waits keep the main thread responsive to KeyboardInterrupt
+            while not self.stopped.wait(0.5):
+                pass
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+        self.stop()
+
+    def run_until(self, deadline):
+        """
+        Run every job due up to deadline (clock monotonic time) on this thread,
+        one at a time in due order, sleeping on the clock in between. With a
+        VirtualClock the sleeps are instant. Returns the number of job runs.
+        """
+        self.stopped.clear()
+        runs = 0
+        while not self.stopped.is_set():
+            with self.condition:
+                # Earliest first; at the same moment inline jobs go first, then
+                # the order they were added in
+                job = min(self.jobs.values(), key=lambda job: (job.next_run, not job.inline),
+                          default=None)
+                if job is None or job.next_run > deadline:
+                    break
+                wait = job.next_run - self.clock.monotonic()
+                if wait <= 0:
+                    job.reschedule()
+            if wait > 0:
+                # Sleep outside the lock so jobs can still be added meanwhile
+                self.clock.sleep(wait)
+                continue
+            late = -wait
+            if self.on_dispatch:
+                self.on_dispatch(job.name, late)
+            self._run_job(job)
+            job.runs += 1
+            runs += 1
+        if not self.stopped.is_set():
+            self.clock.sleep(deadline - self.clock.monotonic())
+        return runs
+
+    def _run_job(self, job):
+        try:
+            job.func()
+        except Exception as e:
+            if self.on_error:
+                self.on_error(job.name, e)
+            else:
+                print(f"[SCHEDULER] Job {job.name} failed: {e}")
+
+    def _dispatch_loop(self):
+        while not self.stopped.is_set():
+            with self.condition:
+                now = self.clock.monotonic()
+                due = sorted((job for job in self.jobs.values() if job.next_run <= now),
+                             key=lambda job: (not job.inline, job.next_run))
+                lateness = [now - job.next_run for job in due]
+                for job in due:
+                    job.reschedule()
+
+            if self.on_dispatch:
+                for job, late in zip(due, lateness):
+                    self.on_dispatch(job.name, late)
+
+            for job in due:
+                if job.inline:
+                    self._run_job(job)
+                elif job.future is not None and not job.future.done():
+                    # Previous run is still going; skip rather than pile up
+                    job.skipped += 1
+                    continue
+                else:
+                    job.future = self.executor.submit(self._run_job, job)
+                job.runs += 1
+
+            with self.condition:
+                wake = min((job.next_run for job in self.jobs.values()),
+                           default=self.clock.monotonic() + 1.0)
+                timeout = wake - self.clock.monotonic()
+                if timeout > 0 and not self.stopped.is_set():
+                    self.condition.wait(timeout)
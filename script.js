@@ -11,6 +11,7 @@ class CTFSystem {
     this.websocket = null;
     this.isConnected = false;
     this.networkTraffic = new Map(); // Store real network traffic data
+    this.controlToken = this.loadControlToken();
 
     // Firebase configuration
     this.firebaseConfig = {
@@ -769,7 +770,7 @@ class CTFSystem {
     return filters[challenge.id] || "ip";
   }
 
-  submitFlag(challengeId) {
+  async submitFlag(challengeId) {
     const flagInput = document.getElementById("flagInput");
     const submittedFlag = flagInput.value.trim();
     const challenge = this.challenges.find((c) => c.id === challengeId);
@@ -779,7 +780,12 @@ class CTFSystem {
       return;
     }
 
-    if (submittedFlag === challenge.flag) {
+    const correct = await this.verifyFlag(challenge, submittedFlag);
+    if (correct === null) {
+      return;
+    }
+
+    if (correct) {
       // Check if challenge is already completed and stealable
       const currentState = this.challengeStates.get(challengeId);
       let pointsToAward = challenge.points;
@@ -1121,6 +1127,55 @@ class CTFSystem {
     }, 1000);
   }
 
+  // Check a flag against what the network generator is actually sending.
+  // Resolves to true/false, or null if the submission was rate limited.
+  verifyFlag(challenge, submittedFlag) {
+    // See flag_verifier.py; it only accepts JSON from the scoreboard's origin
+    return fetch("http://127.0.0.1:8766/verify", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        user: this.currentUser,
+        challenge: challenge.id,
+        flag: submittedFlag,
+      }),
+    })
+      .then((response) =>
+        response.json().then((result) => ({ status: response.status, result }))
+      )
+      .then(({ status, result }) => {
+        if (status === 429) {
+          this.showNotification(
+            "Too many submissions, wait a moment and try again",
+            "error"
+          );
+          return null;
+        }
+        if (status !== 200) {
+          throw new Error(result.error || `HTTP ${status}`);
+        }
+        return result.correct;
+      })
+      .catch((error) => {
+        // Generator not running on this machine: fall back to the local copy
+        console.log(`Flag verification service not reachable: ${error.message}`);
+        return submittedFlag === challenge.flag;
+      });
+  }
+
+  // The generator's control token, printed when it starts. Open the page
+  // once with ?controlToken=... and it is remembered in localStorage.
+  loadControlToken() {
+    const fromUrl = new URLSearchParams(window.location.search).get(
+      "controlToken"
+    );
+    if (fromUrl) {
+      localStorage.setItem("ctfControlToken", fromUrl);
+      return fromUrl;
+    }
+    return localStorage.getItem("ctfControlToken");
+  }
+
   // Notify network generator to advance flag
   notifyNetworkGenerator(challengeId) {
     // Map challenge IDs to network generator challenge types
@@ -1139,13 +1194,38 @@ class CTFSystem {
     };
 
     const challengeType = challengeTypeMap[challengeId];
-    if (challengeType) {
+    if (challengeType && !this.controlToken) {
+      console.log(
+        "No network generator control token; open the page with ?controlToken=..."
+      );
+    } else if (challengeType) {
       console.log(
         `Notifying network generator to advance flag for ${challengeType}`
       );
-      // For now, we'll use a simple approach - the network generator will
-      // automatically advance flags based on time or we can implement a more
-      // sophisticated communication system later
+      // The generator listens on localhost (see control_server.py) and only
+      // takes JSON commands carrying its token from an allowed origin.
+      // If the generator isn't running on this machine it still advances
+      // flags on its own timer, so a failure here is only logged.
+      fetch("http://127.0.0.1:8765/advance", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          "X-Control-Token": this.controlToken,
+        },
+        body: JSON.stringify({ challenge: challengeType }),
+      })
+        .then((response) => response.json())
+        .then((result) => {
+          const state = result.flags && result.flags[challengeType];
+          if (state) {
+            console.log(
+              `Network generator now broadcasting ${challengeType} flag #${state.index}`
+            );
+          }
+        })
+        .catch((error) => {
+          console.log(`Network generator not reachable: ${error.message}`);
+        });
     }
   }
 
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Multi-process sharding for the CTF network generator.
+Runs one worker process per interface (optionally with an explicit subnet).
+Each worker owns its sockets and packet cache. The coordinator owns the flag
+schedule and shares current_flag_index with every worker through shared
+memory, so all segments switch flag version at the same moment.
+
+Workers are spawned rather than forked: by the time they start, the parent
+runs the event log, metrics, control and verification threads, and a forked
+child would inherit their locks and listening sockets.
+"""
+
+import multiprocessing
+import threading
+from collections.abc import MutableMapping
+
+from network_generator import CTFNetworkGenerator
+from flag_derivation import FlagDeriver
+from netinfo import interface_network_info
+from packet_sender import BurstSender, NullSender
+from rate_limiter import RateLimiter
+
+# How long a worker gets to finish in-flight sends before it is terminated
+WORKER_STOP_TIMEOUT = 5
+# How often a worker sends its packet counts and timings to the coordinator
+METRICS_REPORT_INTERVAL = 5
+# Fresh interpreters for the workers (see above)
+CONTEXT = multiprocessing.get_context("spawn")
+
+
+def parse_shard(spec):
+    """'eth0' or 'eth0=192.168.8.0/22' -> (interface, subnet or None)"""
+    iface, _, subnet = spec.partition("=")
+    if not iface:
+        raise ValueError(f"expected IFACE or IFACE=CIDR, got {spec!r}")
+    return iface, subnet or None
+
+
+class SharedFlagIndex(MutableMapping):
+    """
+    current_flag_index backed by a shared-memory array, usable across processes.
+    on_change(challenge) is called when a read finds that another process
+    changed a challenge's index since the last read.
+    """
+
+    def __init__(self, challenges, array=None, on_change=None):
+        self.challenges = list(challenges)
+        self.slots = {challenge: slot for slot, challenge in enumerate(self.challenges)}
+        self.array = array if array is not None else CONTEXT.Array("i", len(self.challenges))
+        self.on_change = on_change
+        self.seen = {challenge: self.array[slot] for challenge, slot in self.slots.items()}
+
+    def __getitem__(self, challenge_type):
+        index = self.array[self.slots[challenge_type]]
+        if self.on_change is not None and self.seen[challenge_type] != index:
+            self.seen[challenge_type] = index
+            self.on_change(challenge_type)
+        return index
+
+    def __setitem__(self, challenge_type, index):
+        self.array[self.slots[challenge_type]] = index
+
+    def __delitem__(self, challenge_type):
+        raise TypeError("challenges cannot be removed from a shared flag index")
+
+    def __iter__(self):
+        return iter(self.challenges)
+
+    def __len__(self):
+        return len(self.challenges)
+
+
+def run_shard(iface, subnet, challenges, indexes, commands, reports, options):
+    """Worker process: generate traffic on one interface until told to stop"""
+    flag_secret = options.get("flag_secret")
+    generator = CTFNetworkGenerator(
+        sender=BurstSender(iface=iface),
+        rate_limiter=RateLimiter(**options.get("rate", {})),
+        packet_backend=options.get("packet_backend", "scapy"),
+        network_info=interface_network_info(iface, subnet),
+        flag_deriver=FlagDeriver(flag_secret) if flag_secret else None,
+        teams=options.get("teams")
+    )
+    # The coordinator advances the flags; the old version's packets are
+    # dropped the first time this worker reads the new index
+    generator.current_flag_index = SharedFlagIndex(challenges, indexes,
+                                                   on_change=generator.packet_cache.invalidate)
+
+    def listen():
+        while True:
+            command, challenge_type = commands.get()
+            if command == "stop":
+                generator.scheduler.stop()
+                return
+            if command == "resend":
+                generator.resend_challenge(challenge_type)
+
+    stopped = threading.Event()
+
+    def report():
+        # The coordinator serves /metrics; hand it what was counted here
+        while not stopped.wait(METRICS_REPORT_INTERVAL):
+            reports.put(generator.metrics.drain())
+
+    threading.Thread(target=listen, name=f"ctf-shard-{iface}", daemon=True).start()
+    threading.Thread(target=report, name=f"ctf-shard-{iface}-metrics", daemon=True).start()
+    if options.get("noise"):
+        generator.start_noise(*options["noise"])
+    try:
+        generator.run_all_traffic(options.get("schedule"), advance_flags=False)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        generator.scheduler.stop()
+        generator.stop_noise()
+        generator.sender.close()
+        stopped.set()
+        reports.put(generator.metrics.drain())
+
+
+class ShardCoordinator(CTFNetworkGenerator):
+    """
+    Generator front end for sharded runs: advances flags and relays control
+    commands, while the worker processes do all of the sending.
+    """
+
+    def __init__(self, shards, packet_backend="scapy", rate_options=None, flag_secret=None, teams=None,
+                 events=None):
+        self.shards = [parse_shard(spec) if isinstance(spec, str) else spec for spec in shards]
+        if not self.shards:
+            raise ValueError("at least one shard is required")
+        iface, subnet = self.shards[0]
+        super().__init__(sender=NullSender(), packet_backend=packet_backend,
+                         network_info=interface_network_info(iface, subnet),
+                         flag_deriver=FlagDeriver(flag_secret) if flag_secret else None, teams=teams,
+                         events=events)
+        self.current_flag_index = SharedFlagIndex(
+            self.current_flag_index,
+            CONTEXT.Array("i", list(self.current_flag_index.values()))
+        )
+        self.worker_options = {
+            "packet_backend": packet_backend,
+            "rate": rate_options or {},
+            "flag_secret": flag_secret,
+            "teams": teams
+        }
+        self.workers = []
+        # Metric reports from every worker, added to this process's /metrics
+        self.reports = CONTEXT.Queue()
+        self.collector = None
+
+    def resend_challenge(self, challenge_type):
+        """Ask every shard to send a challenge now"""
+        for _, commands in self.workers:
+            commands.put(("resend", challenge_type))
+
+    def start_noise(self, pps, mix=None):
+        """Have every shard send its own background noise once the workers start"""
+        self.worker_options["noise"] = (pps, mix)
+        self.events.emit("noise", f"🔊 Background noise: {pps:g} packets/s per shard", pps=pps, mix=mix)
+
+    def collect_metrics(self):
+        """Add the workers' metric reports to this process's metrics until a None arrives"""
+        while True:
+            report = self.reports.get()
+            if report is None:
+                return
+            self.metrics.absorb(report)
+
+    def start_workers(self, schedule=None):
+        options = dict(self.worker_options, schedule=schedule)
+        self.collector = threading.Thread(target=self.collect_metrics, name="ctf-shard-metrics", daemon=True)
+        self.collector.start()
+        for iface, subnet in self.shards:
+            commands = CONTEXT.Queue()
+            process = CONTEXT.Process(
+                target=run_shard,
+                args=(iface, subnet, self.current_flag_index.challenges,
+                      self.current_flag_index.array, commands, self.reports, options),
+                name=f"ctf-shard-{iface}"
+            )
+            process.start()
+            self.workers.append((process, commands))
+            self.events.emit("shard", f"🧩 Started shard {iface}{' (' + subnet + ')' if subnet else ''} "
+                             f"as pid {process.pid}", iface=iface, subnet=subnet, pid=process.pid)
+
+    def stop_workers(self):
+        for _, commands in self.workers:
+            commands.put(("stop", None))
+        for process, _ in self.workers:
+            process.join(WORKER_STOP_TIMEOUT)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self.workers = []
+        if self.collector is not None:
+            # After the workers' final reports, which were flushed as they exited
+            self.reports.put(None)
+            self.collector.join()
+            self.collector = None
+
+    def run_all_traffic(self, schedule=None, advance_flags=True):
+        """Start one worker per shard and run the flag schedule here"""
+        self.start_workers(schedule)
+        try:
+            # Only the cycle job: headers and flag advances, no sending
+            super().run_all_traffic(schedule, advance_flags=advance_flags)
+        finally:
+            self.scheduler.stop()
+            self.stop_workers()
+
+    def challenge_jobs(self):
+        # Keep the cycle length identical to the workers' schedule, but the
+        # coordinator itself never sends anything
+        return [(name, lambda: None) for name, _ in super().challenge_jobs()]
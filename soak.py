@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Soak test for the CTF network generator.
+Runs thousands of cycles (and flag advances) of the normal schedule against
+a null sink on a simulated clock, sampling Python heap (tracemalloc), RSS,
+open file descriptors and per-cycle time as it goes. Exits non-zero if any
+of them keeps growing past its threshold once the caches have warmed up, so
+leaks in scapy objects or caches show up before event day.
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+from clock import VirtualClock
+from event_log import EventLog
+from flag_derivation import FlagDeriver
+from netinfo import build_network_info
+from network_generator import CTFNetworkGenerator
+from packet_sender import NullSender
+
+SOAK_NETWORK = build_network_info("192.168.77.10", "192.168.77.0/24", "192.168.77.1", "soak0")
+SOAK_SECRET = "soak-test-secret"
+
+DEFAULT_CYCLES = 2000
+DEFAULT_WARMUP = 100
+DEFAULT_SAMPLE_EVERY = 100
+# Allowed growth from the first sample after warm-up to the last one
+DEFAULT_MAX_HEAP_MB = 2.0
+DEFAULT_MAX_RSS_MB = 20.0
+DEFAULT_MAX_FDS = 0
+DEFAULT_MAX_SLOWDOWN = 2.0
+TOP_ALLOCATIONS = 10
+
+
+def rss_bytes():
+    """Current resident set size; peak RSS where /proc isn't available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def open_fds():
+    for path in ("/proc/self/fd", "/dev/fd"):
+        try:
+            return len(os.listdir(path))
+        except OSError:
+            continue
+    return None
+
+
+def soak_teams(count):
+    """count synthetic team addresses in 10.99.0.0/16"""
+    return {f"team{n}": f"10.99.{n // 250}.{n % 250 + 1}" for n in range(count)}
+
+
+class Soak:
+    """Drives one generator cycle by cycle in simulated time and samples its resources"""
+
+    def __init__(self, backend="native", derived=True, teams=0, trace=True):
+        self.clock = VirtualClock()
+        self.sender = NullSender()
+        self.trace = trace
+        # Keep the ring buffer (it's part of what should stay flat) but not the console
+        self.generator = CTFNetworkGenerator(
+            sender=self.sender, packet_backend=backend, network_info=SOAK_NETWORK,
+            flag_deriver=FlagDeriver(SOAK_SECRET) if derived else None,
+            teams=soak_teams(teams), clock=self.clock,
+            events=EventLog(console=False, clock=self.clock))
+        self.cycle_interval = self.generator.schedule_traffic()
+        self.cycle_times = []
+        self.samples = []
+        self.baseline_snapshot = None
+
+    def run_cycle(self):
+        started = time.perf_counter()
+        self.generator.scheduler.run_until(self.clock.monotonic() + self.cycle_interval)
+        self.cycle_times.append(time.perf_counter() - started)
+
+    def sample(self, cycle, window):
+        """Record resource use after cycle, with the median time of the last window cycles"""
+        heap = tracemalloc.get_traced_memory()[0] if self.trace else None
+        sample = {
+            "cycle": cycle,
+            "heap_mb": round(heap / 2**20, 3) if heap is not None else None,
+            "rss_mb": round(rss_bytes() / 2**20, 2),
+            "fds": open_fds(),
+            "cycle_ms": round(statistics.median(self.cycle_times[-window:]) * 1000, 3),
+            "packets": self.sender.packets_sent,
+            "flag_index": max(self.generator.current_flag_index.values())
+        }
+        self.samples.append(sample)
+        return sample
+
+    def run(self, cycles, warmup, sample_every, report=None):
+        if self.trace:
+            tracemalloc.start()
+        try:
+            for cycle in range(1, cycles + 1):
+                self.run_cycle()
+                if cycle == warmup:
+                    sample = self.sample(cycle, sample_every)
+                    if self.trace:
+                        self.baseline_snapshot = tracemalloc.take_snapshot()
+                elif cycle > warmup and (cycle - warmup) % sample_every == 0 or cycle == cycles:
+                    sample = self.sample(cycle, sample_every)
+                else:
+                    continue
+                if report:
+                    report(sample)
+            self.top_growth = self.allocation_growth() if self.trace else []
+        finally:
+            if self.trace:
+                tracemalloc.stop()
+        return self.samples
+
+    def allocation_growth(self):
+        """Source lines whose allocations grew most since the baseline"""
+        if self.baseline_snapshot is None:
+            return []
+        stats = tracemalloc.take_snapshot().compare_to(self.baseline_snapshot, "lineno")
+        return [
+            {"where": str(stat.traceback), "growth_kb": round(stat.size_diff / 1024, 1), "blocks": stat.count_diff}
+            for stat in stats[:TOP_ALLOCATIONS] if stat.size_diff > 0
+        ]
+
+
+def check(samples, max_heap_mb, max_rss_mb, max_fds, max_slowdown):
+    """Compare the last sample with the first one after warm-up; returns the failures"""
+    if len(samples) < 2:
+        return []
+    first, last = samples[0], samples[-1]
+    failures = []
+    if first["heap_mb"] is not None and last["heap_mb"] - first["heap_mb"] > max_heap_mb:
+        failures.append(f"Python heap grew {last['heap_mb'] - first['heap_mb']:.2f} MB (limit {max_heap_mb:g} MB)")
+    if last["rss_mb"] - first["rss_mb"] > max_rss_mb:
+        failures.append(f"RSS grew {last['rss_mb'] - first['rss_mb']:.1f} MB (limit {max_rss_mb:g} MB)")
+    if first["fds"] is not None and last["fds"] - first["fds"] > max_fds:
+        failures.append(f"open file descriptors went from {first['fds']} to {last['fds']} (limit +{max_fds})")
+    if first["cycle_ms"] and last["cycle_ms"] / first["cycle_ms"] > max_slowdown:
+        failures.append(f"cycles slowed from {first['cycle_ms']} ms to {last['cycle_ms']} ms "
+                        f"(limit {max_slowdown:g}x)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soak-test the CTF network generator for leaks and slowdowns")
+    parser.add_argument("--cycles", type=int, default=DEFAULT_CYCLES,
+                        help=f"cycles to run, in simulated time (default: {DEFAULT_CYCLES})")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP,
+                        help=f"cycles before the baseline sample, while caches fill (default: {DEFAULT_WARMUP})")
+    parser.add_argument("--sample-every", type=int, default=DEFAULT_SAMPLE_EVERY,
+                        help=f"cycles between samples (default: {DEFAULT_SAMPLE_EVERY})")
+    parser.add_argument("--backend", choices=("scapy", "native"), default="native", help="packet builder to soak")
+    parser.add_argument("--fixed-flags", action="store_true",
+                        help="cycle through challenges.json's few fixed flags instead of derived flags "
+                             "(by default every advance makes a new flag version, as on event day)")
+    parser.add_argument("--teams", type=int, default=0, help="number of synthetic teams to send to")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="skip heap tracing (faster, RSS only)")
+    parser.add_argument("--max-heap-mb", type=float, default=DEFAULT_MAX_HEAP_MB,
+                        help=f"allowed Python heap growth (default: {DEFAULT_MAX_HEAP_MB:g})")
+    parser.add_argument("--max-rss-mb", type=float, default=DEFAULT_MAX_RSS_MB,
+                        help=f"allowed RSS growth (default: {DEFAULT_MAX_RSS_MB:g})")
+    parser.add_argument("--max-fds", type=int, default=DEFAULT_MAX_FDS,
+                        help=f"allowed growth in open file descriptors (default: {DEFAULT_MAX_FDS})")
+    parser.add_argument("--max-slowdown", type=float, default=DEFAULT_MAX_SLOWDOWN,
+                        help=f"allowed ratio of last to first cycle time (default: {DEFAULT_MAX_SLOWDOWN:g})")
+    parser.add_argument("--json", action="store_true", help="print the samples and verdict as JSON")
+    args = parser.parse_args()
+    if args.warmup >= args.cycles:
+        parser.error("--cycles must be larger than --warmup")
+
+    soak = Soak(args.backend, not args.fixed_flags, args.teams, trace=not args.no_tracemalloc)
+
+    def report(sample):
+        heap = f"{sample['heap_mb']:8.2f} MB heap  " if sample["heap_mb"] is not None else ""
+        print(f"🔁 cycle {sample['cycle']:6d}  {heap}{sample['rss_mb']:8.1f} MB RSS  {sample['fds']} fds  "
+              f"{sample['cycle_ms']:.3f} ms/cycle  flag version {sample['flag_index']}")
+
+    started = time.perf_counter()
+    samples = soak.run(args.cycles, args.warmup, args.sample_every, None if args.json else report)
+    elapsed = time.perf_counter() - started
+    failures = check(samples, args.max_heap_mb, args.max_rss_mb, args.max_fds, args.max_slowdown)
+
+    if args.json:
+        print(json.dumps({"samples": samples, "failures": failures, "top_growth": soak.top_growth,
+                          "simulated_seconds": soak.clock.monotonic(), "seconds": round(elapsed, 3)}, indent=2))
+    else:
+        print(f"⏱️  {args.cycles} cycles ({soak.clock.monotonic() / 3600:.1f} simulated hours, "
+              f"{soak.sender.packets_sent} packets) in {elapsed:.1f}s")
+        for failure in failures:
+            print(f"❌ {failure}")
+        if failures:
+            print("Largest allocation growth since warm-up:")
+            for growth in soak.top_growth:
+                print(f"   {growth['growth_kb']:10.1f} KB  {growth['blocks']:+d} blocks  {growth['where']}")
+        else:
+            print("✅ Memory, file descriptors and cycle time stayed flat")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
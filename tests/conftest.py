@@ -0,0 +1,21 @@
+"""Shared fixtures: generators on a fixed test network that send nowhere"""
+
+import pytest
+
+from clock import VirtualClock
+from netinfo import build_network_info
+from network_generator import CTFNetworkGenerator
+from packet_sender import NullSender
+
+TEST_NETWORK = build_network_info("192.168.50.10", "192.168.50.0/24", "192.168.50.1", "test0")
+
+
+@pytest.fixture
+def make_generator():
+    """Factory for generators on TEST_NETWORK with a NullSender and a VirtualClock unless overridden"""
+    def make(**options):
+        options.setdefault("sender", NullSender())
+        options.setdefault("network_info", TEST_NETWORK)
+        options.setdefault("clock", VirtualClock(start=1_700_000_000))
+        return CTFNetworkGenerator(**options)
+    return make
@@ -0,0 +1,32 @@
+"""The old per-challenge generate_* methods still send their challenge"""
+
+import pytest
+
+from packet_sender import RecordingSender
+
+WRAPPERS = {
+    "generate_http_traffic": ["http"],
+    "generate_dns_traffic": ["dns"],
+    "generate_ftp_traffic": ["ftp"],
+    "generate_icmp_traffic": ["icmp"],
+    "generate_arp_traffic": ["arp"],
+    "generate_tcp_traffic": ["tcp"],
+    "generate_caesar1_traffic": ["caesar1"],
+    "generate_caesar2_traffic": ["caesar2"],
+    "generate_caesar3_traffic": ["caesar3"],
+    "generate_caesar_challenges": ["caesar1", "caesar2", "caesar3"],
+    "generate_plaintext_traffic": ["plaintext"],
+    "generate_easydns_traffic": ["easydns"],
+    "generate_easy_challenges": ["plaintext", "easydns"],
+}
+
+
+@pytest.mark.parametrize("method, challenges", WRAPPERS.items())
+def test_wrapper_sends_its_challenges(make_generator, method, challenges):
+    generator = make_generator(packet_backend="native")
+    generator.sender = RecordingSender(generator.clock)
+    getattr(generator, method)()
+    expected = [wire for challenge_type in challenges
+                for dst in generator.registry[challenge_type].resolve_destinations(generator.network_info)
+                for wire in generator.build_challenge_packets(challenge_type, dst)]
+    assert [data for _, _, _, data in generator.sender.sent] == expected
@@ -0,0 +1,84 @@
+"""The control listener only takes JSON commands with the token, from allowed origins"""
+
+import http.client
+import json
+
+import pytest
+
+from control_server import ControlError, ControlServer, send_command
+
+TOKEN = "test-token"
+
+
+@pytest.fixture
+def control(make_generator):
+    server = ControlServer(make_generator(packet_backend="native"), port=0, token=TOKEN).start()
+    yield server
+    server.stop()
+
+
+def request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), json.loads(response.read() or b"null")
+    finally:
+        connection.close()
+
+
+def post(server, command, payload, **headers):
+    headers = {"Content-Type": "application/json", "X-Control-Token": TOKEN, **headers}
+    return request(server, "POST", f"/{command}", json.dumps(payload), headers)
+
+
+def test_listener_needs_a_token(make_generator):
+    with pytest.raises(ValueError):
+        ControlServer(make_generator(), port=0)
+
+
+def test_command_with_token_advances(control):
+    reply = send_command("advance", "http", port=control.port, token=TOKEN)
+    assert reply["flags"]["http"]["index"] == 1
+    with pytest.raises(ControlError, match="token"):
+        send_command("advance", "http", port=control.port, token="wrong")
+    assert control.generator.current_flag_index["http"] == 1
+
+
+def test_flags_need_the_token_too(control):
+    status, _, _ = request(control, "GET", "/flags")
+    assert status == 403
+    status, _, reply = request(control, "GET", "/flags", headers={"X-Control-Token": TOKEN})
+    assert status == 200 and reply["http"]["index"] == 0
+
+
+def test_foreign_origin_is_refused(control):
+    status, headers, _ = post(control, "advance", {"challenge": "http"}, Origin="https://evil.example")
+    assert status == 403
+    assert "Access-Control-Allow-Origin" not in headers
+    status, headers, _ = request(control, "OPTIONS", "/advance", headers={"Origin": "https://evil.example"})
+    assert status == 403
+
+    status, headers, _ = post(control, "advance", {"challenge": "http"}, Origin="http://localhost:5500")
+    assert status == 200
+    assert headers["Access-Control-Allow-Origin"] == "http://localhost:5500"
+    assert control.generator.current_flag_index["http"] == 1
+
+
+def test_simple_request_bodies_are_refused(control):
+    status, _, _ = post(control, "advance", {"challenge": "http"}, **{"Content-Type": "text/plain"})
+    assert status == 415
+    assert control.generator.current_flag_index["http"] == 0
+
+
+def test_bad_content_length_is_a_client_error(control):
+    status, _, reply = post(control, "advance", {"challenge": "http"}, **{"Content-Length": "lots"})
+    assert status == 400 and "Content-Length" in reply["error"]
+
+
+def test_set_index_on_all_checks_before_changing_anything(control):
+    generator = control.generator
+    too_big = min(generator.flag_limit(challenge) for challenge in generator.current_flag_index)
+    status, _, _ = post(control, "set-index", {"challenge": "all", "index": too_big})
+    assert status == 400
+    assert set(generator.current_flag_index.values()) == {0}
@@ -0,0 +1,51 @@
+"""Derived flags are deterministic, differ per team and stay within the cache size"""
+
+import json
+
+import pytest
+
+from flag_derivation import FLAG_DIGEST_CHARS, FlagDeriver, load_teams
+
+
+def test_same_inputs_give_the_same_flag():
+    first = FlagDeriver("event-secret", cache_size=0)
+    second = FlagDeriver(b"event-secret")
+    flag = first.derive("red", "http", 3)
+    assert flag == first.derive("red", "http", 3) == second.derive("red", "http", 3)
+    assert flag.startswith("CTF{HTTP_") and len(flag) == len("CTF{HTTP_}") + FLAG_DIGEST_CHARS
+    assert FlagDeriver("other-secret").derive("red", "http", 3) != flag
+
+
+def test_every_field_changes_the_flag():
+    deriver = FlagDeriver("event-secret")
+    flags = {deriver.derive(team, challenge_type, index)
+             for team in ("red", "blue", None)
+             for challenge_type in ("http", "dns")
+             for index in range(5)}
+    assert len(flags) == 3 * 2 * 5
+
+
+def test_cache_keeps_the_most_recent_flags():
+    deriver = FlagDeriver("event-secret", cache_size=8)
+    for index in range(20):
+        deriver.derive("red", "http", index)
+        assert len(deriver) <= 8
+    assert list(deriver.cache) == [("red", "http", index) for index in range(12, 20)]
+
+    deriver.derive("red", "http", 12)
+    assert deriver.hits == 1 and deriver.misses == 20
+    assert next(reversed(deriver.cache)) == ("red", "http", 12)
+
+
+def test_empty_secret_is_refused():
+    with pytest.raises(ValueError):
+        FlagDeriver("")
+
+
+def test_teams_file_must_map_names_to_addresses(tmp_path):
+    path = tmp_path / "teams.json"
+    path.write_text(json.dumps({"red": "192.168.50.21"}))
+    assert load_teams(path) == {"red": "192.168.50.21"}
+    path.write_text(json.dumps(["192.168.50.21"]))
+    with pytest.raises(ValueError, match="team name"):
+        load_teams(path)
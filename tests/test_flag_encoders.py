@@ -0,0 +1,84 @@
+"""Every encoding decodes back to its flag, and the compiled encoders match the old per-call code"""
+
+import base64
+import binascii
+import re
+
+import pytest
+
+from challenge_registry import load_challenge_registry
+from flag_derivation import FlagDeriver
+from flag_encoders import DECODERS, ENCODERS, make_decoder, make_encoder
+
+REGISTRY = load_challenge_registry()
+FLAGS = sorted({flag for challenge in REGISTRY for flag in challenge.flags} | {
+    FlagDeriver("encoders").derive("red", "http", 7),
+    "CTF{}",
+    "CTF{mIxEd_case_0123456789_!#$%&()*+,-./:;<=>?@[]^`|~}",
+})
+# Options each encoder is tried with; slug is the only lossy one
+OPTIONS = {
+    "plain": [{}],
+    "base64": [{}],
+    "base32": [{}],
+    "hex": [{}],
+    "caesar": [{"shift": 3}, {"shift": 25}, {"shift": -7}, {"shift": 40}],
+    "rot13": [{}],
+    "rot47": [{}],
+    "xor": [{}, {"key": 0}, {"key": 255}, {"key": "k3y"}],
+    "slug": [{}],
+}
+
+
+def old_caesar_cipher(text, shift):
+    # The per-character loop the translate tables replaced
+    result = ''
+    for char in text:
+        if char.isalpha():
+            base = ord('A') if char.isupper() else ord('a')
+            result += chr((ord(char) - base + shift) % 26 + base)
+        else:
+            result += char
+    return result
+
+
+# The per-call encoders from before they were compiled
+OLD_ENCODERS = {
+    "plain": lambda flag, options: flag,
+    "base64": lambda flag, options: base64.b64encode(flag.encode()).decode(),
+    "hex": lambda flag, options: binascii.hexlify(flag.encode()).decode(),
+    "caesar": lambda flag, options: old_caesar_cipher(flag, options.get("shift", 0)),
+    "slug": lambda flag, options: flag.lower().replace('{', '').replace('}', ''),
+}
+
+
+def test_every_encoder_has_a_decoder_and_options():
+    assert set(ENCODERS) == set(DECODERS) == set(OPTIONS)
+
+
+@pytest.mark.parametrize("name, options", [(name, options) for name, cases in OPTIONS.items() for options in cases])
+def test_round_trip(name, options):
+    encode = make_encoder(name, options)
+    pattern, decode = make_decoder(name, options)
+    for flag in FLAGS:
+        encoded = encode(flag).encode()
+        # The scanner finds encoded flags with the decoder's alphabet
+        assert re.fullmatch(pattern, encoded)
+        if name == "slug":
+            assert decode(encoded) == flag.lower().replace("{", "").replace("}", "")
+        else:
+            assert decode(encoded) == flag
+
+
+@pytest.mark.parametrize("name, options", [(name, options) for name in OLD_ENCODERS for options in OPTIONS[name]])
+def test_compiled_encoders_match_the_old_code(name, options):
+    encode = make_encoder(name, options)
+    for flag in FLAGS:
+        assert encode(flag) == OLD_ENCODERS[name](flag, options)
+
+
+def test_registry_encodings_are_unchanged():
+    for challenge in REGISTRY:
+        if challenge.encoder in OLD_ENCODERS:
+            for flag in challenge.flags:
+                assert challenge.encode(flag) == OLD_ENCODERS[challenge.encoder](flag, challenge.spec)
@@ -0,0 +1,123 @@
+"""Finding flag versions in captures: signatures, window boundaries, growing files and streams"""
+
+import pytest
+
+import flag_scanner
+from challenge_registry import load_challenge_registry
+from flag_derivation import FlagDeriver
+from flag_scanner import FlagScanner
+from pcap_io import PcapReader, PcapWriter
+
+from tests.conftest import TEST_NETWORK
+
+CHALLENGES = {challenge.type for challenge in load_challenge_registry()}
+CYCLES = 2
+
+
+@pytest.fixture
+def capture(tmp_path, make_generator):
+    """Two cycles of every challenge at flag version 0, then one cycle at version 1"""
+    path = tmp_path / "cycles.pcap"
+    writer = PcapWriter(path)
+    make_generator(sender=writer, packet_backend="native").export_traffic(CYCLES, start_time=1_700_000_000)
+    generator = make_generator(sender=writer, packet_backend="native")
+    for challenge_type in CHALLENGES:
+        generator.set_flag_index(challenge_type, 1)
+    generator.export_traffic(1, start_time=1_700_001_000)
+    writer.close()
+    return path
+
+
+def scan(path, scanner=None):
+    scanner = scanner or FlagScanner()
+    with PcapReader(path) as reader:
+        scanner.scan(reader)
+    return scanner
+
+
+def counts(scanner):
+    return {key: sighting.count for key, sighting in scanner.seen.items()}
+
+
+def test_every_challenge_signature_matches(capture):
+    scanner = scan(capture)
+    # One sighting per destination per cycle
+    expected = {}
+    generator_destinations = {challenge.type: len(challenge.resolve_destinations(TEST_NETWORK))
+                              for challenge in load_challenge_registry()}
+    for challenge_type, destinations in generator_destinations.items():
+        expected[(challenge_type, 0, None)] = CYCLES * destinations
+        expected[(challenge_type, 1, None)] = destinations
+    assert counts(scanner) == expected
+    assert not scanner.unknown
+    assert scanner.seen[("http", 1, None)].first == pytest.approx(1_700_001_000, abs=60)
+
+
+@pytest.mark.parametrize("window", [61, 512, 1500, 4096])
+def test_matches_split_across_windows_are_found_once(capture, monkeypatch, window):
+    expected = counts(scan(capture))
+    # Small windows put many flags across a boundary; the overlap still covers a whole match
+    monkeypatch.setattr(flag_scanner, "SCAN_WINDOW", window)
+    monkeypatch.setattr(flag_scanner, "WINDOW_OVERLAP", 256)
+    scanner = scan(capture)
+    assert counts(scanner) == expected
+    assert scanner.packets == scan(capture).packets
+
+
+@pytest.mark.parametrize("cut", [24 + 7, 1000, 5555])
+def test_growing_capture_is_resumed(tmp_path, capture, cut):
+    expected = counts(scan(capture))
+    data = capture.read_bytes()
+    growing = tmp_path / "growing.pcap"
+    # First look at the file ends in the middle of a record
+    growing.write_bytes(data[:cut])
+    scanner = FlagScanner()
+    first = PcapReader(growing)
+    scanner.scan(first)
+    growing.write_bytes(data)
+    second = PcapReader(growing)
+    second.resume(first)
+    first.close()
+    scanner.scan(second)
+    second.close()
+    assert counts(scanner) == expected
+    assert scanner.bytes == len(data) - 24
+
+
+def test_unknown_flags_are_reported_decoded(tmp_path, make_generator):
+    path = tmp_path / "derived.pcap"
+    writer = PcapWriter(path)
+    deriver = FlagDeriver("scanner-secret")
+    make_generator(sender=writer, packet_backend="native", flag_deriver=deriver).export_traffic(1)
+    writer.close()
+
+    # Without the secret the flags are unknown, but still reported as text
+    report = scan(path).report()
+    assert report["challenges"]["dns"]["versions"] == []
+    assert [entry["flag"] for entry in report["challenges"]["dns"]["unknown"]] == [
+        deriver.derive(None, "dns", 0)]
+    assert report["challenges"]["http"]["unknown"][0]["count"] == len(
+        load_challenge_registry()["http"].resolve_destinations(TEST_NETWORK))
+
+    scanner = scan(path, FlagScanner(flag_deriver=deriver))
+    assert not scanner.unknown
+    assert {challenge_type for challenge_type, _, _ in scanner.seen} == CHALLENGES
+
+
+def test_only_the_generators_own_sessions_are_followed(tmp_path, make_generator):
+    generator = make_generator(packet_backend="native")
+    challenge = generator.registry["tcp"]
+    assert challenge.protocol == "tcp_stream"
+    path = tmp_path / "streams.pcap"
+    writer = PcapWriter(path)
+    for wire in generator.build_challenge_packets("tcp", "192.168.50.77"):
+        writer.write_packet(wire, timestamp=1.0)
+    # Someone else's session to the same port carrying the same flag: the
+    # same bytes, but every sequence number is off from the generator's
+    for wire in generator.build_challenge_packets("tcp", "192.168.50.78"):
+        writer.write_packet(wire[:24] + bytes([wire[24] ^ 0xFF]) + wire[25:], timestamp=2.0)
+    writer.close()
+
+    scanner = scan(path)
+    assert counts(scanner) == {("tcp", 0, None): 1}
+    assert not scanner.streams
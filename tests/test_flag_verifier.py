@@ -0,0 +1,130 @@
+"""Flag checks: the grace window for retired flags, rate limits and the HTTP listener"""
+
+import http.client
+import json
+
+import pytest
+
+from flag_derivation import FlagDeriver
+from flag_verifier import FlagVerifier, VerificationServer
+
+TEAMS = {"red": "192.168.50.21", "blue": "192.168.50.22"}
+
+
+@pytest.fixture
+def serve():
+    """Start a VerificationServer for a verifier on a free port"""
+    servers = []
+
+    def start(verifier):
+        server = VerificationServer(verifier, port=0).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), json.loads(response.read() or b"null")
+    finally:
+        connection.close()
+
+
+def submit(server, submission, **headers):
+    headers = {"Content-Type": "application/json", **headers}
+    return request(server, "POST", "/verify", json.dumps(submission), headers)
+
+
+def test_retired_flag_is_stale_within_the_grace_window(make_generator):
+    generator = make_generator(packet_backend="native")
+    verifier = FlagVerifier(generator, grace=60, user_rate=1000, user_burst=1000)
+    old = generator.get_current_flag("http")
+    generator.advance_flag("http")
+    new = generator.get_current_flag("http")
+
+    assert verifier.check("alice", "http", new) == {
+        "correct": True, "challenge": "http", "index": 1, "current_index": 1, "stale": False}
+    generator.clock.advance(59)
+    reply = verifier.check("alice", 1, old)
+    assert (reply["correct"], reply["index"], reply["stale"]) == (True, 0, True)
+    generator.clock.advance(2)
+    assert verifier.check("alice", "http", old)["correct"] is False
+    assert verifier.stats()["stale"] == 1
+
+
+def test_team_flags_only_match_their_own_team(make_generator):
+    generator = make_generator(flag_deriver=FlagDeriver("verify"), teams=TEAMS)
+    verifier = FlagVerifier(generator)
+    red = generator.get_current_flag("dns", team="red")
+    assert verifier.check("alice", "dns", red, team="red")["correct"] is True
+    assert verifier.check("alice", "dns", red, team="blue")["correct"] is False
+
+
+def test_submission_over_http(make_generator, serve):
+    generator = make_generator()
+    server = serve(FlagVerifier(generator))
+    status, _, reply = submit(server, {"user": "alice", "challenge": 1, "flag": generator.get_current_flag("http")})
+    assert status == 200 and reply["correct"] is True
+    status, _, reply = submit(server, {"user": "alice", "challenge": 99, "flag": "CTF{X}"})
+    assert status == 400 and "unknown challenge" in reply["error"]
+    status, _, reply = request(server, "GET", "/stats")
+    assert (status, reply["correct"], reply["invalid"]) == (200, 1, 1)
+
+
+def test_team_is_rate_limited_whatever_the_user_name(make_generator, serve):
+    generator = make_generator(flag_deriver=FlagDeriver("verify"), teams=TEAMS)
+    server = serve(FlagVerifier(generator, user_rate=1, user_burst=3))
+    for number in range(3):
+        status, _, _ = submit(server, {"user": f"user{number}", "challenge": "http", "flag": "CTF{GUESS}", "team": "red"})
+        assert status == 200
+    status, _, reply = submit(server, {"user": "someone-new", "challenge": "http", "flag": "CTF{GUESS}", "team": "red"})
+    assert status == 429 and "team red" in reply["error"]
+    status, _, _ = submit(server, {"user": "someone-new", "challenge": "http", "flag": "CTF{GUESS}", "team": "blue"})
+    assert status == 200
+    generator.clock.advance(1)
+    status, _, _ = submit(server, {"user": "someone-new", "challenge": "http", "flag": "CTF{GUESS}", "team": "red"})
+    assert status == 200
+
+
+def test_global_cap_bounds_made_up_user_names(make_generator, serve):
+    generator = make_generator()
+    server = serve(FlagVerifier(generator, user_rate=5, user_burst=5, global_rate=4))
+    statuses = [submit(server, {"user": f"user{number}", "challenge": "http", "flag": "CTF{GUESS}"})[0]
+                for number in range(6)]
+    assert statuses == [200] * 5 + [429]
+
+
+def test_foreign_origin_is_refused(make_generator, serve):
+    server = serve(FlagVerifier(make_generator()))
+    submission = {"user": "alice", "challenge": "http", "flag": "CTF{GUESS}"}
+    status, headers, _ = submit(server, submission, Origin="https://evil.example")
+    assert status == 403 and "Access-Control-Allow-Origin" not in headers
+    status, _, _ = request(server, "OPTIONS", "/verify", headers={"Origin": "https://evil.example"})
+    assert status == 403
+
+    status, headers, _ = request(server, "OPTIONS", "/verify", headers={"Origin": "http://localhost:5500"})
+    assert status == 204 and headers["Access-Control-Allow-Origin"] == "http://localhost:5500"
+    status, headers, _ = submit(server, submission, Origin="http://localhost:5500")
+    assert status == 200 and headers["Access-Control-Allow-Origin"] == "http://localhost:5500"
+
+
+def test_only_json_bodies_are_checked(make_generator, serve):
+    server = serve(FlagVerifier(make_generator()))
+    body = json.dumps({"user": "alice", "challenge": "http", "flag": "CTF{GUESS}"})
+    status, _, _ = request(server, "POST", "/verify", body, {"Content-Type": "text/plain"})
+    assert status == 415
+    status, _, _ = request(server, "POST", "/verify", body, {"Content-Type": "application/json; charset=utf-8"})
+    assert status == 200
+    assert server.verifier.stats()["incorrect"] == 1
+
+
+def test_bad_content_length_is_a_client_error(make_generator, serve):
+    server = serve(FlagVerifier(make_generator()))
+    for length in ("lots", "-5"):
+        status, _, reply = submit(server, {"user": "alice"}, **{"Content-Length": length})
+        assert status == 400 and "Content-Length" in reply["error"]
@@ -0,0 +1,63 @@
+"""Prometheus text rendering of a fixed registry, and what the metrics listener serves"""
+
+import http.client
+
+from metrics import MetricsRegistry, MetricsServer
+
+
+def test_counter_and_gauge_lines():
+    registry = MetricsRegistry()
+    packets = registry.counter("ctf_packets_sent_total", "Packets sent", ("challenge", "destination"))
+    packets.inc(("http", "10.0.0.1"), 3)
+    packets.inc(("http", "10.0.0.1"))
+    registry.counter("ctf_idle_total", "Never incremented")
+    registry.gauge("ctf_flag_index", "Current flag version", ("challenge",), lambda: {("dns",): 2})
+    registry.gauge("ctf_throttled_total", "Throttled bursts", (), lambda: {(): 7})
+
+    assert registry.render() == (
+        "# HELP ctf_packets_sent_total Packets sent\n"
+        "# TYPE ctf_packets_sent_total counter\n"
+        'ctf_packets_sent_total{challenge="http",destination="10.0.0.1"} 4\n'
+        "# HELP ctf_idle_total Never incremented\n"
+        "# TYPE ctf_idle_total counter\n"
+        "# HELP ctf_flag_index Current flag version\n"
+        "# TYPE ctf_flag_index gauge\n"
+        'ctf_flag_index{challenge="dns"} 2\n'
+        "# HELP ctf_throttled_total Throttled bursts\n"
+        "# TYPE ctf_throttled_total gauge\n"
+        "ctf_throttled_total 7\n")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    seconds = registry.histogram("ctf_send_seconds", "Send time", ("challenge",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        seconds.observe(value, ("http",))
+
+    assert registry.render().splitlines()[2:] == [
+        'ctf_send_seconds_bucket{challenge="http",le="0.1"} 2',
+        'ctf_send_seconds_bucket{challenge="http",le="1.0"} 3',
+        'ctf_send_seconds_bucket{challenge="http",le="+Inf"} 4',
+        'ctf_send_seconds_sum{challenge="http"} 2.65',
+        'ctf_send_seconds_count{challenge="http"} 4',
+    ]
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    errors = registry.counter("ctf_errors_total", "Errors", ("exception",))
+    errors.inc(('say "hi"\\now\n',))
+    assert registry.render().splitlines()[-1] == 'ctf_errors_total{exception="say \\"hi\\"\\\\now\\n"} 1'
+
+
+def test_metrics_listener_does_not_serve_events(make_generator):
+    generator = make_generator(packet_backend="native")
+    server = MetricsServer(generator.metrics, 0).start()
+    try:
+        for path, status in (("/metrics", 200), ("/events", 404)):
+            connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=5)
+            connection.request("GET", path)
+            assert connection.getresponse().status == status
+            connection.close()
+    finally:
+        server.stop()
@@ -0,0 +1,71 @@
+"""Routing table parsing, default interface choice and subnet addressing"""
+
+import socket
+import struct
+
+import pytest
+
+from netinfo import build_network_info, default_route, read_routes
+
+HEADER = "Iface\tDestination\tGateway \tFlags\tRefCnt\tUse\tMetric\tMask\t\tMTU\tWindow\tIRTT\n"
+
+
+def hex_address(address):
+    """An address as /proc/net/route prints it: host-order hex"""
+    return "%08X" % struct.unpack("=L", socket.inet_aton(address))[0]
+
+
+def route_table(tmp_path, *routes):
+    """Write a fake /proc/net/route from (iface, destination, gateway, flags, metric, mask) rows"""
+    lines = [HEADER]
+    for iface, destination, gateway, flags, metric, mask in routes:
+        lines.append(f"{iface}\t{hex_address(destination)}\t{hex_address(gateway)}\t{flags:04X}\t0\t0\t"
+                     f"{metric}\t{hex_address(mask)}\t0\t0\t0\n")
+    path = tmp_path / "route"
+    path.write_text("".join(lines))
+    return path
+
+
+def test_routes_are_read_in_host_order(tmp_path):
+    path = route_table(tmp_path,
+                       ("eth0", "0.0.0.0", "192.168.8.1", 0x3, 100, "0.0.0.0"),
+                       ("eth0", "192.168.8.0", "0.0.0.0", 0x1, 100, "255.255.252.0"))
+    assert read_routes(path) == [
+        {"iface": "eth0", "destination": "0.0.0.0", "gateway": "192.168.8.1",
+         "flags": 0x3, "metric": 100, "mask": "0.0.0.0"},
+        {"iface": "eth0", "destination": "192.168.8.0", "gateway": "0.0.0.0",
+         "flags": 0x1, "metric": 100, "mask": "255.255.252.0"},
+    ]
+    assert read_routes(tmp_path / "missing") == []
+
+
+@pytest.mark.parametrize("routes, expected", [
+    # Lowest metric wins
+    ([("wlan0", "0.0.0.0", "10.0.0.1", 0x3, 600, "0.0.0.0"),
+      ("eth0", "0.0.0.0", "192.168.8.1", 0x3, 100, "0.0.0.0")], ("eth0", "192.168.8.1")),
+    # Routes that are down are skipped
+    ([("eth0", "0.0.0.0", "192.168.8.1", 0x2, 100, "0.0.0.0"),
+      ("wlan0", "0.0.0.0", "10.0.0.1", 0x3, 600, "0.0.0.0")], ("wlan0", "10.0.0.1")),
+    # A default route without a gateway (point-to-point links)
+    ([("tun0", "0.0.0.0", "0.0.0.0", 0x1, 0, "0.0.0.0")], ("tun0", None)),
+    # Only subnet routes: no default
+    ([("eth0", "192.168.8.0", "0.0.0.0", 0x1, 100, "255.255.255.0")], None),
+])
+def test_default_route_choice(tmp_path, routes, expected):
+    assert default_route(route_table(tmp_path, *routes)) == expected
+
+
+@pytest.mark.parametrize("local_ip, network, broadcast, router, cidr", [
+    ("192.168.50.10", "192.168.50.0/24", "192.168.50.255", "192.168.50.1", "192.168.50.0/24"),
+    ("192.168.9.77", "192.168.9.77/255.255.254.0", "192.168.9.255", "192.168.8.1", "192.168.8.0/23"),
+    ("10.20.6.5", "10.20.6.5/22", "10.20.7.255", "10.20.4.1", "10.20.4.0/22"),
+    ("10.0.0.5", "10.0.0.4/31", "10.0.0.5", "10.0.0.5", "10.0.0.4/31"),
+])
+def test_subnet_addressing(local_ip, network, broadcast, router, cidr):
+    info = build_network_info(local_ip, network, iface="eth0")
+    assert (info["broadcast_ip"], info["router_ip"], info["network"]) == (broadcast, router, cidr)
+
+
+def test_explicit_router_is_kept():
+    info = build_network_info("192.168.9.77", "192.168.8.0/23", router_ip="192.168.9.254")
+    assert info["router_ip"] == "192.168.9.254"
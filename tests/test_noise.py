@@ -0,0 +1,58 @@
+"""Noise runs on the injected clock and under the shared rate limits"""
+
+from clock import VirtualClock
+from noise import NoiseGenerator
+from packet_builders import NativePacketBuilder
+from packet_sender import RecordingSender
+from rate_limiter import RateLimiter
+
+from tests.conftest import TEST_NETWORK
+
+
+def make_noise(clock, sender, **options):
+    return NoiseGenerator(NativePacketBuilder(TEST_NETWORK["local_ip"]), TEST_NETWORK, sender,
+                          pool_size=64, batch_size=16, seed=1, clock=clock, **options)
+
+
+def test_run_paces_batches_on_the_clock():
+    clock = VirtualClock(start=0)
+    sender = RecordingSender(clock)
+    noise = make_noise(clock, sender, pps=32)
+    original = sender.send_burst
+
+    def send_burst(packets, layer=3, iface=None):
+        if len(sender.sent) >= 64:
+            noise.stop_event.set()
+        return original(packets, layer, iface)
+
+    sender.send_burst = send_burst
+    noise.run()
+    assert sorted({time for time, _, _, _ in sender.sent}) == [0, 0.5, 1.0, 1.5, 2.0]
+
+
+def test_noise_only_takes_spare_capacity():
+    clock = VirtualClock(start=0)
+    sender = RecordingSender(clock)
+    limiter = RateLimiter(pps=8, clock=clock)
+    noise = make_noise(clock, sender, pps=1000, rate_limiter=limiter)
+    # Half of the bucket is kept for the flags; the rest of the batch is skipped
+    assert noise.send_batch() == 4
+    assert noise.send_batch() == 0
+    assert limiter.acquire("http", 4) == 0
+
+    # Nothing spare while flag traffic is paying off a debt
+    clock.advance(1)
+    assert limiter.acquire("http", 12) == 0.5
+    assert noise.send_batch() == 0
+    clock.advance(2)
+    assert noise.send_batch() == 4
+    assert [time for time, _, _, _ in sender.sent] == [0] * 4 + [3.5] * 4
+
+
+def test_empty_pool_sends_nothing():
+    clock = VirtualClock(start=0)
+    noise = make_noise(clock, RecordingSender(clock), pps=100)
+    noise.builders = dict.fromkeys(noise.builders, lambda dst: 1 / 0)
+    assert noise.send_batch() == 0
+    noise.refresh_pool()
+    assert noise.errors == 16
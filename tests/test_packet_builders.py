@@ -0,0 +1,34 @@
+"""The native builder's bytes match scapy's for every challenge"""
+
+import pytest
+
+from challenge_registry import load_challenge_registry
+from flag_derivation import FlagDeriver
+
+CHALLENGES = [challenge.type for challenge in load_challenge_registry()]
+
+
+def build_all(generator, challenge_type):
+    challenge = generator.registry[challenge_type]
+    return [generator.build_challenge_packets(challenge_type, dst)
+            for dst in challenge.resolve_destinations(generator.network_info)]
+
+
+@pytest.mark.parametrize("challenge_type", CHALLENGES)
+@pytest.mark.parametrize("index", [0, 1])
+def test_native_matches_scapy(make_generator, challenge_type, index):
+    native = make_generator(packet_backend="native")
+    scapy = make_generator(packet_backend="scapy")
+    for generator in (native, scapy):
+        generator.set_flag_index(challenge_type, index)
+    assert build_all(native, challenge_type) == build_all(scapy, challenge_type)
+
+
+@pytest.mark.parametrize("challenge_type", CHALLENGES)
+def test_native_matches_scapy_with_team_flags(make_generator, challenge_type):
+    teams = {"red": "192.168.50.21", "blue": "10.0.0.7"}
+    native, scapy = (make_generator(packet_backend=backend, flag_deriver=FlagDeriver("parity"), teams=teams)
+                     for backend in ("native", "scapy"))
+    for dst in teams.values():
+        assert (native.build_challenge_packets(challenge_type, dst)
+                == scapy.build_challenge_packets(challenge_type, dst))
@@ -0,0 +1,57 @@
+"""Packet cache reuse and invalidation when flags change"""
+
+from flag_derivation import FlagDeriver
+
+
+def test_repeat_sends_are_served_from_the_cache(make_generator):
+    generator = make_generator(packet_backend="native")
+    generator.generate_challenge_traffic("http")
+    misses = generator.packet_cache.misses
+    generator.generate_challenge_traffic("http")
+    assert generator.packet_cache.misses == misses
+    assert generator.packet_cache.hits == misses
+
+
+def test_advance_rebuilds_with_the_new_flag(make_generator):
+    generator = make_generator(packet_backend="native")
+    generator.generate_challenge_traffic("plaintext")
+    old = generator.packet_cache.entries["plaintext"]
+    assert all(b"CTF{EASY_PLAINTEXT}" in wires[0] for wires in old.values())
+
+    generator.advance_flag("plaintext")
+    assert "plaintext" not in generator.packet_cache.entries
+    generator.generate_challenge_traffic("plaintext")
+    new = generator.packet_cache.entries["plaintext"]
+    assert all(b"CTF{EASY_ST0L3N_TEXT}" in wires[0] for wires in new.values())
+    assert {index for index, _ in new} == {1}
+
+
+def test_advance_only_invalidates_its_own_challenge(make_generator):
+    generator = make_generator(packet_backend="native")
+    generator.generate_challenge_traffic("http")
+    generator.generate_challenge_traffic("dns")
+    generator.advance_flag("http")
+    assert "http" not in generator.packet_cache.entries
+    assert "dns" in generator.packet_cache.entries
+
+
+def test_advance_past_the_last_fixed_flag_keeps_the_cache(make_generator):
+    generator = make_generator(packet_backend="native")
+    last = len(generator.flag_variations["icmp"]) - 1
+    generator.set_flag_index("icmp", last)
+    generator.generate_challenge_traffic("icmp")
+    retired = len(generator.retired_flags["icmp"])
+    events = generator.events.stats()["emitted"]
+
+    generator.advance_flag("icmp")
+    assert generator.current_flag_index["icmp"] == last
+    assert "icmp" in generator.packet_cache.entries
+    assert len(generator.retired_flags["icmp"]) == retired
+    assert generator.events.stats()["emitted"] == events
+
+
+def test_derived_flags_never_stop_advancing(make_generator):
+    generator = make_generator(packet_backend="native", flag_deriver=FlagDeriver("test-secret"))
+    for _ in range(10):
+        generator.advance_flag("tcp")
+    assert generator.current_flag_index["tcp"] == 10
@@ -0,0 +1,105 @@
+"""BurstSender over FakeSocket: socket reuse, per-destination errors and counters"""
+
+import threading
+
+import pytest
+
+from packet_sender import BurstSender, FakeSocket
+
+
+class FailingSocket(FakeSocket):
+    """FakeSocket that refuses one destination"""
+
+    def sendto(self, data, address):
+        if address[0] == "10.0.0.99":
+            raise OSError("unreachable")
+        return super().sendto(data, address)
+
+
+def make_sender(socket_cls=FakeSocket):
+    sockets = []
+
+    def factory(layer, iface):
+        sock = socket_cls(layer, iface)
+        sockets.append(sock)
+        return sock
+
+    return BurstSender(iface="eth0", socket_factory=factory), sockets
+
+
+def test_burst_goes_out_on_one_socket_per_layer():
+    sender, sockets = make_sender()
+    assert sender.send_burst([("10.0.0.1", b"a"), ("10.0.0.2", b"bb")]) == []
+    assert sender.send_burst([("10.0.0.1", b"ccc")]) == []
+    assert sender.send_burst([("ff:ff", b"frame")], layer=2) == []
+
+    assert [(sock.layer, sock.iface) for sock in sockets] == [(3, "eth0"), (2, "eth0")]
+    assert sockets[0].sent == [(b"a", ("10.0.0.1", 0)), (b"bb", ("10.0.0.2", 0)), (b"ccc", ("10.0.0.1", 0))]
+    assert sockets[1].sent == [(b"frame", None)]
+    assert (sender.packets_sent, sender.bytes_sent) == (4, 11)
+
+
+def test_failed_destination_does_not_stop_the_burst():
+    sender, sockets = make_sender(FailingSocket)
+    errors = sender.send_burst([("10.0.0.1", b"a"), ("10.0.0.99", b"b"), ("10.0.0.2", b"c")])
+
+    assert [dst for dst, _ in errors] == ["10.0.0.99"]
+    assert isinstance(errors[0][1], OSError)
+    assert [address[0] for _, address in sockets[0].sent] == ["10.0.0.1", "10.0.0.2"]
+    assert sender.packets_sent == 2
+
+
+def test_socket_that_cannot_open_fails_every_packet():
+    def factory(layer, iface):
+        raise PermissionError("needs root")
+
+    sender = BurstSender(iface="eth0", socket_factory=factory)
+    errors = sender.send_burst([("10.0.0.1", b"a"), ("10.0.0.2", b"b")])
+    assert [dst for dst, _ in errors] == ["10.0.0.1", "10.0.0.2"]
+    assert sender.packets_sent == 0
+
+
+def test_close_closes_and_forgets_sockets():
+    sender, sockets = make_sender()
+    sender.send_burst([("10.0.0.1", b"a")])
+    sender.close()
+    assert sockets[0].closed
+    assert sender.sockets == {}
+    sender.send_burst([("10.0.0.1", b"a")])
+    assert len(sockets) == 2
+
+
+@pytest.mark.parametrize("layer", [2, 3])
+def test_explicit_interface_gets_its_own_socket(layer):
+    sender, sockets = make_sender()
+    sender.send_burst([("10.0.0.1", b"a")], layer=layer)
+    sender.send_burst([("10.0.0.1", b"a")], layer=layer, iface="eth1")
+    assert [sock.iface for sock in sockets] == ["eth0", "eth1"]
+
+
+def test_interface_switch_waits_for_bursts_on_the_old_sockets():
+    started = threading.Event()
+    release = threading.Event()
+
+    class SlowSocket(FakeSocket):
+        def sendto(self, data, address):
+            started.set()
+            release.wait(5)
+            return super().sendto(data, address)
+
+    sender, sockets = make_sender(SlowSocket)
+    burst = threading.Thread(target=sender.send_burst, args=([("10.0.0.1", b"a")],))
+    burst.start()
+    started.wait(5)
+    switch = threading.Thread(target=sender.switch_interface, args=("wlan0",))
+    switch.start()
+    switch.join(0.1)
+    # Still sending on eth0's socket, so it stays open
+    assert switch.is_alive() and not sockets[0].closed
+    release.set()
+    burst.join(5)
+    switch.join(5)
+    assert sockets[0].closed and sockets[0].sent == [(b"a", ("10.0.0.1", 0))]
+
+    sender.send_burst([("10.0.0.1", b"b")])
+    assert [(sock.iface, sock.closed) for sock in sockets] == [("eth0", True), ("wlan0", False)]
@@ -0,0 +1,68 @@
+"""pcap/pcapng write and read round trips, including a file that is still growing"""
+
+import pytest
+
+from pcap_io import PcapReader, PcapWriter
+
+IP_PACKET = bytes.fromhex("450000200001000040110000c0a8320ac0a832ff0035053900080000") + b"ping"
+ARP_FRAME = b"\xff" * 6 + b"\x02" * 6 + b"\x08\x06" + bytes(28) + b"flag"
+
+
+def read_all(path):
+    with PcapReader(path) as reader:
+        return [(timestamp, layer, bytes(data)) for timestamp, layer, data in reader.records()]
+
+
+@pytest.mark.parametrize("name", ["round.pcap", "round.pcapng"])
+def test_packets_come_back_unchanged(tmp_path, name):
+    path = tmp_path / name
+    writer = PcapWriter(path)
+    writer.write_packet(IP_PACKET, layer=3, timestamp=1_700_000_000.25)
+    writer.write_packet(ARP_FRAME, layer=2, timestamp=1_700_000_001.5)
+    writer.timestamp = 1_700_000_002.0
+    assert writer.send_burst([("192.168.50.255", IP_PACKET)] * 2) == []
+    writer.close()
+
+    records = read_all(path)
+    assert [layer for _, layer, _ in records] == [3, 2, 3, 3]
+    assert [data for _, _, data in records] == [IP_PACKET, ARP_FRAME, IP_PACKET, IP_PACKET]
+    assert [timestamp for timestamp, _, _ in records] == pytest.approx(
+        [1_700_000_000.25, 1_700_000_001.5, 1_700_000_002.0, 1_700_000_002.0])
+    assert (writer.packets_sent, writer.bytes_sent) == (2, 2 * len(IP_PACKET))
+
+
+@pytest.mark.parametrize("name", ["growing.pcap", "growing.pcapng"])
+def test_resume_reads_only_new_records(tmp_path, name):
+    path = tmp_path / name
+    writer = PcapWriter(path)
+    writer.write_packet(IP_PACKET, timestamp=1.0)
+    writer.flush()
+
+    first = PcapReader(path)
+    assert len(list(first.packets())) == 1
+    writer.write_packet(ARP_FRAME, layer=2, timestamp=2.0)
+    writer.close()
+
+    second = PcapReader(path)
+    second.resume(first)
+    first.close()
+    assert [(layer, bytes(second.map[start:stop])) for _, layer, start, stop in second.packets()] == [(2, ARP_FRAME)]
+    second.close()
+
+
+def test_exported_cycle_reads_back_as_sent(tmp_path, make_generator):
+    path = tmp_path / "cycle.pcapng"
+    writer = PcapWriter(path)
+    generator = make_generator(sender=writer, packet_backend="native")
+    sent = []
+    original = writer.send_burst
+
+    def record(packets, layer=3, iface=None):
+        sent.extend(data for _, data in packets)
+        return original(packets, layer, iface)
+
+    writer.send_burst = record
+    generator.export_traffic(1, start_time=1_700_000_000)
+    writer.close()
+
+    assert [data for _, _, data in read_all(path)] == sent
@@ -0,0 +1,61 @@
+"""Token buckets on a simulated clock, burst pacing and rate option parsing"""
+
+import pytest
+
+from clock import VirtualClock
+from network_generator import parse_args
+from packet_sender import RecordingSender
+from rate_limiter import RateLimiter, TokenBucket, parse_challenge_rates
+
+
+def test_bucket_paces_a_debt_at_its_rate():
+    clock = VirtualClock(start=0)
+    bucket = TokenBucket(10, clock=clock)
+    assert bucket.reserve(10) == 0.0
+    assert bucket.reserve(5) == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert bucket.reserve(1) == pytest.approx(0.1)
+
+
+def test_bursts_are_split_to_fit_every_bucket():
+    limiter = RateLimiter(pps=100, bandwidth=250, challenge_pps={"tcp": 4})
+    packets = [("10.0.0.1", b"x" * 60)] * 10
+    assert [len(chunk) for chunk in limiter.split("tcp", packets)] == [4, 4, 2]
+    assert [len(chunk) for chunk in limiter.split("http", packets)] == [4, 4, 2]
+    # A packet bigger than the bandwidth bucket still goes, on its own
+    assert [len(chunk) for chunk in limiter.split("http", [("10.0.0.1", b"x" * 400)] * 2)] == [1, 1]
+
+
+def test_long_burst_is_spread_out_over_time(make_generator):
+    clock = VirtualClock(start=0)
+    sender = RecordingSender(clock)
+    generator = make_generator(sender=sender, clock=clock, packet_backend="native",
+                               rate_limiter=RateLimiter(challenge_pps={"tcp": 16}, clock=clock))
+    generator.generate_challenge_traffic("tcp")
+
+    # 4 destinations x 16-packet sessions at 16 packets/s: one session per second
+    times = [sent[0] for sent in sender.sent]
+    assert len(times) == 64
+    assert sorted(set(times)) == pytest.approx([0.0, 1.0, 2.0, 3.0])
+    assert times.count(times[0]) == 16
+
+
+@pytest.mark.parametrize("values, message", [
+    (["http=0"], "positive"),
+    (["http=-2"], "positive"),
+    (["http=nan"], "positive"),
+    (["http=fast"], "number"),
+    (["htpp=5"], "unknown challenge"),
+    (["http"], "CHALLENGE=PPS"),
+])
+def test_bad_challenge_rates_are_rejected(values, message):
+    with pytest.raises(ValueError, match=message):
+        parse_challenge_rates(values, ["http", "dns"])
+
+
+def test_command_line_rejects_bad_rates(capsys):
+    for argv in (["--pps", "0"], ["--bandwidth", "-1"], ["--challenge-pps", "http=0"],
+                 ["--challenge-pps", "nosuch=5"]):
+        with pytest.raises(SystemExit):
+            parse_args(argv)
+    assert parse_args(["--pps", "50", "--challenge-pps", "http=5"]).challenge_pps == {"http": 5.0}
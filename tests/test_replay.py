@@ -0,0 +1,76 @@
+"""Replaying an exported capture swaps in each challenge's current flag"""
+
+import struct
+
+import pytest
+
+from challenge_registry import load_challenge_registry
+from flag_derivation import FlagDeriver
+from flag_scanner import FlagScanner
+from packet_builders import stream_numbers
+from packet_sender import RecordingSender
+from pcap_io import PcapReader, PcapWriter
+
+TEAMS = {"red": "192.168.50.21", "blue": "192.168.50.22"}
+
+
+def export(path, make_generator, **options):
+    writer = PcapWriter(path)
+    generator = make_generator(sender=writer, packet_backend="native", **options)
+    generator.export_traffic(1, start_time=1_700_000_000)
+    writer.close()
+
+
+def replay(tmp_path, make_generator, index, **options):
+    """Replay cycle.pcap with every challenge at a flag index; returns the scanner's sightings"""
+    generator = make_generator(packet_backend="native", **options)
+    generator.sender = RecordingSender(generator.clock)
+    for challenge_type in generator.current_flag_index:
+        generator.set_flag_index(challenge_type, index)
+    generator.replay_pcap(tmp_path / "cycle.pcap", speed=0)
+
+    out = PcapWriter(tmp_path / "replayed.pcap")
+    for timestamp, layer, _, data in generator.sender.sent:
+        out.write_packet(data, layer=layer, timestamp=timestamp)
+    out.close()
+    scanner = FlagScanner(flag_deriver=options.get("flag_deriver"), teams=options.get("teams"))
+    with PcapReader(tmp_path / "replayed.pcap") as reader:
+        scanner.scan(reader)
+    assert not scanner.unknown
+    return scanner.seen
+
+
+CHALLENGES = {challenge.type for challenge in load_challenge_registry()}
+
+
+# The TCP stream flag gets shorter at index 2 and longer at index 3
+@pytest.mark.parametrize("index", [2, 3])
+def test_replay_sends_the_current_flags(tmp_path, make_generator, index):
+    export(tmp_path / "cycle.pcap", make_generator)
+    seen = replay(tmp_path, make_generator, index)
+    assert {(challenge_type, version) for challenge_type, version, _ in seen} == {
+        (challenge_type, index) for challenge_type in CHALLENGES}
+
+
+def test_replayed_stream_sessions_are_whole(tmp_path, make_generator):
+    export(tmp_path / "cycle.pcap", make_generator)
+    generator = make_generator(packet_backend="native")
+    generator.sender = RecordingSender(generator.clock)
+    generator.set_flag_index("tcp", 3)
+    generator.replay_pcap(tmp_path / "cycle.pcap", speed=0)
+
+    challenge = generator.registry["tcp"]
+    destinations = challenge.resolve_destinations(generator.network_info)
+    expected = [wire for dst in destinations for wire in generator.build_challenge_packets("tcp", dst)]
+    client_ports = {stream_numbers(dst, challenge.port)[0] for dst in destinations}
+    # Every packet of those sessions, in both directions, is the rebuilt one
+    sessions = [data for _, _, _, data in generator.sender.sent
+                if data[9] == 6 and set(struct.unpack_from("!HH", data, 20)) & client_ports]
+    assert sessions == expected
+
+
+def test_replay_keeps_derived_flags_per_team(tmp_path, make_generator):
+    options = {"flag_deriver": FlagDeriver("replay-secret"), "teams": TEAMS}
+    export(tmp_path / "cycle.pcap", make_generator, **options)
+    seen = replay(tmp_path, make_generator, 5, **options)
+    assert set(seen) == {(challenge_type, 5, team) for challenge_type in CHALLENGES for team in TEAMS}
@@ -0,0 +1,70 @@
+"""The live schedule, run in simulated time"""
+
+import random
+
+import pytest
+
+from clock import VirtualClock
+from event_log import EventLog
+from network_generator import ADVANCE_EVERY_CYCLES, CHALLENGE_GAP, parse_args
+from packet_sender import RecordingSender
+from scheduler import ChallengeScheduler
+
+START = 1_700_000_000
+
+
+def test_jobs_run_in_due_order_on_the_virtual_clock():
+    clock = VirtualClock(start=START)
+    scheduler = ChallengeScheduler(clock=clock, rng=random.Random(0))
+    runs = []
+    scheduler.add_job("slow", lambda: runs.append(("slow", clock.monotonic())), 10)
+    scheduler.add_job("fast", lambda: runs.append(("fast", clock.monotonic())), 4, delay=1)
+    scheduler.add_job("header", lambda: runs.append(("header", clock.monotonic())), 10, inline=True)
+
+    assert scheduler.run_until(12) == 7
+    # Inline jobs go first at the same moment, then the order they were added in
+    assert runs == [("header", 0), ("slow", 0), ("fast", 1), ("fast", 5), ("fast", 9),
+                    ("header", 10), ("slow", 10)]
+    assert clock.monotonic() == 12
+
+
+def test_simulated_cycles_send_on_schedule_and_advance_flags(make_generator):
+    generator = make_generator(packet_backend="native")
+    sender = generator.sender = RecordingSender(generator.clock)
+    cycle = generator.cycle_interval()
+    groups = len(generator.challenge_jobs())
+
+    # Up to, not including, the start of the next cycle
+    generator.simulate(ADVANCE_EVERY_CYCLES * cycle - 1)
+    assert generator.cycle_count == ADVANCE_EVERY_CYCLES
+    assert set(generator.current_flag_index.values()) == {1}
+
+    offsets = sorted({time - START for time, _, _, _ in sender.sent})
+    assert offsets == [number * cycle + group * CHALLENGE_GAP
+                       for number in range(ADVANCE_EVERY_CYCLES) for group in range(groups)]
+    # The advance happens at the start of the third cycle, before its sends
+    before = [data for time, _, _, data in sender.sent if time - START < (ADVANCE_EVERY_CYCLES - 1) * cycle]
+    after = [data for time, _, _, data in sender.sent if time - START >= (ADVANCE_EVERY_CYCLES - 1) * cycle]
+    assert any(b"CTF{EASY_PLAINTEXT}" in data for data in before)
+    assert not any(b"CTF{EASY_PLAINTEXT}" in data for data in after)
+    assert any(b"CTF{EASY_ST0L3N_TEXT}" in data for data in after)
+
+
+def test_command_line_rejects_empty_simulations(capsys):
+    for value in ("0", "-5", "nan"):
+        with pytest.raises(SystemExit):
+            parse_args(["--simulate", value])
+        assert "--simulate must be a positive number" in capsys.readouterr().err
+    assert parse_args(["--simulate", "0.5"]).simulate == 0.5
+
+
+def test_quiet_generator_prints_nothing(make_generator, capsys):
+    generator = make_generator(packet_backend="scapy", events=EventLog(console=False))
+    generator.scheduler.add_job("broken", lambda: 1 / 0, 10)
+    generator.schedule_traffic()
+    generator.scheduler.run_until(generator.clock.monotonic() + 10)
+    generator.generate_specific_challenge(99)
+    assert capsys.readouterr().out == ""
+    events = {record["event"] for record in generator.events.recent}
+    assert {"network", "challenge", "error"} <= events
+    assert any(record.get("job") == "broken" for record in generator.events.recent)
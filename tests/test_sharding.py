@@ -0,0 +1,33 @@
+"""Shard workers follow flag changes made by the coordinator"""
+
+from sharding import SharedFlagIndex
+
+
+def test_worker_drops_old_packets_when_the_coordinator_advances(make_generator):
+    coordinator = SharedFlagIndex(["http", "dns"])
+    worker = make_generator(packet_backend="native")
+    worker.current_flag_index = SharedFlagIndex(coordinator.challenges, coordinator.array,
+                                                on_change=worker.packet_cache.invalidate)
+    worker.generate_challenge_traffic("http")
+    worker.generate_challenge_traffic("dns")
+
+    for _ in range(3):
+        coordinator["http"] += 1
+        worker.generate_challenge_traffic("http")
+        assert {index for index, _ in worker.packet_cache.entries["http"]} == {coordinator["http"]}
+    assert {index for index, _ in worker.packet_cache.entries["dns"]} == {0}
+    assert len(worker.packet_cache.encodings.get("http", {})) <= 1
+
+
+def test_coordinator_metrics_add_up_the_workers_reports(make_generator):
+    coordinator = make_generator(packet_backend="native")
+    for _ in range(2):
+        worker = make_generator(packet_backend="native")
+        worker.generate_challenge_traffic("http")
+        sent = sum(worker.metrics.packets.values.values())
+        assert sent
+        coordinator.metrics.absorb(worker.metrics.drain())
+        # Each report only carries what was counted since the last one
+        assert worker.metrics.drain()["ctf_packets_sent_total"] == {}
+    assert sum(coordinator.metrics.packets.values.values()) == 2 * sent
+    assert coordinator.metrics.send_seconds.values[("http",)][2] == 2